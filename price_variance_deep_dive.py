@@ -1,8 +1,9 @@
 from __future__ import annotations
 from skill_framework import skill, SkillParameter, SkillInput, SkillOutput
-from price_variance_helper_sql_optimized.price_variance_config import FINAL_PROMPT_TEMPLATE
+from price_variance_helper_sql_optimized.price_variance_config import FINAL_PROMPT_TEMPLATE, WARMUP_ENABLED
 from price_variance_helper_sql_optimized.price_variance_functionality_sql import run_price_variance_analysis_sql
 from price_variance_helper_sql_optimized.price_variance_layouts import price_variance_layouts, PAGES
+from price_variance_helper_sql_optimized.price_variance_warmup import start_warmup, warmup_note
 from ar_analytics.defaults import default_table_layout
 
 @skill(
@@ -25,6 +26,65 @@ from ar_analytics.defaults import default_table_layout
             constrained_to="filters",
             description="Additional filters like supplier, category, contract, etc."
         ),
+        SkillParameter(
+            name="breakout",
+            constrained_to="dimensions",
+            description="Dimension to rank on the overview tab: supplierName, contractName, category, operatingUnit or contractType. Defaults to supplierName",
+            default_value="supplierName"
+        ),
+        SkillParameter(
+            name="breakout_cursor",
+            description="Cursor from a previous answer's notes to page to the next breakout members (suppliers by default), ranked by variance"
+        ),
+        SkillParameter(
+            name="contract_cursor",
+            description="Cursor from a previous answer's notes to page to the next contracts of the top member, ranked by variance"
+        ),
+        SkillParameter(
+            name="compliance_tolerance",
+            description="How close the invoice price must be to the expected price to count as compliant: a dollar amount like '$0.10' or a percentage like '1%'. Defaults to $0.01",
+            default_value="$0.01"
+        ),
+        SkillParameter(
+            name="execution_mode",
+            constrained_values=["exact", "approximate"],
+            description="'approximate' answers from a stratified sample with 95% confidence intervals in well under a second; 'exact' runs the full queries",
+            default_value="exact"
+        ),
+        SkillParameter(
+            name="narrative_mode",
+            constrained_values=["llm", "template"],
+            description="'template' writes the summary and insights from fixed templates over the facts without calling the LLM, for batch and API use; 'llm' writes them with the LLM and falls back to the templates when it is unavailable",
+            default_value="llm"
+        ),
+        SkillParameter(
+            name="exports",
+            constrained_values=["all", "none"],
+            description="'none' skips building the export data; with 'all' (default) exports longer than 1,000 rows are also written in full to CSV or Parquet files listed under Export Files",
+            default_value="all"
+        ),
+        SkillParameter(
+            name="anomaly_detection",
+            constrained_values=["off", "on"],
+            description="'on' scans every transaction for invoice lines priced far above their contract's normal level and exports the top flagged lines",
+            default_value="off"
+        ),
+        SkillParameter(
+            name="period_comparison",
+            constrained_values=["off", "on"],
+            description="'on' compares the time periods against each other (e.g. 'q2 2025' vs 'q3 2025') instead of analyzing them combined, with per-period variance, deltas and rank changes",
+            default_value="off"
+        ),
+        SkillParameter(
+            name="savings_scenarios",
+            is_multi=True,
+            description="What-if savings scenarios such as 'top 5 at contract price', 'all capped at 2%' or 'top 10 @ 1.5%'. Defaults to a top 5/top 10/all x 0%/2%/5% sweep"
+        ),
+        SkillParameter(
+            name="recovery_actions",
+            is_multi=True,
+            description="Changes to the recovery pipeline: 'open items' opens (or re-values) recovery items for the top supplier's leaking contracts over the analyzed period; '12: in progress', '12: written off' or '12: recovered' move item 12 to a status; '12: recovered $1,500' records an amount recovered. Without actions the pipeline is only read"
+        ),
         SkillParameter(
             name="max_prompt",
             parameter_type="prompt",
@@ -46,7 +106,17 @@ Please use the following as an example of good insights for price variance analy
 
 Example 1:
 Facts:
-[{'title': 'Supplier Facts', 'facts': [{'supplier': 'EcoBox Packaging', 'variance': '$491K', 'variance_pct': '12.5%', 'compliance_rate': '58.2%'}, {'supplier': 'Elite Source', 'variance': '$428K', 'variance_pct': '11.8%', 'compliance_rate': '62.1%'}]}, {'title': 'Contract Facts', 'facts': [{'contract': 'Service Level Agreement #11', 'variance': '$64K', 'supplier': 'EcoBox Packaging'}]}, {'title': 'Overall Facts', 'facts': [{'total_variance': '$6.2M', 'suppliers': 20, 'compliance_rate': '60.7%', 'transactions': 45680}]}]
+## KPI Facts (overall_metrics)
+metric|value|context
+Total Variance Impact|$6.2M|across 20 suppliers
+Price Compliance Rate|60.7%|from 45,680 transactions
+## Supplier Facts (supplier_variance)
+supplier|variance_amount|variance_pct|compliance_rate|rank
+EcoBox Packaging|$491K|12.5%|58.2%|1
+Elite Source|$428K|11.8%|62.1%|2
+## Contract Facts (contract_detail)
+supplier|contract|variance_amount|rank
+EcoBox Packaging|Service Level Agreement #11|$64K|1
 
 Summary:
 ## Price Variance Analysis ##
@@ -89,6 +159,30 @@ Summary:"""
             parameter_type="visualization", 
             description="Layout for Tab 3 - Recovery Pipeline",
             default_value=price_variance_layouts.get(PAGES[2])
+        ),
+        SkillParameter(
+            name="page_4_layout",
+            parameter_type="visualization",
+            description="Layout for Tab 4 - Compliance Trend",
+            default_value=price_variance_layouts.get(PAGES[3])
+        ),
+        SkillParameter(
+            name="page_5_layout",
+            parameter_type="visualization",
+            description="Layout for Tab 5 - Variance Concentration",
+            default_value=price_variance_layouts.get(PAGES[4])
+        ),
+        SkillParameter(
+            name="page_6_layout",
+            parameter_type="visualization",
+            description="Layout for Tab 6 - Period Comparison",
+            default_value=price_variance_layouts.get(PAGES[5])
+        ),
+        SkillParameter(
+            name="page_7_layout",
+            parameter_type="visualization",
+            description="Layout for Tab 7 - Category × Supplier Heatmap",
+            default_value=price_variance_layouts.get(PAGES[6])
         )
     ]
 )
@@ -98,8 +192,14 @@ def price_variance_deep_dive(parameters: SkillInput) -> SkillOutput:
     
     Analyzes procurement data to identify price variance opportunities,
     showing top suppliers and contracts with savings potential.
+    
+    The first invocation on a worker starts the cache warm-up in the background
+    (PRICE_VARIANCE_WARMUP=0 disables it); answers given while it runs say so in their notes.
     """
-    return run_price_variance_analysis_sql(parameters)
+    if WARMUP_ENABLED:
+        start_warmup()
+    note = warmup_note()
+    return run_price_variance_analysis_sql(parameters, notes=[note] if note else [])
 
 if __name__ == '__main__':
     # Test the skill with mock input
@@ -0,0 +1,122 @@
+"""Generic group-by engine for variance breakouts
+
+One metric set (variance, variance %, average prices, compliance, volume) grouped by any
+breakout dimension. When the monthly cube covers the request and the dimension is a cube
+dimension the rows are rolled up from the cube cells; otherwise one GROUP BY query
+compiled from the metric registry runs through the result cache. Both paths derive the
+metrics from the same registry parts and return the same columns, so the page, table and
+fact builders work unchanged for any dimension. The overall KPIs come from the grand
+total of the same scan (or the same cube cells).
+"""
+
+from __future__ import annotations
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cube import MonthlyCube, CUBE_DIMENSIONS
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names
+from price_variance_helper_sql_optimized.price_variance_filters import normalize_column
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE, apply_tolerance
+from price_variance_helper_sql_optimized.price_variance_metrics import CELL_PARTS, compile_metrics_sql, derive_metrics, merge_parts
+
+logger = logging.getLogger(__name__)
+
+# Supported breakout dimensions -> (singular, plural) display labels
+BREAKOUT_DIMENSIONS = {
+    "supplierName": ("Supplier", "Suppliers"),
+    "contractName": ("Contract", "Contracts"),
+    "category": ("Category", "Categories"),
+    "operatingUnit": ("Operating Unit", "Operating Units"),
+    "contractType": ("Contract Type", "Contract Types"),
+}
+DEFAULT_BREAKOUT = "supplierName"
+
+BREAKOUT_COLUMNS = ["total_variance", "variance_pct", "avg_invoice_price", "avg_catalog_price",
+                    "avg_expected_price", "compliance_rate", "transaction_count", "total_quantity"]
+
+# Overall KPI dict key -> registry metric
+KPI_METRICS = {"total_variance": "total_variance", "total_invoice_value": "total_invoice_value",
+               "avg_variance_rate": "variance_pct", "compliance_rate": "compliance_rate",
+               "total_transactions": "transaction_count"}
+
+# Additive per-group sums the metric set and KPIs are derived from (the monthly cube cell columns)
+SUM_COLUMNS = CELL_PARTS
+
+def resolve_breakout(value) -> str:
+    """Dataset column for a breakout parameter value, DEFAULT_BREAKOUT when unsupported"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if not value:
+        return DEFAULT_BREAKOUT
+    dimension = normalize_column(value)
+    if dimension not in BREAKOUT_DIMENSIONS:
+        logger.warning(f"Unsupported breakout {value!r}, using {DEFAULT_BREAKOUT}")
+        return DEFAULT_BREAKOUT
+    return dimension
+
+def breakout_label(dimension: str, plural: bool = False) -> str:
+    """Display label, e.g. 'Supplier' / 'Suppliers'"""
+    return BREAKOUT_DIMENSIONS.get(dimension, (dimension, dimension))[1 if plural else 0]
+
+def breakout_fact_key(dimension: str) -> str:
+    """Key used for the member name in facts, e.g. 'supplier' or 'operating_unit'"""
+    return breakout_label(dimension).lower().replace(" ", "_")
+
+def build_breakout_sql(dimension: str, where: str, tolerance: Tolerance = DEFAULT_TOLERANCE,
+                       with_total: bool = False, extra_metrics: tuple = ()) -> str:
+    """GROUP BY query for the parts of the breakout metric set (plus the grand total row with_total)"""
+    return compile_metrics_sql(BREAKOUT_COLUMNS + list(extra_metrics), where, [dimension], with_total,
+                               order_by="variance_sum DESC", tolerance=tolerance)
+
+def metrics_from_sums(sums: pd.DataFrame) -> pd.DataFrame:
+    """The breakout metric set from the registry parts (query rows, cube cells or drill tree nodes), same index"""
+    return derive_metrics(sums, BREAKOUT_COLUMNS)
+
+def kpis_from_sums(sums: pd.Series) -> dict:
+    """The overall KPI dict from grand-total registry parts"""
+    kpis = derive_metrics(sums.to_frame().T, KPI_METRICS).iloc[0].to_dict()
+    for key, value in kpis.items():
+        kpis[key] = 0 if pd.isna(value) else value
+    kpis['total_transactions'] = int(kpis['total_transactions'])
+    if 'supplier_distinct' in sums.index:
+        kpis['total_suppliers'] = int(sums['supplier_distinct'])
+    return kpis
+
+def member_parts_from_cube(cube: MonthlyCube, dimension: str, time_ranges: list, predicates: list,
+                           tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+    """Every member of the dimension with its SUM_COLUMNS parts, rolled up from cube cells"""
+    cells = apply_tolerance(cube.select(time_ranges, predicates), tolerance)[[dimension] + SUM_COLUMNS]
+    return merge_parts(cells[SUM_COLUMNS], cells[dimension]).reset_index()
+
+def breakout_from_cube(cube: MonthlyCube, dimension: str, time_ranges: list, predicates: list,
+                       tolerance: Tolerance = DEFAULT_TOLERANCE) -> tuple[pd.DataFrame, pd.Series]:
+    """(breakout metric set, grand-total parts) rolled up from cube cells, compliance looked up at the tolerance"""
+    member_parts = member_parts_from_cube(cube, dimension, time_ranges, predicates, tolerance)
+    breakout_df = pd.concat([member_parts[[dimension]], metrics_from_sums(member_parts)], axis=1)
+    breakout_df = breakout_df.sort_values("total_variance", ascending=False).reset_index(drop=True)
+    return breakout_df, merge_parts(member_parts[SUM_COLUMNS])
+
+def breakout_from_parts(parts_df: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    """Breakout rows from a query result of registry parts"""
+    breakout_df = metrics_from_sums(parts_df.reset_index(drop=True))
+    breakout_df.insert(0, dimension, parts_df[dimension].to_numpy())
+    return encode_names(breakout_df)
+
+def fetch_breakout(arc, database_id: str, dimension: str, where: str, cube: MonthlyCube | None = None,
+                   time_ranges: list = (), predicates: list | None = None, limit: int = 100,
+                   tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame | None:
+    """
+    Breakout rows ordered by total_variance (largest first), at most `limit` of them.
+    Returns None when the query fails.
+    """
+    if cube is not None and predicates is not None and dimension in CUBE_DIMENSIONS and cube.covers(time_ranges, predicates):
+        logger.info(f"🧊 Breakout by {dimension} rolled up from the cube")
+        return breakout_from_cube(cube, dimension, list(time_ranges), predicates, tolerance)[0].head(limit)
+
+    breakout_sql = build_breakout_sql(dimension, where, tolerance)
+    logger.info(f"📝 Breakout SQL ({dimension}):\n{breakout_sql}")
+    result = execute_cached_query(arc, database_id, breakout_sql, limit)
+    if not result.success or result.df is None:
+        logger.error(f"Breakout query by {dimension} failed: {result.error if not result.success else 'No data'}")
+        return None
+    return breakout_from_parts(result.df, dimension)
@@ -0,0 +1,116 @@
+"""Line-level price anomaly detection over all transactions
+
+The warehouse scores every filtered line and only flagged lines are transferred:
+
+1. Baselines - per contract, the median and the median absolute deviation (MAD) of the
+   relative deviation invoicePrice / expectedPrice - 1, computed exactly in SQL.
+2. Scoring - robust z-score 0.6745 * (deviation - median) / MAD per line. Lines above
+   ANOMALY_SCORE_THRESHOLD are flagged.
+
+One query returns the flagged lines, highest score first - the top K, or when every
+flagged line is exported, up to ANOMALY_MAX_EXPORT_LINES of them - with the flag count and
+total overpayment of the whole flagged set as window aggregates on every row. The scanned
+line count is the filtered transaction count of the KPI query. No other transaction rows
+leave the warehouse.
+"""
+
+from __future__ import annotations
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names
+from price_variance_helper_sql_optimized.price_variance_exports import EXPORT_CHUNK_ROWS
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_COLUMNS = ["transactionDate", "supplierName", "contractName", "invoicePrice", "expectedPrice", "quantity"]
+
+# Flagged lines kept for the export
+ANOMALY_TOP_K = 100
+
+# Flagged lines fetched at most when all of them are written to an export file
+ANOMALY_MAX_EXPORT_LINES = 1_000_000
+
+# Modified z-score cutoff (Iglewicz and Hoaglin)
+ANOMALY_SCORE_THRESHOLD = 3.5
+
+# Floor for the MAD so contracts that are almost always on price still get finite scores
+ANOMALY_MIN_MAD = 0.001
+
+def build_flagged_cte_sql(where: str = "1=1") -> str:
+    """WITH clause ending in `flagged` - the filtered lines scored against their contract's baseline"""
+    columns = ", ".join(ANOMALY_COLUMNS)
+    return f"""
+    WITH lines AS (
+        SELECT {columns}, invoicePrice / expectedPrice - 1 as deviation
+        FROM {table_sql()}
+        WHERE ({where}) AND expectedPrice > 0 AND invoicePrice IS NOT NULL
+    ),
+    medians AS (
+        SELECT contractName, MEDIAN(deviation) as baseline_median
+        FROM lines
+        GROUP BY contractName
+    ),
+    baselines AS (
+        SELECT m.contractName, m.baseline_median,
+            GREATEST(MEDIAN(ABS(l.deviation - m.baseline_median)), {ANOMALY_MIN_MAD}) as baseline_mad
+        FROM lines l JOIN medians m ON l.contractName = m.contractName
+        GROUP BY m.contractName, m.baseline_median
+    ),
+    flagged AS (
+        SELECT l.*,
+            l.expectedPrice * (1 + b.baseline_median) as baseline_price,
+            (l.invoicePrice - l.expectedPrice * (1 + b.baseline_median)) * COALESCE(l.quantity, 1) as overpayment,
+            0.6745 * (l.deviation - b.baseline_median) / b.baseline_mad as anomaly_score
+        FROM lines l JOIN baselines b ON l.contractName = b.contractName
+        WHERE 0.6745 * (l.deviation - b.baseline_median) / b.baseline_mad > {ANOMALY_SCORE_THRESHOLD}
+    )"""
+
+def build_flagged_lines_sql(where: str = "1=1", limit: int = ANOMALY_TOP_K) -> str:
+    """The `limit` highest-scoring flagged lines, each carrying the counts and overpayment of the whole flagged set"""
+    return f"""{build_flagged_cte_sql(where)}
+    SELECT {", ".join(ANOMALY_COLUMNS)}, baseline_price, overpayment,
+        deviation * 100 as deviation_pct, anomaly_score,
+        COUNT(*) OVER () as flagged_lines,
+        SUM(overpayment) OVER () as flagged_overpayment,
+        (SELECT COUNT(*) FROM baselines) as contracts
+    FROM flagged
+    ORDER BY anomaly_score DESC, transactionDate, contractName
+    LIMIT {int(limit)}
+    """
+
+def detect_price_anomalies(arc, database_id: str, where: str = "1=1", top_k: int = ANOMALY_TOP_K,
+                           scanned_lines: int = 0, flagged_writer=None) -> tuple[pd.DataFrame, dict]:
+    """
+    Score the filtered transactions in the warehouse and return the top-K flagged lines
+    (highest anomaly_score first) plus summary counts - scanned_lines is the filtered
+    transaction count the caller already has from the KPI query. Every flagged line, not
+    only the top K (up to ANOMALY_MAX_EXPORT_LINES), is written to flagged_writer (an
+    ExportFileWriter) when one is given.
+    """
+    summary = {"flagged_lines": 0, "scanned_lines": int(scanned_lines), "contracts": 0, "flagged_overpayment": 0.0}
+    logger.info("🚨 Anomaly detection: scoring lines against per-contract baselines in the warehouse...")
+    limit = ANOMALY_MAX_EXPORT_LINES if flagged_writer is not None else top_k
+    result = arc.data.execute_sql_query(database_id, build_flagged_lines_sql(where, limit), limit)
+    if not result.success or result.df is None:
+        logger.warning(f"Flagged lines query failed: {result.error if not result.success else 'No data'}")
+        return pd.DataFrame(), summary
+    if result.df.empty:
+        logger.info(f"✅ Anomaly detection complete: no lines flagged of {summary['scanned_lines']:,}")
+        return pd.DataFrame(), summary
+
+    first = result.df.iloc[0]
+    summary.update({
+        "flagged_lines": int(first["flagged_lines"]),
+        "contracts": int(first["contracts"]),
+        "flagged_overpayment": float(first["flagged_overpayment"])
+    })
+    lines_df = result.df.drop(columns=["flagged_lines", "flagged_overpayment", "contracts"])
+    if flagged_writer is not None:
+        if summary["flagged_lines"] > len(lines_df):
+            logger.warning(f"Exporting the top {len(lines_df):,} of {summary['flagged_lines']:,} flagged lines")
+        for start in range(0, len(lines_df), EXPORT_CHUNK_ROWS):
+            flagged_writer.write(lines_df.iloc[start:start + EXPORT_CHUNK_ROWS])
+
+    logger.info(f"✅ Anomaly detection complete: {summary['flagged_lines']:,} of {summary['scanned_lines']:,} lines flagged")
+    return encode_names(lines_df.head(top_k).reset_index(drop=True)), summary
@@ -0,0 +1,113 @@
+"""In-process cache of SQL query results
+
+Results are keyed by (database_id, whitespace-normalized SQL, row limit), expire after
+RESULT_CACHE_TTL_SECONDS and are evicted least-recently-used beyond
+RESULT_CACHE_MAX_ENTRIES. Only successful results are cached, and every hit returns a
+copy of the DataFrame so callers can modify it freely.
+
+Expired entries stay until they are evicted: when a query runs past its deadline (see
+price_variance_deadline) the last result is served instead, flagged stale.
+"""
+
+from __future__ import annotations
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from price_variance_helper_sql_optimized.price_variance_deadline import DeadlineExceeded, deadline_of, without_deadline
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_TTL_SECONDS = 15 * 60
+RESULT_CACHE_MAX_ENTRIES = 512
+
+class ResultCache:
+    """Thread-safe TTL + LRU map"""
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL_SECONDS, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key: str) -> tuple | None:
+        """(value, age in seconds) for a key even past the TTL, None when not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else (entry[1], time.monotonic() - entry[0])
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+_result_cache = ResultCache()
+
+def get_result_cache() -> ResultCache:
+    """The process-wide query result cache"""
+    return _result_cache
+
+def query_cache_key(database_id: str, sql: str, limit: int) -> str:
+    """Cache key for a query - comments and whitespace outside string literals do not matter"""
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", re.sub(r"--[^\n]*", " ", parts[i]))
+    normalized = "".join(parts).strip()
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    return f"{database_id}:{limit}:{digest}"
+
+def execute_cached_query(arc, database_id: str, sql: str, limit: int):
+    """
+    arc.data.execute_sql_query with the result cache in front of it. Under a deadline a
+    query that runs over returns the expired cached result (stale=True) when there is one,
+    otherwise a failed result flagged timed_out.
+    """
+    key = query_cache_key(database_id, sql, limit)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        logger.info("♻️ Query result served from cache")
+        return SimpleNamespace(success=True, df=cached.copy(), error=None)
+
+    def run_query():
+        # Caches the result even when the caller has stopped waiting for it
+        result = without_deadline(arc).data.execute_sql_query(database_id, sql, limit)
+        if result.success and result.df is not None:
+            _result_cache.put(key, result.df.copy())
+        return result
+
+    deadline = deadline_of(arc)
+    if deadline is None:
+        return run_query()
+    try:
+        return deadline.call(run_query)
+    except DeadlineExceeded as e:
+        stale = _result_cache.get_stale(key)
+        if stale is None:
+            return SimpleNamespace(success=False, df=None, error=str(e), timed_out=True)
+        df, age = stale
+        deadline.degrade(f"Some figures are cached results up to {max(1, round(age / 60))} min old because the warehouse did not answer in time")
+        return SimpleNamespace(success=True, df=df.copy(), error=None, stale=True)
@@ -0,0 +1,172 @@
+"""Process-wide registry of reusable platform clients
+
+Building an AnswerRocketClient or ArUtils sets up auth, sessions and connection pools,
+so both are created once per worker and shared across questions and threads. Each
+pooled client is recreated when it reaches CLIENT_MAX_AGE_SECONDS, when a periodic
+health check fails, or after a call on it fails to connect (CONNECTION_ERRORS).
+
+Callers get a proxy with the same surface as the underlying client (e.g.
+arc.data.execute_sql_query(...)); every call resolves the current instance. Only calls
+the pool knows to be idempotent reads - read-only SQL on the data client - are retried
+once on a freshly created client after a connection error; any other call, such as an
+LLM request, is never sent twice.
+"""
+
+from __future__ import annotations
+import re
+import time
+import logging
+import threading
+from typing import Callable
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+logger = logging.getLogger(__name__)
+
+# Clients older than this are recreated on next use (auth tokens and sessions expire)
+CLIENT_MAX_AGE_SECONDS = 30 * 60
+
+# Minimum time between health checks of the same client
+CLIENT_HEALTH_CHECK_SECONDS = 60
+
+_PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+# Errors that mean the client's connection is broken - the client is recreated after them
+CONNECTION_ERRORS = (ConnectionError, TimeoutError)
+if requests is not None:
+    CONNECTION_ERRORS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+READ_ONLY_SQL = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+class ClientPool:
+    """One lazily created, shared client instance with expiry, health checks and recreate-on-error"""
+
+    def __init__(self, name: str, factory: Callable, health_check: Callable | None = None,
+                 max_age: float = CLIENT_MAX_AGE_SECONDS, retryable: Callable | None = None):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.max_age = max_age
+        self.retryable = retryable
+        self._lock = threading.Lock()
+        self._client = None
+        self._created_at = 0.0
+        self._checked_at = 0.0
+
+    def _create(self):
+        logger.info(f"🔌 Creating {self.name} client")
+        self._client = self.factory()
+        self._created_at = self._checked_at = time.monotonic()
+
+    def _healthy(self, client) -> bool:
+        try:
+            return self.health_check(client) is not False
+        except Exception as e:
+            logger.warning(f"{self.name} health check failed: {e}")
+            return False
+
+    def get(self):
+        """The shared client, (re)created when missing, expired or unhealthy"""
+        with self._lock:
+            now = time.monotonic()
+            if self._client is None or now - self._created_at >= self.max_age:
+                self._create()
+                return self._client
+            client = self._client
+            check_due = self.health_check is not None and now - self._checked_at >= CLIENT_HEALTH_CHECK_SECONDS
+            if check_due:
+                self._checked_at = now
+        # The check may take a network round trip - other threads keep using the client meanwhile
+        if check_due and not self._healthy(client):
+            self.invalidate(client)
+            return self.get()
+        return client
+
+    def invalidate(self, client=None):
+        """Drop the shared client (only if it is still `client`, when given) so the next get() recreates it"""
+        with self._lock:
+            if client is None or client is self._client:
+                self._client = None
+
+    def call(self, fn: Callable, retry: bool = False):
+        """fn(client) - after a connection error the client is recreated, and fn retried on it once when retry is set"""
+        client = self.get()
+        try:
+            return fn(client)
+        except CONNECTION_ERRORS as e:
+            self.invalidate(client)
+            if not retry:
+                logger.warning(f"{self.name} call failed to connect, recreating client: {e}")
+                raise
+            logger.warning(f"{self.name} call failed to connect, recreating client and retrying: {e}")
+            return fn(self.get())
+
+def _resolve(client, path: tuple):
+    for name in path:
+        client = getattr(client, name)
+    return client
+
+class PooledClient:
+    """Attribute-forwarding proxy that routes every call through a ClientPool"""
+
+    def __init__(self, pool: ClientPool, path: tuple = ()):
+        self._pool = pool
+        self._path = path
+
+    def __getattr__(self, name: str):
+        path = self._path + (name,)
+        attr = _resolve(self._pool.get(), path)
+        if callable(attr):
+            def call(*args, **kwargs):
+                retry = self._pool.retryable is not None and self._pool.retryable(path, args, kwargs)
+                return self._pool.call(lambda client: _resolve(client, path)(*args, **kwargs), retry)
+            return call
+        if isinstance(attr, _PLAIN_TYPES):
+            return attr
+        return PooledClient(self._pool, path)
+
+def _new_data_client():
+    from answer_rocket import AnswerRocketClient
+    return AnswerRocketClient()
+
+def _new_llm_client():
+    from ar_analytics import ArUtils
+    return ArUtils()
+
+def _data_call_retryable(path: tuple, args: tuple, kwargs: dict) -> bool:
+    """Only read-only SQL is safe to send twice (a COPY, for one, is not)"""
+    if path != ("data", "execute_sql_query"):
+        return False
+    sql = args[1] if len(args) > 1 else kwargs.get("sql_query", "")
+    return isinstance(sql, str) and READ_ONLY_SQL.match(sql) is not None
+
+def _data_client_health(client) -> bool:
+    can_connect = getattr(client, 'can_connect', None)
+    return can_connect() if callable(can_connect) else True
+
+_registry_lock = threading.Lock()
+_pools = {}
+
+def get_client_pool(name: str) -> ClientPool:
+    """Registered pool by name ('data' or 'llm')"""
+    with _registry_lock:
+        if name not in _pools:
+            if name == 'data':
+                _pools[name] = ClientPool('AnswerRocket data', _new_data_client, _data_client_health,
+                                          retryable=_data_call_retryable)
+            elif name == 'llm':
+                _pools[name] = ClientPool('ArUtils LLM', _new_llm_client)
+            else:
+                raise ValueError(f"Unknown client pool: {name}")
+        return _pools[name]
+
+def get_data_client() -> PooledClient:
+    """Shared AnswerRocketClient (use exactly like AnswerRocketClient())"""
+    return PooledClient(get_client_pool('data'))
+
+def get_llm_client() -> PooledClient:
+    """Shared ArUtils (use exactly like ArUtils())"""
+    return PooledClient(get_client_pool('llm'))
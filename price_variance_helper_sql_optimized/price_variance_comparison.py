@@ -0,0 +1,128 @@
+"""Period-over-period comparison in a single scan
+
+Each transaction is tagged with its period bucket by a CASE over the requested time
+periods (the first matching period wins when periods overlap). Conditional aggregation
+then produces one column per period and metric, and GROUPING SETS return the breakout
+members (suppliers by default) and the contracts from the same scan. Per-period ranks,
+deltas between the first and last period and rank changes are derived in pandas from
+that one small result.
+"""
+
+from __future__ import annotations
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql, column_sql, date_range_sql
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+COMPARISON_MAX_PERIODS = 6
+
+def build_period_case_sql(periods: list[tuple[str, str, str | None]]) -> str:
+    """CASE expression tagging a row with the index of its (label, start, end) period"""
+    branches = []
+    for index, (_, start_date, end_date) in enumerate(periods):
+        branches.append(f"WHEN {date_range_sql(start_date, end_date)} THEN {index}")
+    return "CASE " + " ".join(branches) + " END"
+
+def build_comparison_sql(dimension: str, where: str, periods: list[tuple[str, str, str | None]],
+                         tolerance: Tolerance = DEFAULT_TOLERANCE) -> str:
+    """One scan: per-period metrics for the breakout members and for the contracts"""
+    metrics = []
+    for index in range(len(periods)):
+        metrics.append(f"""
+        SUM(CASE WHEN period_bucket = {index} THEN variance_amount END) as variance_{index},
+        COUNT(CASE WHEN period_bucket = {index} THEN 1 END) as transactions_{index},
+        COUNT(CASE WHEN period_bucket = {index} AND is_compliant THEN 1 END) as compliant_{index}""")
+    grouping_sets = f"({dimension})" if dimension == "contractName" else f"({dimension}), (contractName)"
+    return f"""
+    WITH tagged AS (
+        SELECT {dimension}{", contractName" if dimension != "contractName" else ""},
+            {column_sql('variance_amount')} as variance_amount,
+            {tolerance.to_sql()} as is_compliant,
+            {build_period_case_sql(periods)} as period_bucket
+        FROM {table_sql()}
+        WHERE {where}
+    )
+    SELECT
+        {dimension}{", contractName" if dimension != "contractName" else ""},
+        GROUPING({dimension}) as is_contract_row,{",".join(metrics)}
+    FROM tagged
+    WHERE period_bucket IS NOT NULL
+    GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+def compare_periods(level_df: pd.DataFrame, member_column: str, period_count: int) -> pd.DataFrame:
+    """Per-period compliance and ranks, plus first -> last period deltas, for one level"""
+    compared = level_df[[member_column]].copy()
+    for index in range(period_count):
+        variance = level_df[f"variance_{index}"].fillna(0.0)
+        transactions = level_df[f"transactions_{index}"].fillna(0)
+        compared[f"variance_{index}"] = variance
+        compared[f"transactions_{index}"] = transactions.astype(int)
+        compared[f"compliance_{index}"] = level_df[f"compliant_{index}"] * 100.0 / transactions.where(transactions > 0)
+        # Members without transactions in a period are unranked there
+        compared[f"rank_{index}"] = variance.where(transactions > 0).rank(ascending=False, method="min").astype("Int64")
+
+    last = period_count - 1
+    compared["variance_delta"] = compared[f"variance_{last}"] - compared["variance_0"]
+    compared["variance_delta_pct"] = compared["variance_delta"] * 100.0 / compared["variance_0"].abs().where(compared["variance_0"] != 0)
+    compared["compliance_delta_pts"] = compared[f"compliance_{last}"] - compared["compliance_0"]
+    # Positive = moved up the variance ranking (became a bigger problem)
+    compared["rank_change"] = compared["rank_0"] - compared[f"rank_{last}"]
+    return compared.sort_values(f"variance_{last}", ascending=False).reset_index(drop=True)
+
+def summarize_periods(member_df: pd.DataFrame, labels: list[str]) -> pd.DataFrame:
+    """Totals per period from the member level"""
+    rows = []
+    for index, label in enumerate(labels):
+        transactions = int(member_df[f"transactions_{index}"].sum())
+        compliant = (member_df[f"compliance_{index}"].fillna(0) * member_df[f"transactions_{index}"] / 100.0).sum()
+        rows.append({
+            "period": label,
+            "total_variance": float(member_df[f"variance_{index}"].sum()),
+            "transactions": transactions,
+            "compliance_rate": compliant * 100.0 / transactions if transactions else None,
+            "members": int((member_df[f"transactions_{index}"] > 0).sum())
+        })
+    return pd.DataFrame(rows)
+
+def fetch_period_comparison(arc, database_id: str, dimension: str, where: str,
+                            periods: list[tuple[str, str, str | None]],
+                            tolerance: Tolerance = DEFAULT_TOLERANCE) -> dict | None:
+    """
+    {'labels', 'members', 'contracts', 'totals'} for two or more periods, None otherwise.
+    members and contracts hold per-period variance, transactions, compliance and rank
+    columns suffixed with the period index, plus the first -> last period deltas.
+    """
+    if len(periods) < 2:
+        return None
+    periods = periods[:COMPARISON_MAX_PERIODS]
+
+    comparison_sql = build_comparison_sql(dimension, where, periods, tolerance)
+    logger.info(f"📝 Period comparison SQL ({dimension}):\n{comparison_sql}")
+    result = execute_cached_query(arc, database_id, comparison_sql, 1_000_000)
+    if not result.success or result.df is None:
+        logger.warning(f"Period comparison query failed: {result.error if not result.success else 'No data'}")
+        return None
+    if result.df.empty:
+        return None
+
+    labels = [label for label, _, _ in periods]
+    comparison_df = result.df
+    if dimension == "contractName":
+        member_rows, contract_rows = comparison_df, comparison_df.iloc[0:0]
+    else:
+        is_contract = comparison_df["is_contract_row"].astype(int) == 1
+        member_rows, contract_rows = comparison_df[~is_contract], comparison_df[is_contract]
+
+    members = compare_periods(member_rows, dimension, len(periods))
+    contracts = compare_periods(contract_rows, "contractName", len(periods)) if not contract_rows.empty else pd.DataFrame()
+    return {
+        "labels": labels,
+        "members": encode_names(members),
+        "contracts": encode_names(contracts),
+        "totals": summarize_periods(members, labels)
+    }
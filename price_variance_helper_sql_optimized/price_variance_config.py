@@ -1,5 +1,43 @@
 # HTML Templates for Price Variance Deep Dive Analysis
 
+import os
+import tempfile
+
+# Local directory for persisted samples, cubes and other precomputed state
+CACHE_DIR = os.environ.get("PRICE_VARIANCE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "price_variance_cache"))
+
+# Durable directory of the recovery pipeline store - point it at a persistent volume shared by the workers
+RECOVERY_STORE_DIR = os.environ.get("PRICE_VARIANCE_RECOVERY_DIR", os.path.join(os.path.expanduser("~"), ".price_variance"))
+
+# Warehouse path of the derived columnar copy of the transaction table written at ingest
+DERIVED_TABLE_PATH = os.environ.get("PRICE_VARIANCE_DERIVED_TABLE", "procurement_compliance_v8_derived.parquet")
+
+# Warm-up started by the first invocation on a worker - set PRICE_VARIANCE_WARMUP=0 to disable
+WARMUP_ENABLED = os.environ.get("PRICE_VARIANCE_WARMUP", "1") != "0"
+
+# Hot (time_periods, other_filters) combinations run by the warm-up.
+# "<current_quarter>" becomes e.g. "q3 2025"; "column: *" expands to every value of the column.
+WARMUP_COMBINATIONS = [
+    {"time_periods": [], "other_filters": []},
+    {"time_periods": ["<current_quarter>"], "other_filters": []},
+    {"time_periods": ["ytd"], "other_filters": []},
+    {"time_periods": [], "other_filters": ["operatingUnit: *"]},
+]
+
+# End-to-end time budget of one invocation and the window each stage may use within it (seconds).
+# Override with PRICE_VARIANCE_DEADLINE_SECONDS and e.g. PRICE_VARIANCE_STAGE_BUDGETS="queries=5,llm=4"
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("PRICE_VARIANCE_DEADLINE_SECONDS", "10"))
+STAGE_BUDGETS_SECONDS = {"queries": 3.0, "contract": 1.5, "analytics": 2.5, "llm": 3.0}
+STAGE_BUDGETS_SECONDS.update({
+    stage.strip(): float(seconds)
+    for stage, _, seconds in (item.partition("=") for item in os.environ.get("PRICE_VARIANCE_STAGE_BUDGETS", "").split(","))
+    if seconds.strip()
+})
+
+# Estimated token budget of the facts rendered into the insight and max response prompts.
+# Lowest-ranked facts are dropped first to stay within it - override with PRICE_VARIANCE_FACT_TOKEN_BUDGET
+FACT_TOKEN_BUDGET = int(os.environ.get("PRICE_VARIANCE_FACT_TOKEN_BUDGET", "1200"))
+
 # Final prompt template
 FINAL_PROMPT_TEMPLATE = """Based on the price variance analysis:
 
@@ -7,7 +45,7 @@ FINAL_PROMPT_TEMPLATE = """Based on the price variance analysis:
 - Total variance impact of {total_variance} indicates opportunities for cost savings through improved price compliance
 - Average variance rate of {avg_variance_rate:.1f}% across {total_transactions:,} transactions
 - Price compliance rate stands at {compliance_rate:.1f}%
-- Top supplier {top_supplier} accounts for {top_supplier_variance} in variance
+- Top {top_label} {top_supplier} accounts for {top_supplier_variance} in variance
 
 **Top Opportunities:**
 {top_opportunities}
@@ -0,0 +1,227 @@
+"""Sparse category × supplier variance matrix
+
+Most suppliers sell into a handful of categories, so the category × supplier cross-tab is
+mostly empty and a dense pivot of it grows with categories × suppliers. CategorySupplierMatrix
+keeps only the non-empty cells: coordinates are the dictionary codes of the two name
+columns (see price_variance_encoding) and every registry part the cross-tab metrics need
+is one array aligned with them.
+
+- cells are stored in COO form sorted row-major, so the row pointer (indptr) makes it CSR
+  as well; a column permutation with its own pointer gives column-major access
+- duplicate coordinates (cube cells split by month, unit and contract, or drill tree
+  contract nodes) are merged while building, by a bincount over the cell keys
+- marginal totals, per-row / per-column top-K and the overall top-K cells never densify
+- heatmap downsampling keeps the top rows and columns by variance and folds the rest
+  into one "All other" row and column, so the chart stays small for any cardinality
+
+The matrix is built from whichever source covers the request: the memoized drill tree,
+the monthly cube cells, or one GROUP BY category, supplierName query.
+"""
+
+from __future__ import annotations
+import logging
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_encoding import name_codes, encode_names
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE, apply_tolerance
+from price_variance_helper_sql_optimized.price_variance_metrics import compile_metrics_sql, required_parts, derive_metrics
+from price_variance_helper_sql_optimized.price_variance_cube import MonthlyCube
+from price_variance_helper_sql_optimized.price_variance_drilltree import DrillTree
+
+logger = logging.getLogger(__name__)
+
+CROSSTAB_ROWS, CROSSTAB_COLUMNS = "category", "supplierName"
+
+CROSSTAB_METRICS = ["total_variance", "variance_pct", "compliance_rate", "transaction_count"]
+CROSSTAB_PARTS = required_parts(CROSSTAB_METRICS)
+
+# Result rows above this are not loaded (the GROUP BY result would be truncated)
+CROSSTAB_MAX_CELLS = 250_000
+
+# Heatmap size after downsampling, excluding the "All other" row and column
+HEATMAP_MAX_ROWS = 12
+HEATMAP_MAX_COLUMNS = 15
+
+def build_crosstab_sql(where: str, tolerance: Tolerance = DEFAULT_TOLERANCE) -> str:
+    """GROUP BY query for the parts of every non-empty category × supplier cell"""
+    return compile_metrics_sql(CROSSTAB_METRICS, where, [CROSSTAB_ROWS, CROSSTAB_COLUMNS], tolerance=tolerance)
+
+def dictionary_codes(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """(codes, names) of a name column with missing names given their own '' code"""
+    codes, names = name_codes(values)
+    names = pd.Index(names.astype(object).where(pd.notna(names), "").astype(str))
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(names), codes)
+        names = names.append(pd.Index([""]))
+    return codes.astype(np.int64), names
+
+class CategorySupplierMatrix:
+    """Non-empty category × supplier cells as COO / CSR arrays of registry parts"""
+
+    def __init__(self, row_codes: np.ndarray, column_codes: np.ndarray, parts: dict, row_names: pd.Index,
+                 column_names: pd.Index):
+        self.row_names = row_names
+        self.column_names = column_names
+        self.shape = (len(row_names), len(column_names))
+
+        # Merge duplicate coordinates; np.unique also sorts the cells row-major
+        keys, inverse = np.unique(row_codes * self.shape[1] + column_codes, return_inverse=True)
+        self.rows = keys // self.shape[1]
+        self.columns = keys % self.shape[1]
+        self.parts = {name: np.bincount(inverse, weights=np.asarray(values, dtype=float), minlength=len(keys))
+                      for name, values in parts.items()}
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(self.rows, minlength=self.shape[0]))])
+        self.column_order = np.argsort(self.columns, kind="stable")
+        self.column_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.columns, minlength=self.shape[1]))])
+
+    @classmethod
+    def from_frame(cls, parts_df: pd.DataFrame) -> CategorySupplierMatrix:
+        """Matrix from rows of category, supplierName and the CROSSTAB_PARTS (duplicates are summed)"""
+        row_codes, row_names = dictionary_codes(parts_df[CROSSTAB_ROWS])
+        column_codes, column_names = dictionary_codes(parts_df[CROSSTAB_COLUMNS])
+        parts = {part: parts_df[part].fillna(0).to_numpy(dtype=float) for part in CROSSTAB_PARTS}
+        return cls(row_codes, column_codes, parts, row_names, column_names)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.rows)
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.parts["variance_sum"]
+
+    def cells_frame(self, positions: np.ndarray) -> pd.DataFrame:
+        """category, supplierName and the cross-tab metrics of the cells at the positions"""
+        parts = pd.DataFrame({name: values[positions] for name, values in self.parts.items()})
+        cells_df = derive_metrics(parts, CROSSTAB_METRICS)
+        cells_df.insert(0, CROSSTAB_COLUMNS, self.column_names[self.columns[positions]])
+        cells_df.insert(0, CROSSTAB_ROWS, self.row_names[self.rows[positions]])
+        return encode_names(cells_df)
+
+    def marginal_parts(self, axis: int) -> pd.DataFrame:
+        """Parts summed per row (axis 0: categories) or per column (axis 1: suppliers), empty members dropped"""
+        codes, names, size = ((self.rows, self.row_names, self.shape[0]) if axis == 0
+                              else (self.columns, self.column_names, self.shape[1]))
+        parts = pd.DataFrame({name: np.bincount(codes, weights=values, minlength=size) for name, values in self.parts.items()})
+        parts.index = names
+        return parts[parts["transaction_count"] > 0]
+
+    def marginals(self, axis: int) -> pd.DataFrame:
+        """Cross-tab metrics per category (axis 0) or supplier (axis 1), largest variance first"""
+        parts = self.marginal_parts(axis)
+        dimension = CROSSTAB_ROWS if axis == 0 else CROSSTAB_COLUMNS
+        marginal_df = derive_metrics(parts, CROSSTAB_METRICS).rename_axis(dimension).reset_index()
+        return encode_names(marginal_df.sort_values("total_variance", ascending=False, kind="stable").reset_index(drop=True))
+
+    def totals(self) -> pd.Series:
+        """Grand-total parts"""
+        return pd.Series({name: float(values.sum()) for name, values in self.parts.items()})
+
+    def top_positions(self, positions: np.ndarray, k: int) -> np.ndarray:
+        """The k positions with the largest variance, largest first"""
+        if len(positions) > k:
+            positions = positions[np.argpartition(-self.variance[positions], k - 1)[:k]]
+        return positions[np.argsort(-self.variance[positions], kind="stable")]
+
+    def row_top_k(self, category: str, k: int = 5) -> pd.DataFrame:
+        """Top-k suppliers within a category - one CSR row slice"""
+        code = self.row_names.get_indexer([category])[0]
+        if code < 0:
+            return self.cells_frame(np.array([], dtype=np.int64))
+        return self.cells_frame(self.top_positions(np.arange(self.indptr[code], self.indptr[code + 1]), k))
+
+    def column_top_k(self, supplier: str, k: int = 5) -> pd.DataFrame:
+        """Top-k categories of a supplier - one slice of the column permutation"""
+        code = self.column_names.get_indexer([supplier])[0]
+        if code < 0:
+            return self.cells_frame(np.array([], dtype=np.int64))
+        return self.cells_frame(self.top_positions(self.column_order[self.column_indptr[code]:self.column_indptr[code + 1]], k))
+
+    def top_cells(self, k: int = 10) -> pd.DataFrame:
+        """The k cells with the largest variance, with each cell's share of its category's positive variance"""
+        positions = self.top_positions(np.arange(self.nnz), k)
+        cells_df = self.cells_frame(positions)
+        leakage = np.bincount(self.rows, weights=np.clip(self.variance, 0, None), minlength=self.shape[0])[self.rows[positions]]
+        cells_df["category_share"] = np.where(leakage > 0, np.clip(self.variance[positions], 0, None) * 100.0 / np.where(leakage > 0, leakage, 1), np.nan)
+        return cells_df
+
+    def downsample(self, max_rows: int = HEATMAP_MAX_ROWS, max_columns: int = HEATMAP_MAX_COLUMNS) -> dict:
+        """
+        Heatmap grid of the top rows and columns by variance with the rest folded into an
+        "All other" row and column - {'row_names', 'column_names', 'variance', 'compliance_rate',
+        'transaction_count'}, dense arrays of at most (max_rows + 1) × (max_columns + 1).
+        """
+        row_slot, row_labels = self._slots(0, max_rows, "All other categories")
+        column_slot, column_labels = self._slots(1, max_columns, "All other suppliers")
+        shape = (len(row_labels), len(column_labels))
+        cell_slot = row_slot[self.rows] * shape[1] + column_slot[self.columns]
+        grid = {name: np.bincount(cell_slot, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+                for name, values in self.parts.items()}
+        counts = grid["transaction_count"]
+        return {
+            "row_names": row_labels,
+            "column_names": column_labels,
+            "variance": np.where(counts > 0, grid["variance_sum"], np.nan),
+            "compliance_rate": np.where(counts > 0, grid["compliant_count"] * 100.0 / np.where(counts > 0, counts, 1), np.nan),
+            "transaction_count": counts.astype(int)
+        }
+
+    def _slots(self, axis: int, limit: int, others_label: str) -> tuple[np.ndarray, list]:
+        """Grid slot per code (kept members in variance order, the rest in a trailing others slot) and slot labels"""
+        size = self.shape[axis]
+        codes = self.rows if axis == 0 else self.columns
+        names = self.row_names if axis == 0 else self.column_names
+        variance = np.bincount(codes, weights=self.variance, minlength=size)
+        present = np.flatnonzero(np.bincount(codes, minlength=size))
+        ranked = present[np.argsort(-variance[present], kind="stable")]
+        kept = ranked[:limit]
+        slot = np.full(size, len(kept), dtype=np.int64)
+        slot[kept] = np.arange(len(kept))
+        labels = [str(names[code]) for code in kept] + ([others_label] if len(ranked) > limit else [])
+        return slot, labels
+
+def summarize_crosstab(matrix: CategorySupplierMatrix) -> dict:
+    """Sparsity and concentration figures for the page KPIs and facts"""
+    categories, suppliers = len(matrix.marginal_parts(0)), len(matrix.marginal_parts(1))
+    positive = np.clip(matrix.variance, 0, None)
+    leakage = float(positive.sum())
+    top10 = float(np.sort(positive)[::-1][:10].sum())
+    return {
+        "pairs": matrix.nnz,
+        "categories": categories,
+        "suppliers": suppliers,
+        "density_pct": matrix.nnz * 100.0 / (categories * suppliers) if categories and suppliers else 0.0,
+        "leaking_pairs": int((matrix.variance > 0).sum()),
+        "positive_variance": leakage,
+        "top10_share": top10 * 100.0 / leakage if leakage > 0 else 0.0
+    }
+
+def fetch_crosstab(arc, database_id: str, where: str, cube: MonthlyCube | None = None, time_ranges: list = (),
+                   predicates: list | None = None, tolerance: Tolerance = DEFAULT_TOLERANCE,
+                   tree: DrillTree | None = None, constraints: dict | None = None) -> CategorySupplierMatrix | None:
+    """
+    The category × supplier matrix - from the drill tree nodes when a tree for the base
+    filter is in memory, from the cube cells when they cover the request, otherwise from one
+    GROUP BY query. Returns None when the query fails or has too many cells.
+    """
+    if tree is not None:
+        logger.info("🌳 Category × supplier cross-tab from the drill tree")
+        parts_df = tree.level_parts([CROSSTAB_ROWS, CROSSTAB_COLUMNS], constraints, tolerance)
+        return CategorySupplierMatrix.from_frame(parts_df)
+
+    if cube is not None and predicates is not None and cube.covers(time_ranges, predicates):
+        logger.info("🧊 Category × supplier cross-tab from the cube")
+        cells = apply_tolerance(cube.select(list(time_ranges), predicates), tolerance)
+        return CategorySupplierMatrix.from_frame(cells)
+
+    crosstab_sql = build_crosstab_sql(where, tolerance)
+    logger.info(f"📝 Cross-tab SQL:\n{crosstab_sql}")
+    result = execute_cached_query(arc, database_id, crosstab_sql, CROSSTAB_MAX_CELLS + 1)
+    if not result.success or result.df is None:
+        logger.warning(f"Cross-tab query failed: {result.error if not result.success else 'No data'}")
+        return None
+    if len(result.df) > CROSSTAB_MAX_CELLS:
+        logger.warning(f"Cross-tab skipped: more than {CROSSTAB_MAX_CELLS:,} category × supplier cells")
+        return None
+    return CategorySupplierMatrix.from_frame(encode_names(result.df, [CROSSTAB_ROWS, CROSSTAB_COLUMNS]))
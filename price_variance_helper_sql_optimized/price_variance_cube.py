@@ -0,0 +1,396 @@
+"""Precomputed monthly cube of variance aggregates with mergeable sketches
+
+Cells are keyed by month × category × operatingUnit × supplierName × contractName and
+hold additive aggregates (sums and counts), including cumulative absolute and relative
+variance histograms so compliance at any tolerance is a lookup (see
+price_variance_tolerance). Alongside them the cube stores:
+
+- a DDSketch of variance_pct per cell, so median/p95 per supplier or contract for any
+  month range is a merge of cell sketches
+- HyperLogLog sketches of supplierName and contractName per month × category ×
+  operatingUnit partition, so COUNT(DISTINCT ...) for any range is a register merge
+
+Everything is mergeable, so any month-aligned date range and filter on the cube
+dimensions is answered without touching raw rows.
+
+Dimension columns are dictionary-encoded (see price_variance_encoding) and the cell
+sketches are keyed by cell position, so merges group on integer codes.
+
+The cube is maintained incrementally: when it expires only the most recent
+CUBE_REFRESH_MONTHS months are re-aggregated and swapped in, and a full rebuild happens
+once every CUBE_FULL_REBUILD_SECONDS to pick up late corrections to older months.
+"""
+
+from __future__ import annotations
+import os
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import CACHE_DIR
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql, column_sql, pinned_table_source
+from price_variance_helper_sql_optimized.price_variance_sketches import HyperLogLog, DDSketch, ddsketch_key_sql
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names, name_codes
+from price_variance_helper_sql_optimized.price_variance_storage import read_private_pickle, write_private_pickle
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE, build_histogram_sql, apply_tolerance
+from price_variance_helper_sql_optimized.price_variance_metrics import CELL_PARTS, parts_sql, derive_metrics
+
+logger = logging.getLogger(__name__)
+
+# Cell dimensions (besides month_key) and the subset used for HyperLogLog partitions
+CUBE_DIMENSIONS = ["category", "operatingUnit", "supplierName", "contractName"]
+CUBE_PARTITION_DIMENSIONS = ["category", "operatingUnit"]
+CUBE_KEY = ["month_key"] + CUBE_DIMENSIONS
+
+CUBE_MAX_ROWS = 5_000_000
+CUBE_TTL_SECONDS = 24 * 60 * 60
+
+# Answers served from a cube older than this say how old it is (fresh query results are cached as long)
+CUBE_AGE_NOTE_SECONDS = 15 * 60
+
+# Incremental refresh window and the interval between full rebuilds
+CUBE_REFRESH_MONTHS = 2
+CUBE_FULL_REBUILD_SECONDS = 7 * 24 * 60 * 60
+
+# Bumped whenever the persisted layout changes so stale pickles are rebuilt
+CUBE_FORMAT_VERSION = 4
+
+_cube_lock = threading.Lock()
+_cube_memo = {}
+_cube_file_mtimes = {}
+_cube_builds = set()
+
+def build_cube_sql(where: str = "1=1") -> tuple[str, str]:
+    """SQL for the cube cells and for the variance_pct sketch buckets"""
+    dimensions = ", ".join(CUBE_DIMENSIONS)
+    month_key = column_sql("month_key")
+    cells_sql = f"""
+    SELECT
+        {month_key} as month_key,
+        {dimensions},
+        {parts_sql(CELL_PARTS)},
+        {build_histogram_sql()}
+    FROM {table_sql()}
+    WHERE {where}
+    GROUP BY {month_key}, {dimensions}
+    """
+
+    sign_sql, key_sql = ddsketch_key_sql(column_sql("variance_pct"))
+    buckets_sql = f"""
+    SELECT month_key, {dimensions}, bucket_sign, bucket_key, COUNT(*) as bucket_count
+    FROM (
+        SELECT
+            {month_key} as month_key,
+            {dimensions},
+            {sign_sql} as bucket_sign,
+            {key_sql} as bucket_key
+        FROM {table_sql()}
+        WHERE {where} AND expectedPrice IS NOT NULL AND expectedPrice <> 0
+    ) buckets
+    GROUP BY month_key, {dimensions}, bucket_sign, bucket_key
+    """
+    return cells_sql, buckets_sql
+
+class MonthlyCube:
+    """Monthly aggregate cells plus per-cell DDSketches (keyed by cell position) and per-partition HyperLogLogs"""
+
+    def __init__(self, cells: pd.DataFrame, pct_sketches: dict, partition_hlls: dict, built_at: float | None = None,
+                 full_built_at: float | None = None):
+        self.cells = cells.reset_index(drop=True)
+        self.pct_sketches = pct_sketches
+        self.partition_hlls = partition_hlls
+        self.built_at = built_at or time.time()
+        self.full_built_at = full_built_at or self.built_at
+
+    def age(self) -> float:
+        """Seconds since the cube was built or last refreshed"""
+        return time.time() - self.built_at
+
+    @classmethod
+    def from_query_results(cls, cells: pd.DataFrame, buckets: pd.DataFrame) -> MonthlyCube:
+        """Build sketches from the cell and bucket query results"""
+        cells = cells.copy()
+        cells["month_key"] = cells["month_key"].astype(int)
+        for dimension in CUBE_DIMENSIONS:
+            cells[dimension] = cells[dimension].astype(str)
+        cells = encode_names(cells.reset_index(drop=True), CUBE_DIMENSIONS)
+
+        pct_sketches = {}
+        if buckets is not None and not buckets.empty:
+            buckets = buckets.copy()
+            buckets["month_key"] = buckets["month_key"].astype(int)
+            for dimension in CUBE_DIMENSIONS:
+                buckets[dimension] = buckets[dimension].astype(cells[dimension].dtype)
+            cell_ids = cells[CUBE_KEY].assign(cell_id=np.arange(len(cells)))
+            buckets = buckets.merge(cell_ids, on=CUBE_KEY, how="inner")
+            for cell_id, group in buckets.groupby("cell_id", sort=False):
+                sketch = DDSketch()
+                sign = group["bucket_sign"].to_numpy()
+                sketch.zero_count = int(group.loc[sign == 0, "bucket_count"].sum())
+                sketch.count = sketch.zero_count
+                sketch.add_bucket_counts(sketch.positive, group.loc[sign > 0, "bucket_key"], group.loc[sign > 0, "bucket_count"])
+                sketch.add_bucket_counts(sketch.negative, group.loc[sign < 0, "bucket_key"], group.loc[sign < 0, "bucket_count"])
+                pct_sketches[int(cell_id)] = sketch
+
+        partition_hlls = {}
+        for key, group in cells.groupby(["month_key"] + CUBE_PARTITION_DIMENSIONS, sort=False, observed=True):
+            partition_hlls[key] = {
+                "supplierName": HyperLogLog().add(group["supplierName"].unique()),
+                "contractName": HyperLogLog().add(group["contractName"].unique())
+            }
+
+        return cls(cells, pct_sketches, partition_hlls)
+
+    def replace_months(self, fresh: MonthlyCube) -> MonthlyCube:
+        """New cube with every month present in `fresh` taken from it and the rest kept from this cube"""
+        fresh_months = set(fresh.month_keys.tolist())
+        keep = ~self.cells["month_key"].isin(fresh_months).to_numpy()
+        kept_positions = np.flatnonzero(keep)
+
+        cells = pd.concat([self.cells.iloc[kept_positions], fresh.cells], ignore_index=True)
+        for dimension in CUBE_DIMENSIONS:
+            cells[dimension] = cells[dimension].astype(str)
+        cells = encode_names(cells, CUBE_DIMENSIONS)
+
+        pct_sketches = {}
+        for new_position, old_position in enumerate(kept_positions.tolist()):
+            if old_position in self.pct_sketches:
+                pct_sketches[new_position] = self.pct_sketches[old_position]
+        offset = len(kept_positions)
+        for position, sketch in fresh.pct_sketches.items():
+            pct_sketches[offset + position] = sketch
+
+        partition_hlls = {key: hlls for key, hlls in self.partition_hlls.items() if key[0] not in fresh_months}
+        partition_hlls.update(fresh.partition_hlls)
+        return MonthlyCube(cells, pct_sketches, partition_hlls, built_at=fresh.built_at, full_built_at=self.full_built_at)
+
+    def monthly_trend(self, time_ranges: list, predicates: list, by: str | None = None,
+                      tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+        """Monthly variance and compliance rollup (optionally split by a dimension) - one row per month [× member]"""
+        cells = apply_tolerance(self.select(time_ranges, predicates), tolerance)
+        keys = ["month_key"] + ([by] if by else [])
+        trend = cells.groupby(keys, observed=True, sort=True)[
+            ["variance_sum", "invoice_sum", "compliant_count", "transaction_count"]
+        ].sum().reset_index()
+        trend["compliance_rate"] = derive_metrics(trend, ["compliance_rate"])["compliance_rate"]
+        return trend
+
+    @property
+    def month_keys(self) -> np.ndarray:
+        return np.sort(self.cells["month_key"].unique())
+
+    def month_keys_for(self, time_ranges: list) -> set | None:
+        """Month keys covered by the time ranges, or None when a range is not month aligned"""
+        if not time_ranges:
+            return set(self.month_keys.tolist())
+
+        month_keys = set()
+        for start_date, end_date in time_ranges:
+            start = pd.Timestamp(start_date)
+            if start.day != 1:
+                return None
+            start_key = start.year * 100 + start.month
+            if end_date is None:
+                end_key = int(self.month_keys.max()) if len(self.cells) else start_key
+            else:
+                end = pd.Timestamp(end_date)
+                if (end + pd.Timedelta(days=1)).day != 1:
+                    return None
+                end_key = end.year * 100 + end.month
+            month_keys.update(k for k in self.month_keys.tolist() if start_key <= k <= end_key)
+        return month_keys
+
+    def covers(self, time_ranges: list, predicates: list) -> bool:
+        """Whether the cube can answer a query with these time ranges and equality predicates"""
+        if self.month_keys_for(time_ranges) is None:
+            return False
+        return all(column in CUBE_DIMENSIONS for column, _ in predicates)
+
+    def select(self, time_ranges: list, predicates: list) -> pd.DataFrame:
+        """Cells matching the time ranges and predicates (the index is the cell position)"""
+        month_keys = self.month_keys_for(time_ranges)
+        mask = self.cells["month_key"].isin(month_keys).to_numpy()
+        for column, value in predicates:
+            mask = mask & (self.cells[column] == str(value)).to_numpy()
+        return self.cells[mask]
+
+    def distinct_count(self, dimension: str, time_ranges: list, predicates: list) -> int:
+        """COUNT(DISTINCT dimension) - HyperLogLog merge when the filters only touch partition columns"""
+        if dimension in ("supplierName", "contractName") and all(column in CUBE_PARTITION_DIMENSIONS for column, _ in predicates):
+            month_keys = self.month_keys_for(time_ranges)
+            wanted = {column: str(value) for column, value in predicates}
+            partition_names = ["month_key"] + CUBE_PARTITION_DIMENSIONS
+            sketches = []
+            for key, hlls in self.partition_hlls.items():
+                values = dict(zip(partition_names, key))
+                if values["month_key"] in month_keys and all(values[c] == v for c, v in wanted.items()):
+                    sketches.append(hlls[dimension])
+            return HyperLogLog.merged(sketches).count() if sketches else 0
+
+        return int(self.select(time_ranges, predicates)[dimension].nunique())
+
+    def pct_buckets(self) -> pd.DataFrame:
+        """
+        Every cell sketch as flat bucket rows (cell_id, value, count) - value is the signed
+        bucket value, 0 for the zero bucket. Built once per cube from the sketches.
+        """
+        buckets = getattr(self, "_pct_buckets", None)
+        if buckets is None:
+            cell_ids, keys, signs, counts = [], [], [], []
+            for cell_id, sketch in self.pct_sketches.items():
+                for sign, store in ((1, sketch.positive), (-1, sketch.negative)):
+                    cell_ids.extend([cell_id] * len(store))
+                    keys.extend(store.keys())
+                    signs.extend([sign] * len(store))
+                    counts.extend(store.values())
+                if sketch.zero_count:
+                    cell_ids.append(cell_id)
+                    keys.append(0)
+                    signs.append(0)
+                    counts.append(sketch.zero_count)
+            gamma = DDSketch().gamma
+            signs = np.asarray(signs, dtype=np.int64)
+            values = signs * (2 * gamma ** np.asarray(keys, dtype=float) / (gamma + 1))
+            buckets = pd.DataFrame({"cell_id": np.asarray(cell_ids, dtype=np.int64), "value": values,
+                                    "count": np.asarray(counts, dtype=np.int64)})
+            self._pct_buckets = buckets
+        return buckets
+
+    def variance_pct_quantiles(self, group_by: str, time_ranges: list, predicates: list,
+                               quantiles: tuple = (0.5, 0.95)) -> pd.DataFrame:
+        """Per-member variance_pct quantiles from the merged cell sketch buckets, one groupby for all members"""
+        columns = [group_by] + [quantile_column(q) for q in quantiles]
+        cells = self.select(time_ranges, predicates)
+        member_codes, members = name_codes(cells[group_by])
+        buckets = self.pct_buckets()
+        cell_member = pd.Series(member_codes, index=cells.index)
+        buckets = buckets[buckets["cell_id"].isin(cell_member.index)]
+        if buckets.empty:
+            return pd.DataFrame(columns=columns)
+
+        merged = (buckets.assign(member=cell_member.reindex(buckets["cell_id"]).to_numpy())
+                  .groupby(["member", "value"], sort=True)["count"].sum().reset_index())
+        seen = merged.groupby("member", sort=False)["count"].cumsum().to_numpy()
+        total = merged.groupby("member", sort=False)["count"].transform("sum").to_numpy()
+
+        result = pd.DataFrame(index=pd.Index(merged["member"].unique(), name="member"))
+        for q in quantiles:
+            # First bucket (ascending value) whose cumulative count passes the rank, as in DDSketch.quantile
+            reached = merged[seen > q * (total - 1)]
+            result[quantile_column(q)] = reached.groupby("member", sort=False)["value"].first()
+        result.insert(0, group_by, members[result.index.to_numpy()])
+        return result.reset_index(drop=True)[columns]
+
+def quantile_column(q: float) -> str:
+    """Column name for a variance_pct quantile"""
+    return "median_variance_pct" if q == 0.5 else f"p{int(round(q * 100))}_variance_pct"
+
+def get_cube_path(database_id: str) -> str:
+    """Location of the persisted cube for a database"""
+    return os.path.join(CACHE_DIR, f"monthly_cube_v{CUBE_FORMAT_VERSION}_{database_id}.pkl")
+
+def query_monthly_cube(arc, database_id: str, where: str = "1=1") -> MonthlyCube | None:
+    """Run the two cube queries for the rows matching `where`"""
+    cells_sql, buckets_sql = build_cube_sql(where)
+    cells_result = arc.data.execute_sql_query(database_id, cells_sql, CUBE_MAX_ROWS + 1)
+    if not cells_result.success or cells_result.df is None or cells_result.df.empty:
+        logger.warning(f"Cube cell query failed: {cells_result.error if not cells_result.success else 'No data'}")
+        return None
+    if len(cells_result.df) > CUBE_MAX_ROWS:
+        logger.warning(f"Cube not built: more than {CUBE_MAX_ROWS:,} cells")
+        return None
+    buckets_result = arc.data.execute_sql_query(database_id, buckets_sql, CUBE_MAX_ROWS + 1)
+    buckets = buckets_result.df if buckets_result.success else None
+    if buckets is not None and len(buckets) > CUBE_MAX_ROWS:
+        logger.warning(f"Cube not built: more than {CUBE_MAX_ROWS:,} sketch buckets")
+        return None
+    return MonthlyCube.from_query_results(cells_result.df, buckets)
+
+def refresh_start_key(cube: MonthlyCube, months: int = CUBE_REFRESH_MONTHS) -> int:
+    """First month key of the incremental refresh window (the latest `months` months of the cube)"""
+    latest = pd.Timestamp(year=int(cube.month_keys.max()) // 100, month=int(cube.month_keys.max()) % 100, day=1)
+    start = latest - pd.DateOffset(months=months - 1)
+    return start.year * 100 + start.month
+
+def build_monthly_cube(arc, database_id: str, base: MonthlyCube | None = None) -> MonthlyCube | None:
+    """
+    Refresh `base` incrementally (latest months only) when it is recent enough,
+    otherwise run a full build. The result is persisted.
+    """
+    with pinned_table_source():
+        if base is not None and len(base.cells) and time.time() - base.full_built_at < CUBE_FULL_REBUILD_SECONDS:
+            start_key = refresh_start_key(base)
+            logger.info(f"🧊 Refreshing monthly cube from month {start_key}...")
+            fresh = query_monthly_cube(arc, database_id, f"{column_sql('month_key')} >= {start_key}")
+            cube = base.replace_months(fresh) if fresh is not None else None
+        else:
+            logger.info("🧊 Building monthly cube with sketches...")
+            cube = query_monthly_cube(arc, database_id)
+    if cube is None:
+        return None
+
+    path = get_cube_path(database_id)
+    try:
+        write_private_pickle(cube, path)
+        with _cube_lock:
+            _cube_file_mtimes[path] = os.path.getmtime(path)
+    except Exception as e:
+        logger.warning(f"Could not persist monthly cube to {path}: {e}")
+
+    logger.info(f"✅ Monthly cube ready: {len(cube.cells):,} cells, {len(cube.pct_sketches):,} sketches")
+    return cube
+
+def load_monthly_cube(arc, database_id: str, build_if_missing: bool = True) -> MonthlyCube | None:
+    """Return the cube from memory or disk, building it when missing or expired"""
+    path = get_cube_path(database_id)
+    with _cube_lock:
+        cube = _cube_memo.get(path)
+        if cube is not None and time.time() - cube.built_at < CUBE_TTL_SECONDS:
+            return cube
+        stale = cube
+
+        # The file is only re-read when it changed since it was last read or written here
+        if os.path.exists(path) and os.path.getmtime(path) != _cube_file_mtimes.get(path):
+            try:
+                _cube_file_mtimes[path] = os.path.getmtime(path)
+                cube = read_private_pickle(path)
+                _cube_memo[path] = cube
+                if time.time() - cube.built_at < CUBE_TTL_SECONDS:
+                    return cube
+                stale = cube
+            except Exception as e:
+                logger.warning(f"Could not read persisted cube {path}: {e}")
+
+    if not build_if_missing:
+        return None
+
+    # An expired cube is the base for an incremental refresh
+    cube = build_monthly_cube(arc, database_id, base=stale)
+    if cube is not None:
+        with _cube_lock:
+            _cube_memo[path] = cube
+    return cube
+
+def get_monthly_cube(arc, database_id: str) -> MonthlyCube | None:
+    """Non-blocking cube lookup - starts a background build when the cube is not ready yet"""
+    cube = load_monthly_cube(arc, database_id, build_if_missing=False)
+    if cube is not None:
+        return cube
+
+    with _cube_lock:
+        if database_id in _cube_builds:
+            return None
+        _cube_builds.add(database_id)
+
+    def build():
+        try:
+            load_monthly_cube(arc, database_id)
+        except Exception as e:
+            logger.warning(f"Background cube build failed: {e}")
+        finally:
+            with _cube_lock:
+                _cube_builds.discard(database_id)
+
+    threading.Thread(target=build, name="price-variance-cube-build", daemon=True).start()
+    return None
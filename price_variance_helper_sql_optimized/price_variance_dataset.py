@@ -0,0 +1,309 @@
+"""Derived columnar copy of the transaction table
+
+The source table is a CSV, so every query re-parsed it and recomputed the same row
+expressions - invoicePrice - expectedPrice, the NULLIF-guarded percentage, the ABS(...)
+compliance comparison and YEAR/MONTH of a date cast - for every row on every call. The
+ingest step writes one Parquet copy of the table (DERIVED_TABLE_PATH) with those derived
+columns stored, sorted by date so month and date filters skip whole row groups:
+
+- variance_amount, variance_pct, abs_variance
+- is_compliant - compliance at the default tolerance of COMPLIANT_FLAG_TOLERANCE dollars
+- year_key (2025), quarter_key (20253), month_key (202507) and date_key (20250715)
+
+Queries read the table through table_sql() and the row expressions through column_sql(),
+which return the copy and its stored columns once the copy is verified, and the CSV and
+the equivalent expressions until then - or for good when the warehouse does not accept
+the COPY - so every query is correct either way. Period filters compare integer date
+keys (date_range_sql).
+
+The choice between copy and CSV is a TableSource snapshot pinned once per request
+(pinned_table_source / pin_table_source), so all SQL of one request is built against the
+same table even when a background check switches the source meanwhile.
+
+At most every DERIVED_TABLE_CHECK_SECONDS the CSV's cheap fingerprint (file size and
+mtime, or row count and latest date) is compared with the one recorded at the last
+verification. Only when it changed is the copy verified against a checksum of the CSV
+rows (row count plus the sum of the row hashes over the CSV columns), and rewritten when
+they differ. A rewrite goes to a temporary file that is renamed over the copy, so
+other workers never read a partly written file; this needs the warehouse to write to a
+filesystem the worker shares, otherwise the CSV is queried.
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from datetime import date
+from contextlib import contextmanager
+from typing import Iterator
+from price_variance_helper_sql_optimized.price_variance_config import DERIVED_TABLE_PATH
+
+logger = logging.getLogger(__name__)
+
+RAW_TABLE_PATH = "procurement_compliance_v8.csv"
+RAW_TABLE_SQL = f"read_csv('{RAW_TABLE_PATH}')"
+DERIVED_TABLE_SQL = f"read_parquet('{DERIVED_TABLE_PATH}')"
+
+# Dollar tolerance the stored is_compliant flag is computed at (the default tolerance)
+COMPLIANT_FLAG_TOLERANCE = 0.01
+
+# The copy is re-verified against the CSV at most this often
+DERIVED_TABLE_CHECK_SECONDS = 60 * 60
+
+# Fingerprint of the CSV the copy was last verified against, next to the copy
+SOURCE_FINGERPRINT_PATH = f"{DERIVED_TABLE_PATH}.source.json"
+
+DATE_SQL = "CAST(transactionDate AS DATE)"
+
+# Derived column -> the row expression it stores
+DERIVED_COLUMNS = {
+    "variance_amount": "(invoicePrice - expectedPrice)",
+    "variance_pct": "((invoicePrice - expectedPrice) / NULLIF(expectedPrice, 0) * 100)",
+    "abs_variance": "ABS(invoicePrice - expectedPrice)",
+    "is_compliant": f"(ABS(invoicePrice - expectedPrice) <= {COMPLIANT_FLAG_TOLERANCE})",
+    "year_key": f"YEAR({DATE_SQL})",
+    "quarter_key": f"(YEAR({DATE_SQL}) * 10 + QUARTER({DATE_SQL}))",
+    "month_key": f"(YEAR({DATE_SQL}) * 100 + MONTH({DATE_SQL}))",
+    "date_key": f"(YEAR({DATE_SQL}) * 10000 + MONTH({DATE_SQL}) * 100 + DAY({DATE_SQL}))",
+}
+
+_state = {"ready": False, "checked_at": None}
+_ingest_lock = threading.Lock()
+_ingest_running = threading.Event()
+_pinned = contextvars.ContextVar("price_variance_table_source", default=None)
+
+def date_key(value) -> int | None:
+    """Integer date key of an ISO date, e.g. '2025-07-15' -> 20250715 - None when it is not a valid date"""
+    try:
+        day = date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+    return day.year * 10000 + day.month * 100 + day.day
+
+class TableSource:
+    """The table queries read - the derived copy or the CSV - and the SQL of its derived columns"""
+    __slots__ = ("derived",)
+
+    def __init__(self, derived: bool):
+        self.derived = derived
+
+    def __repr__(self) -> str:
+        return f"TableSource(derived={self.derived})"
+
+    def table_sql(self) -> str:
+        """FROM source of the transaction table"""
+        return DERIVED_TABLE_SQL if self.derived else RAW_TABLE_SQL
+
+    def column_sql(self, name: str) -> str:
+        """A derived column - the stored column of the copy, its row expression on the CSV"""
+        return name if self.derived else DERIVED_COLUMNS[name]
+
+    def date_range_sql(self, start_date, end_date=None) -> str:
+        """
+        Condition for transactions on or after start_date and, when given, on or before end_date.
+        Dates that do not parse into a date key are compared on transactionDate instead.
+        """
+        if self.derived:
+            start_key, end_key = date_key(start_date), date_key(end_date) if end_date is not None else None
+            if start_key is not None and end_key is None and end_date is None:
+                return f"date_key >= {start_key}"
+            if start_key is not None and end_key is not None:
+                return f"date_key BETWEEN {start_key} AND {end_key}"
+            logger.warning(f"Date range {start_date!r} - {end_date!r} is not in ISO form, filtering on transactionDate")
+        if end_date is None:
+            return f"transactionDate >= '{start_date}'"
+        return f"(transactionDate >= '{start_date}' AND transactionDate <= '{end_date}')"
+
+def derived_ready() -> bool:
+    """True while the verified derived copy is the source for new requests"""
+    return _state["ready"]
+
+def current_table_source() -> TableSource:
+    """The source pinned for the running request, else the current global choice"""
+    return _pinned.get() or TableSource(_state["ready"])
+
+@contextmanager
+def pinned_table_source() -> Iterator[TableSource]:
+    """Pin the current source for the SQL built inside the block (an outer pin is kept)"""
+    source = _pinned.get()
+    if source is not None:
+        yield source
+        return
+    token = _pinned.set(TableSource(_state["ready"]))
+    try:
+        yield _pinned.get()
+    finally:
+        _pinned.reset(token)
+
+def pin_table_source(iterator: Iterator) -> Iterator:
+    """Items of a generator run in its own context, with the current source pinned for all of it"""
+    context = contextvars.copy_context()
+    context.run(_pinned.set, TableSource(_state["ready"]))
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        context.run(iterator.close)
+
+def table_sql() -> str:
+    """FROM source of the transaction table for the current request"""
+    return current_table_source().table_sql()
+
+def column_sql(name: str) -> str:
+    """A derived column for the current request - stored column or row expression"""
+    return current_table_source().column_sql(name)
+
+def date_range_sql(start_date, end_date=None) -> str:
+    """Date range condition for the current request - integer date keys on the copy"""
+    return current_table_source().date_range_sql(start_date, end_date)
+
+def build_ingest_sql(path: str) -> str:
+    """COPY of the CSV with the derived columns added, sorted by date, to path"""
+    derived = ",\n            ".join(f"{expression} as {name}" for name, expression in DERIVED_COLUMNS.items())
+    return f"""
+    COPY (
+        SELECT *,
+            {derived}
+        FROM {RAW_TABLE_SQL}
+        ORDER BY date_key
+    ) TO '{path}' (FORMAT PARQUET)
+    """
+
+def build_checksum_sql(path: str) -> str:
+    """Row count and row hash sum of the CSV and of the copy at path over the CSV columns"""
+    derived = ", ".join(DERIVED_COLUMNS)
+    return f"""
+    SELECT source.rows as source_rows, source.checksum as source_checksum,
+        derived.rows as copy_rows, derived.checksum as copy_checksum
+    FROM (SELECT COUNT(*) as rows, SUM(hash(t)::HUGEINT) as checksum FROM {RAW_TABLE_SQL} t) source,
+        (SELECT COUNT(*) as rows, SUM(hash(t)::HUGEINT) as checksum
+         FROM (SELECT * EXCLUDE ({derived}) FROM read_parquet('{path}')) t) derived
+    """
+
+def copy_matches_source(arc, database_id: str, path: str = DERIVED_TABLE_PATH) -> bool:
+    """True when the copy at path can be read and holds exactly the rows of the CSV"""
+    result = arc.data.execute_sql_query(database_id, build_checksum_sql(path), 1)
+    if not result.success or result.df is None or result.df.empty:
+        return False
+    row = result.df.iloc[0]
+    return int(row["source_rows"]) == int(row["copy_rows"]) and str(row["source_checksum"]) == str(row["copy_checksum"])
+
+def source_fingerprint(arc, database_id: str) -> dict | None:
+    """
+    Cheap fingerprint of the CSV - its file size and mtime when this worker can stat it,
+    otherwise its row count and latest transaction date. None when neither is available.
+    """
+    try:
+        stat = os.stat(RAW_TABLE_PATH)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+    except OSError:
+        pass
+    result = arc.data.execute_sql_query(database_id, f"""
+    SELECT COUNT(*) as source_rows, MAX(transactionDate) as max_date FROM {RAW_TABLE_SQL}
+    """, 1)
+    if not result.success or result.df is None or result.df.empty:
+        return None
+    row = result.df.iloc[0]
+    return {"rows": int(row["source_rows"]), "max_date": str(row["max_date"])}
+
+def read_verified_fingerprint() -> dict | None:
+    """Fingerprint of the CSV the copy was last verified against, None when unknown"""
+    try:
+        with open(SOURCE_FINGERPRINT_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_verified_fingerprint(fingerprint: dict | None):
+    """Record the fingerprint of the CSV the copy was just verified against"""
+    if fingerprint is None:
+        return
+    temp_path = f"{SOURCE_FINGERPRINT_PATH}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(fingerprint, f)
+        os.replace(temp_path, SOURCE_FINGERPRINT_PATH)
+    except OSError as e:
+        logger.warning(f"Could not record the derived table fingerprint: {e}")
+
+def write_derived_table(arc, database_id: str) -> bool:
+    """COPY the CSV to a temporary file, verify it and rename it over the copy"""
+    temp_path = f"{DERIVED_TABLE_PATH}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    logger.info(f"🗄️ Writing derived table {DERIVED_TABLE_PATH}...")
+    started = time.monotonic()
+    try:
+        result = arc.data.execute_sql_query(database_id, build_ingest_sql(temp_path), 1)
+        # Some clients report a COPY, which returns no rows, as failed - the file and its checksum decide
+        if not os.path.exists(temp_path):
+            logger.warning(f"Derived table not written to a path this worker can reach: {result.error or temp_path}")
+            return False
+        if not copy_matches_source(arc, database_id, temp_path):
+            logger.warning("Derived table copy did not match the CSV")
+            return False
+        os.replace(temp_path, DERIVED_TABLE_PATH)
+        logger.info(f"✅ Derived table written in {time.monotonic() - started:.2f}s")
+        return True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def ensure_derived_table(arc, database_id: str, force: bool = False) -> bool:
+    """
+    Verify the derived copy against the CSV and rewrite it when it is missing or out of
+    date. The CSV's cheap fingerprint is compared first; the full checksum only runs when
+    it changed since the last verification (or on force). Returns whether new requests
+    read the copy afterwards.
+    """
+    with _ingest_lock:
+        checked_at = _state["checked_at"]
+        if not force and checked_at is not None and time.time() - checked_at < DERIVED_TABLE_CHECK_SECONDS:
+            return _state["ready"]
+        _ingest_running.set()
+        try:
+            fingerprint = source_fingerprint(arc, database_id)
+            if (not force and fingerprint is not None and os.path.exists(DERIVED_TABLE_PATH)
+                    and read_verified_fingerprint() == fingerprint):
+                logger.info(f"🗄️ Derived table {DERIVED_TABLE_PATH} is up to date (source unchanged)")
+                _state["ready"] = True
+            elif not force and copy_matches_source(arc, database_id):
+                logger.info(f"🗄️ Derived table {DERIVED_TABLE_PATH} is up to date")
+                write_verified_fingerprint(fingerprint)
+                _state["ready"] = True
+            else:
+                # Requests already running keep the source they pinned
+                _state["ready"] = write_derived_table(arc, database_id)
+                if _state["ready"]:
+                    write_verified_fingerprint(fingerprint)
+                else:
+                    logger.warning("Derived table unavailable, querying the CSV")
+        except Exception as e:
+            _state["ready"] = False
+            logger.warning(f"Derived table ingest failed, querying the CSV: {e}")
+        finally:
+            _state["checked_at"] = time.time()
+            _ingest_running.clear()
+        return _state["ready"]
+
+def schedule_derived_table(arc, database_id: str):
+    """Non-blocking - re-verify (and rewrite) the derived copy in the background when its check is due"""
+    checked_at = _state["checked_at"]
+    if checked_at is not None and time.time() - checked_at < DERIVED_TABLE_CHECK_SECONDS:
+        return
+    if _ingest_running.is_set():
+        return
+
+    def ingest():
+        try:
+            ensure_derived_table(arc, database_id)
+        except Exception as e:
+            logger.warning(f"Background derived table ingest failed: {e}")
+
+    threading.Thread(target=ingest, name="price-variance-ingest", daemon=True).start()
@@ -0,0 +1,233 @@
+"""End-to-end deadline with per-stage budgets
+
+One Deadline is started per skill invocation. The stages run in order and each opens a
+window of its budget in STAGE_BUDGETS_SECONDS, never extending past the overall deadline.
+Every blocking platform call runs on a worker thread and is waited on only until the
+current window closes: warehouse queries go through the DeadlineClient proxy, and the LLM
+narrative through Deadline.stream. A call that runs over is abandoned - its thread
+finishes in the background and a cached query still fills the result cache for the next
+question - and the stage degrades in a defined way:
+
+- Queries 1-2 are served from cached results past their TTL, marked stale, or from the
+  approximate answer of the stratified sample
+- the contract drilldown and the optional analytics stages are skipped
+- the LLM narrative is replaced by a deterministic one built from the stage results
+
+Every degradation is recorded on the deadline and surfaced in the notes, so the answer
+always says what it left out.
+
+The call workers are shared by all requests of the process. A call that has not started
+when its window closes is cancelled, so it never takes a worker. An abandoned call that
+is already running keeps its worker until it returns. These calls are counted
+(get_call_pool_status), and while DEADLINE_BACKLOG_NOTE_CALLS or more of them hold
+workers, requests note that their calls may queue behind them.
+"""
+
+from __future__ import annotations
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from types import SimpleNamespace
+from typing import Callable, Iterator
+from price_variance_helper_sql_optimized.price_variance_config import REQUEST_DEADLINE_SECONDS, STAGE_BUDGETS_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Worker threads for bounded calls, shared by all requests - abandoned calls hold a worker until they return
+DEADLINE_MAX_WORKERS = int(os.environ.get("PRICE_VARIANCE_CALL_WORKERS", "32"))
+
+# Abandoned calls still running from which requests note the backlog
+DEADLINE_BACKLOG_NOTE_CALLS = max(1, DEADLINE_MAX_WORKERS // 4)
+
+STAGE_LABELS = {"queries": "variance queries", "contract": "contract drilldown", "analytics": "supporting analyses",
+                "llm": "narrative"}
+
+_PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+_executor = ThreadPoolExecutor(max_workers=DEADLINE_MAX_WORKERS, thread_name_prefix="price-variance-call")
+_pool_lock = threading.Lock()
+_pool_status = {"queued": 0, "running": 0, "abandoned": 0}
+
+def get_call_pool_status() -> dict:
+    """Calls waiting for a worker, running, and running after their request stopped waiting"""
+    with _pool_lock:
+        return dict(_pool_status, workers=DEADLINE_MAX_WORKERS)
+
+class _PooledCall:
+    """fn(*args, **kwargs) submitted to the shared executor, counted while queued, running and abandoned"""
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        self.state = "queued"
+        self.abandoned = False
+        self.started = None
+        with _pool_lock:
+            _pool_status["queued"] += 1
+        self.future = _executor.submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn: Callable, args: tuple, kwargs: dict):
+        with _pool_lock:
+            self.state = "running"
+            _pool_status["queued"] -= 1
+            _pool_status["running"] += 1
+        self.started = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _pool_lock:
+                self.state = "done"
+                _pool_status["running"] -= 1
+                if self.abandoned:
+                    _pool_status["abandoned"] -= 1
+            if self.abandoned:
+                logger.info(f"⏱️ Abandoned call returned after {time.monotonic() - self.started:.1f}s")
+
+    def abandon(self) -> bool:
+        """Stop waiting - cancels the call when it has not started. Returns whether it had started"""
+        if self.future.cancel():
+            with _pool_lock:
+                _pool_status["queued"] -= 1
+            return False
+        with _pool_lock:
+            if self.state != "done":
+                self.abandoned = True
+                _pool_status["abandoned"] += 1
+        return True
+
+class DeadlineExceeded(TimeoutError):
+    """A call did not finish before its stage window closed"""
+
+class Deadline:
+    """Overall deadline of one invocation plus the window of the stage currently running"""
+
+    def __init__(self, seconds: float = REQUEST_DEADLINE_SECONDS, budgets: dict | None = None):
+        self.seconds = float(seconds)
+        self.budgets = dict(STAGE_BUDGETS_SECONDS, **(budgets or {}))
+        self.started = time.monotonic()
+        self.end = self.started + self.seconds
+        self.stage = None
+        self.stage_started = self.started
+        self.stage_end = self.end
+        self.degradations = []
+
+    def start_stage(self, name: str) -> Deadline:
+        """Close the previous stage and open the window of `name` (its budget, capped by the overall deadline)"""
+        now = time.monotonic()
+        if self.stage is not None:
+            logger.info(f"⏱️ Stage {self.stage}: {now - self.stage_started:.2f}s of {self.budgets.get(self.stage, self.seconds):g}s")
+        self.stage = name
+        self.stage_started = now
+        self.stage_end = min(self.end, now + self.budgets.get(name, self.seconds))
+        return self
+
+    def remaining(self) -> float:
+        """Seconds left in the current stage window"""
+        return max(0.0, self.stage_end - time.monotonic())
+
+    def expired(self) -> bool:
+        """Whether the current stage window has closed"""
+        return self.remaining() <= 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def degrade(self, note: str):
+        """Record a degradation for the notes (once per distinct note)"""
+        if note not in self.degradations:
+            logger.warning(f"⏱️ {note}")
+            self.degradations.append(note)
+
+    def skip_expired(self, label: str) -> bool:
+        """True (and record the skip) when the current stage window has already closed"""
+        if not self.expired():
+            return False
+        self.degrade(f"{label} skipped to stay within the time budget")
+        return True
+
+    def _timed_out(self, started: bool = True) -> DeadlineExceeded:
+        label = STAGE_LABELS.get(self.stage, self.stage or "analysis")
+        if started:
+            self.degrade(f"Stopped waiting for the {label} after {self.budgets.get(self.stage, self.seconds):g}s")
+        else:
+            self.degrade(f"The {label} did not start within {self.budgets.get(self.stage, self.seconds):g}s - "
+                         f"all {DEADLINE_MAX_WORKERS} call workers were busy")
+        return DeadlineExceeded(f"{label} exceeded the time budget")
+
+    def _submit(self, fn: Callable, *args, **kwargs) -> _PooledCall:
+        status = get_call_pool_status()
+        if status["abandoned"] >= DEADLINE_BACKLOG_NOTE_CALLS:
+            self.degrade(f"{status['abandoned']} of {DEADLINE_MAX_WORKERS} call workers are still busy with calls "
+                         f"that ran over their time budget - this answer may be slower or less complete")
+        return _PooledCall(fn, *args, **kwargs)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) on a worker thread, waited on until the stage window closes"""
+        if self.expired():
+            raise self._timed_out()
+        pooled = self._submit(fn, *args, **kwargs)
+        try:
+            return pooled.future.result(timeout=self.remaining())
+        except FutureTimeout:
+            raise self._timed_out(pooled.abandon()) from None
+
+    def stream(self, fn: Callable, *args) -> Iterator:
+        """Items of the iterator fn(*args), produced on a worker thread, until the stage window closes"""
+        items = queue.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for item in fn(*args):
+                    items.put((True, item))
+                items.put((True, done))
+            except BaseException as e:
+                items.put((False, e))
+
+        pooled = self._submit(produce)
+        while True:
+            try:
+                ok, item = items.get(timeout=self.remaining() or 1e-3)
+            except queue.Empty:
+                raise self._timed_out(pooled.abandon()) from None
+            if not ok:
+                raise item
+            if item is done:
+                return
+            yield item
+
+class DeadlineClient:
+    """
+    Proxy of the data client whose calls run under a deadline. A call that runs past the
+    stage window returns a failed result flagged timed_out, like any other failed query.
+    """
+
+    def __init__(self, client, deadline: Deadline):
+        self._client = client
+        self._deadline = deadline
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if callable(attr):
+            def call(*args, **kwargs):
+                try:
+                    return self._deadline.call(attr, *args, **kwargs)
+                except DeadlineExceeded as e:
+                    return SimpleNamespace(success=False, df=None, error=str(e), timed_out=True)
+            return call
+        if isinstance(attr, _PLAIN_TYPES):
+            return attr
+        return DeadlineClient(attr, self._deadline)
+
+def with_deadline(client, deadline: Deadline) -> DeadlineClient:
+    """The client with every call bounded by the deadline"""
+    return DeadlineClient(without_deadline(client), deadline)
+
+def without_deadline(client):
+    """The underlying client - for work that outlives the request, such as background builds"""
+    return client._client if isinstance(client, DeadlineClient) else client
+
+def deadline_of(client) -> Deadline | None:
+    """The deadline a client is bound to, None for a plain client"""
+    return client._deadline if isinstance(client, DeadlineClient) else None
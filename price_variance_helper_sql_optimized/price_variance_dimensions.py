@@ -0,0 +1,205 @@
+"""In-memory index of dimension values for grounding free-text filters
+
+The distinct values of supplierName, contractName, category, operatingUnit and
+contractType are loaded once per dataset version - from the monthly cube cells for the
+columns the cube holds, and from one query of per-column DISTINCT values for the rest -
+and indexed per column with:
+
+- an exact and a normalized (lower-case, punctuation-free) lookup
+- a prefix trie over every word start of the normalized value, so "west" or "ops"
+  find "West Ops"
+- a trigram inverted index for typo-tolerant lookup, scored by Dice similarity
+
+resolve() tries these in that order and returns the canonical value, or None when
+nothing is close enough. A value is only looked up in other columns when its column is
+not a column of the table; values of unindexed columns are matched as given.
+
+The query runs under the request deadline when called with a deadline-bound client; an
+index that could not be completed is used for the request but not kept.
+"""
+
+from __future__ import annotations
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql
+from price_variance_helper_sql_optimized.price_variance_cube import load_monthly_cube, CUBE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DIMENSION_COLUMNS = ["supplierName", "contractName", "category", "operatingUnit", "contractType"]
+
+# Other columns of the table - filter values on them are never grounded in another column
+UNINDEXED_COLUMNS = ["transactionDate", "expectedPrice", "invoicePrice", "catalogPrice", "quantity", "priceVarianceAmount"]
+
+# Distinct values fetched per index build - beyond it the query is treated as failed
+DIMENSION_MAX_VALUES = 1_000_000
+
+# Minimum Dice similarity of trigram sets for a fuzzy match
+FUZZY_MIN_SIMILARITY = 0.45
+
+_index_lock = threading.Lock()
+_index_memo = {}
+
+def normalize_text(text: str) -> str:
+    """Lower-case, with runs of non-alphanumerics collapsed to one space"""
+    return re.sub(r"[^0-9a-z]+", " ", str(text).lower()).strip()
+
+def trigrams(normalized: str) -> set:
+    """Character trigrams of a normalized string, padded so word starts count"""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ColumnIndex:
+    """Exact, prefix and trigram lookup over the distinct values of one column"""
+
+    def __init__(self, values):
+        self.values = sorted({str(v) for v in values if v is not None and str(v) != ""})
+        self.exact = set(self.values)
+        self.normalized = {}
+        self.trie = [{}, set()]
+        self.postings = {}
+        self.trigram_counts = []
+
+        for value_id, value in enumerate(self.values):
+            normalized = normalize_text(value)
+            self.normalized.setdefault(normalized, value_id)
+            for match in re.finditer(r"\S+", normalized):
+                self._insert(normalized[match.start():], value_id)
+            grams = trigrams(normalized)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(value_id)
+
+    def _insert(self, key: str, value_id: int):
+        node = self.trie
+        for char in key:
+            node = node[0].setdefault(char, [{}, set()])
+            node[1].add(value_id)
+
+    def prefix_ids(self, key: str) -> set:
+        """Ids of values with a word starting with key"""
+        node = self.trie
+        for char in key:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        return node[1]
+
+    def fuzzy_id(self, key: str, candidates: set | None = None) -> int | None:
+        """Best trigram match at or above FUZZY_MIN_SIMILARITY"""
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            for value_id in self.postings.get(gram, ()):
+                if candidates is None or value_id in candidates:
+                    shared[value_id] += 1
+
+        best_id, best_score = None, FUZZY_MIN_SIMILARITY
+        for value_id, count in shared.items():
+            score = 2 * count / (len(grams) + self.trigram_counts[value_id])
+            if score > best_score or (score == best_score and best_id is None):
+                best_id, best_score = value_id, score
+        return best_id
+
+    def resolve(self, text: str) -> str | None:
+        """Canonical value for free text, or None"""
+        if text in self.exact:
+            return text
+        key = normalize_text(text)
+        if not key:
+            return None
+        if key in self.normalized:
+            return self.values[self.normalized[key]]
+
+        prefix_ids = self.prefix_ids(key)
+        if len(prefix_ids) == 1:
+            return self.values[next(iter(prefix_ids))]
+
+        value_id = self.fuzzy_id(key, prefix_ids or None)
+        return self.values[value_id] if value_id is not None else None
+
+class DimensionIndex:
+    """ColumnIndex per dimension column, tagged with the dataset version it was built from"""
+
+    def __init__(self, columns: dict, version: float):
+        self.columns = {column: ColumnIndex(values) for column, values in columns.items()}
+        self.version = version
+
+    def resolve(self, column: str, text: str) -> tuple[str, str] | None:
+        """
+        (column, canonical value) for a filter value, looked up in its own column. Only for
+        a column that is not a table column (e.g. an unrecognized alias) is every indexed
+        column tried.
+        """
+        if column in DIMENSION_COLUMNS or column in UNINDEXED_COLUMNS:
+            index = self.columns.get(column)
+            value = index.resolve(text) if index is not None else None
+            return (column, value) if value is not None else None
+
+        for candidate_column, index in self.columns.items():
+            value = index.resolve(text)
+            if value is not None:
+                return candidate_column, value
+        return None
+
+def fetch_dimension_values(arc, database_id: str, columns: list = DIMENSION_COLUMNS) -> dict | None:
+    """Distinct values of each column - one SELECT DISTINCT per column in a single query"""
+    values_sql = "\n    UNION ALL\n    ".join(
+        f"SELECT DISTINCT '{column}' as column_name, CAST({column} AS VARCHAR) as value FROM {table_sql()} WHERE {column} IS NOT NULL"
+        for column in columns
+    )
+    result = arc.data.execute_sql_query(database_id, values_sql, DIMENSION_MAX_VALUES + 1)
+    if not result.success or result.df is None:
+        logger.warning(f"Dimension value query failed: {result.error if not result.success else 'No data'}")
+        return None
+    if len(result.df) > DIMENSION_MAX_VALUES:
+        logger.warning(f"Dimension value query exceeded {DIMENSION_MAX_VALUES:,} values - not indexing {columns}")
+        return None
+    return {column: result.df.loc[result.df['column_name'] == column, 'value'].unique() for column in columns}
+
+def get_dimension_index(arc, database_id: str, fetch: bool = True) -> DimensionIndex | None:
+    """
+    Index for the current dataset version, rebuilt when the cube is rebuilt or the index
+    expires. With fetch=False no query is run: columns the cube does not hold keep the
+    values of the previous index.
+    """
+    cube = load_monthly_cube(arc, database_id, build_if_missing=False)
+    with _index_lock:
+        previous = index = _index_memo.get(database_id)
+        if index is not None:
+            if cube is not None and cube.built_at > index.version:
+                index = None
+            elif cube is None and time.time() - index.version >= CUBE_TTL_SECONDS:
+                index = None
+        if index is not None:
+            return index
+
+        columns = {}
+        version = time.time()
+        if cube is not None:
+            # The cube stores dimensions as strings, so NULL members appear as 'None'/'nan'
+            columns = {column: [v for v in cube.cells[column].unique() if v not in ('None', 'nan')]
+                       for column in DIMENSION_COLUMNS if column in cube.cells.columns}
+            version = cube.built_at
+        missing = [column for column in DIMENSION_COLUMNS if column not in columns]
+        if missing and fetch:
+            columns.update(fetch_dimension_values(arc, database_id, missing) or {})
+        unfetched = [column for column in missing if column not in columns]
+        for column in unfetched:
+            if previous is not None and column in previous.columns:
+                columns[column] = previous.columns[column].values
+        if not columns:
+            return None
+
+        # Kept only when every column was loaded for this version
+        index = DimensionIndex(columns, version)
+        if unfetched:
+            if fetch:
+                logger.warning(f"Dimension index incomplete for this request, could not load {unfetched}")
+            return index
+        _index_memo[database_id] = index
+        logger.info(f"🗂️ Dimension index ready: " + ", ".join(f"{c}={len(i.values):,}" for c, i in index.columns.items()))
+        return index
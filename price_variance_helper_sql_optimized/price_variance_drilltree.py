@@ -0,0 +1,235 @@
+"""Category -> supplier -> contract drill tree
+
+One GROUP BY ROLLUP(category, supplierName, contractName) query returns the additive
+sums for every contract within a supplier and category, every supplier within a category,
+every category and the grand total. The rows are loaded into an in-memory tree - nodes
+keyed by their path, children pre-ranked by total variance - and memoized per base filter
+(time ranges plus every predicate that is not a drill level). Drilling down by adding
+category, supplier or contract filters is then answered from the memoized tree with no
+new warehouse queries:
+
+- the children of a node are a dictionary lookup plus the precomputed ranking
+- levels further down, or filters that skip a level (a supplier without its category),
+  are rolled up from the in-memory nodes
+- compliance at any tolerance comes from the nodes' cumulative variance histograms
+"""
+
+from __future__ import annotations
+import logging
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cache import ResultCache, RESULT_CACHE_TTL_SECONDS
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql
+from price_variance_helper_sql_optimized.price_variance_deadline import deadline_of
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names
+from price_variance_helper_sql_optimized.price_variance_filters import CanonicalFilter
+from price_variance_helper_sql_optimized.price_variance_aggregation import SUM_COLUMNS, metrics_from_sums, kpis_from_sums
+from price_variance_helper_sql_optimized.price_variance_metrics import parts_sql
+from price_variance_helper_sql_optimized.price_variance_tolerance import (
+    Tolerance, DEFAULT_TOLERANCE, HISTOGRAM_COLUMNS, build_histogram_sql, apply_tolerance
+)
+
+logger = logging.getLogger(__name__)
+
+DRILL_LEVELS = ["category", "supplierName", "contractName"]
+
+# Trees with more leaf rows than this are not built (the ROLLUP result would be truncated)
+DRILL_TREE_MAX_ROWS = 250_000
+
+# GROUPING(category, supplierName, contractName) bitmask -> node depth (0 = grand total)
+GROUPING_DEPTH = {0: 3, 1: 2, 3: 1, 7: 0}
+
+_tree_cache = ResultCache(ttl=RESULT_CACHE_TTL_SECONDS, max_entries=32)
+
+def build_drill_tree_sql(where: str) -> str:
+    """ROLLUP query for the additive sums of every node"""
+    levels = ", ".join(DRILL_LEVELS)
+    return f"""
+    SELECT
+        {levels},
+        GROUPING({levels}) as grouping_id,
+        {parts_sql(SUM_COLUMNS)},
+        {build_histogram_sql()}
+    FROM {table_sql()}
+    WHERE {where}
+    GROUP BY ROLLUP({levels})
+    """
+
+class DrillNode:
+    """One tree node - its path, its row in the tree's sums and its children ranked by variance"""
+    __slots__ = ("path", "row", "children", "ranked")
+
+    def __init__(self, path: tuple, row: int):
+        self.path = path
+        self.row = row
+        self.children = {}
+        self.ranked = None
+
+class DrillTree:
+    """Nodes keyed by path (category, supplier, contract prefixes) over one ROLLUP result"""
+
+    def __init__(self, rollup_df: pd.DataFrame):
+        depth = rollup_df["grouping_id"].astype(int).map(GROUPING_DEPTH)
+        rollup_df = rollup_df.assign(depth=depth).sort_values("depth", kind="stable").reset_index(drop=True)
+        self.sums = rollup_df[SUM_COLUMNS + HISTOGRAM_COLUMNS].astype(float)
+        self.variance = self.sums["variance_sum"].to_numpy()
+        self.nodes = {}
+        self.paths = []
+        self.levels = [[] for _ in range(len(DRILL_LEVELS) + 1)]
+        self._memo = {}
+
+        names = rollup_df[DRILL_LEVELS].astype(object).where(rollup_df[DRILL_LEVELS].notna(), None).to_numpy()
+        for row, node_depth in enumerate(rollup_df["depth"].to_numpy()):
+            path = tuple(None if name is None else str(name) for name in names[row][:node_depth])
+            node = DrillNode(path, row)
+            self.paths.append(path)
+            self.nodes[path] = node
+            self.levels[node_depth].append(node)
+            if node_depth:
+                parent = self.nodes.get(path[:-1])
+                if parent is not None:
+                    parent.children[path[-1]] = node
+
+        for node in self.nodes.values():
+            rows = np.fromiter((child.row for child in node.children.values()), dtype=np.int64, count=len(node.children))
+            node.ranked = rows[np.argsort(-self.variance[rows], kind="stable")]
+
+    def node(self, path) -> DrillNode | None:
+        """Node for a (category, supplier, contract) prefix"""
+        return self.nodes.get(tuple(path))
+
+    def matching_rows(self, constraints: dict, depth: int) -> np.ndarray:
+        """Rows of the nodes at depth whose path matches every constraint on a level above depth"""
+        checks = [(DRILL_LEVELS.index(level), value) for level, value in constraints.items()
+                  if DRILL_LEVELS.index(level) < depth]
+        return np.fromiter((node.row for node in self.levels[depth]
+                            if all(node.path[i] == value for i, value in checks)), dtype=np.int64)
+
+    def sums_at(self, tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+        """Node sums with compliant_count looked up at the tolerance"""
+        key = ("sums", tolerance)
+        if key not in self._memo:
+            self._memo[key] = apply_tolerance(self.sums, tolerance)
+        return self._memo[key]
+
+    def breakout(self, dimension: str, constraints: dict | None = None, limit: int = 100,
+                 tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+        """Breakout rows (the fetch_breakout columns) for a drill level under the constraints"""
+        constraints = constraints or {}
+        key = (dimension, tuple(sorted(constraints.items())), limit, tolerance)
+        if key not in self._memo:
+            self._memo[key] = self._breakout(dimension, constraints, limit, self.sums_at(tolerance))
+        return self._memo[key].copy()
+
+    def _breakout(self, dimension: str, constraints: dict, limit: int, all_sums: pd.DataFrame) -> pd.DataFrame:
+        level = DRILL_LEVELS.index(dimension)
+        path = constraint_path(constraints)
+        if path is not None and len(path) == level:
+            # Children of a node: lookup plus the precomputed ranking
+            node = self.node(path)
+            rows = node.ranked[:limit] if node is not None else np.array([], dtype=np.int64)
+            names = [self.paths[row][level] for row in rows]
+            breakout_df = metrics_from_sums(all_sums.iloc[rows]).reset_index(drop=True)
+            breakout_df.insert(0, dimension, names)
+            return encode_names(breakout_df)
+
+        depth = max([level + 1] + [DRILL_LEVELS.index(c) + 1 for c in constraints])
+        rows = self.matching_rows(constraints, depth)
+        sums = all_sums.iloc[rows].assign(**{dimension: [self.paths[row][level] for row in rows]})
+        rolled = sums.groupby(dimension, sort=False, dropna=False)[SUM_COLUMNS].sum()
+        breakout_df = metrics_from_sums(rolled).reset_index()
+        breakout_df = breakout_df.sort_values("total_variance", ascending=False, kind="stable").head(limit)
+        return encode_names(breakout_df.reset_index(drop=True))
+
+    def member_parts(self, dimension: str, constraints: dict | None = None,
+                     tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+        """Every member of a drill level under the constraints with its SUM_COLUMNS parts"""
+        constraints = constraints or {}
+        level = DRILL_LEVELS.index(dimension)
+        depth = max([level + 1] + [DRILL_LEVELS.index(c) + 1 for c in constraints])
+        rows = self.matching_rows(constraints, depth)
+        parts = self.sums_at(tolerance).iloc[rows][SUM_COLUMNS].assign(**{dimension: [self.paths[row][level] for row in rows]})
+        path = constraint_path(constraints)
+        if path is None or len(path) != level:
+            # Members repeat under different parents unless every level above is pinned
+            parts = parts.groupby(dimension, sort=False, dropna=False)[SUM_COLUMNS].sum().reset_index()
+        return parts[[dimension] + SUM_COLUMNS].reset_index(drop=True)
+
+    def level_parts(self, dimensions: list, constraints: dict | None = None,
+                    tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+        """Nodes at the deepest of the dimensions' levels under the constraints - a column per dimension plus SUM_COLUMNS (pairs may repeat)"""
+        constraints = constraints or {}
+        levels = [DRILL_LEVELS.index(dimension) for dimension in dimensions]
+        depth = max([level + 1 for level in levels] + [DRILL_LEVELS.index(c) + 1 for c in constraints])
+        rows = self.matching_rows(constraints, depth)
+        names = {dimension: [self.paths[row][level] for row in rows] for dimension, level in zip(dimensions, levels)}
+        return self.sums_at(tolerance).iloc[rows][SUM_COLUMNS].assign(**names).reset_index(drop=True)
+
+    def totals(self, constraints: dict | None = None, tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.Series:
+        """Additive sums for everything under the constraints"""
+        constraints = constraints or {}
+        sums = self.sums_at(tolerance)
+        path = constraint_path(constraints)
+        if path is not None:
+            node = self.node(path)
+            return sums.iloc[node.row] if node is not None else pd.Series(0.0, index=sums.columns)
+        depth = max(DRILL_LEVELS.index(c) + 1 for c in constraints)
+        return sums.iloc[self.matching_rows(constraints, depth)].sum()
+
+    def distinct_count(self, dimension: str, constraints: dict | None = None) -> int:
+        """Distinct members of a drill level under the constraints"""
+        constraints = constraints or {}
+        level = DRILL_LEVELS.index(dimension)
+        depth = max([level + 1] + [DRILL_LEVELS.index(c) + 1 for c in constraints])
+        return len({self.paths[row][level] for row in self.matching_rows(constraints, depth)})
+
+    def kpis(self, constraints: dict | None = None, tolerance: Tolerance = DEFAULT_TOLERANCE) -> dict:
+        """The Query 2 KPI dict for everything under the constraints"""
+        kpis = kpis_from_sums(self.totals(constraints, tolerance))
+        kpis['total_suppliers'] = self.distinct_count('supplierName', constraints)
+        return kpis
+
+def constraint_path(constraints: dict) -> tuple | None:
+    """The constraints as a tree path when they pin a prefix of DRILL_LEVELS, otherwise None"""
+    path = []
+    for level in DRILL_LEVELS:
+        if level not in constraints:
+            break
+        path.append(constraints[level])
+    return tuple(path) if len(path) == len(constraints) else None
+
+def split_drill_filter(canonical: CanonicalFilter) -> tuple[CanonicalFilter, dict]:
+    """(base filter the tree is built for, single-value drill-level constraints served from the tree)"""
+    constraints = {column: values[0] for column, op, values in canonical.predicates
+                   if column in DRILL_LEVELS and op == '=' and len(values) == 1}
+    return canonical.without(constraints), constraints
+
+def get_drill_tree(arc, database_id: str, base: CanonicalFilter, build_if_missing: bool = True) -> DrillTree | None:
+    """Memoized tree for the base filter, built with one ROLLUP query on a miss (None on a miss without build_if_missing)"""
+    key = f"{database_id}:{base.cache_key()}"
+    tree = _tree_cache.get(key)
+    if tree is not None:
+        logger.info("🌳 Drill tree served from memory")
+        return tree
+    if not build_if_missing:
+        return None
+
+    drill_sql = build_drill_tree_sql(base.to_sql())
+    logger.info(f"📝 Drill tree SQL:\n{drill_sql}")
+    result = arc.data.execute_sql_query(database_id, drill_sql, DRILL_TREE_MAX_ROWS + 1)
+    stale = _tree_cache.get_stale(key) if getattr(result, "timed_out", False) else None
+    if stale is not None:
+        tree, age = stale
+        deadline_of(arc).degrade(f"Some figures are cached results up to {max(1, round(age / 60))} min old because the warehouse did not answer in time")
+        return tree
+    if not result.success or result.df is None:
+        logger.warning(f"Drill tree query failed: {result.error if not result.success else 'No data'}")
+        return None
+    if len(result.df) > DRILL_TREE_MAX_ROWS:
+        logger.warning(f"Drill tree skipped: more than {DRILL_TREE_MAX_ROWS:,} nodes")
+        return None
+
+    tree = DrillTree(result.df)
+    _tree_cache.put(key, tree)
+    logger.info(f"🌳 Drill tree built: " + ", ".join(f"{level}={len(nodes):,}" for level, nodes in zip(["total"] + DRILL_LEVELS, tree.levels)))
+    return tree
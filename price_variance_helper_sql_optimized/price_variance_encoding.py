@@ -0,0 +1,40 @@
+"""Dictionary encoding of dimension names
+
+Supplier, contract, category and operating unit names are long strings repeated across
+every cube cell, sample row and result row. Inside the skill they are held as pandas
+categoricals - int32 codes plus one dictionary of distinct names per frame - so grouping,
+merging and sketch lookups work on integers. The persisted cube and sample carry their
+dictionaries with them. Names are decoded back to plain strings only by decode_names,
+at the render boundary (tables, chart categories, facts and exports).
+"""
+
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+ENCODED_COLUMNS = ["supplierName", "contractName", "category", "operatingUnit"]
+
+def encode_names(df: pd.DataFrame | None, columns: list = ENCODED_COLUMNS) -> pd.DataFrame | None:
+    """Copy of df with the name columns it carries dictionary-encoded"""
+    if df is None:
+        return None
+    present = [column for column in columns if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if not present:
+        return df
+    return df.astype({column: "category" for column in present})
+
+def decode_names(df: pd.DataFrame | None) -> pd.DataFrame | None:
+    """Copy of df with every dictionary-encoded column turned back into plain names"""
+    if df is None:
+        return None
+    encoded = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if not encoded:
+        return df
+    return df.astype({column: object for column in encoded})
+
+def name_codes(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """(int codes, dictionary) for a name column - categorical codes (-1 for missing) when already encoded"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, pd.Index(uniques)
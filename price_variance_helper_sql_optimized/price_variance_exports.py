@@ -0,0 +1,124 @@
+"""Streamed export files for large export data
+
+Exports are built once, for the final output of a request, and only when exports were
+requested (exports='all', the default). Every export stays inline up to EXPORT_INLINE_ROWS rows so the response size
+is bounded; a longer export is written in EXPORT_CHUNK_ROWS chunks to a file under
+EXPORT_DIR (Parquet when pyarrow is installed, CSV otherwise) and exported inline as its
+first rows. Stages that produce more rows than they keep - such as every flagged line of
+the anomaly stage - write them straight into an ExportFileWriter.
+All files of a response are listed in an "Export Files" frame; files older than
+EXPORT_FILE_TTL_SECONDS are removed when the next file is written.
+"""
+
+from __future__ import annotations
+import os
+import re
+import time
+import logging
+import tempfile
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import CACHE_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+
+# Rows of an export kept inline in the response - longer exports are written to a file
+EXPORT_INLINE_ROWS = 1000
+
+# Rows written to an export file at a time
+EXPORT_CHUNK_ROWS = 50_000
+
+# Export files are removed after this long
+EXPORT_FILE_TTL_SECONDS = 60 * 60
+
+EXPORT_FORMAT = "parquet" if pq is not None else "csv"
+
+def prune_export_files(max_age: float = EXPORT_FILE_TTL_SECONDS):
+    """Remove export files older than max_age seconds"""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not remove export file {entry.path}: {e}")
+
+class ExportFileWriter:
+    """Appends DataFrame chunks to one export file - Parquet when pyarrow is installed, CSV otherwise"""
+
+    def __init__(self, name: str, export_format: str = EXPORT_FORMAT):
+        prune_export_files()
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        self.name = name
+        self.format = export_format
+        slug = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+        handle, self.path = tempfile.mkstemp(prefix=f"{slug}_", suffix=f".{export_format}", dir=EXPORT_DIR)
+        os.close(handle)
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+        if self.format == "parquet":
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            chunk.to_csv(self.path, mode="a", header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+
+    def close(self) -> dict:
+        """Finish the file and return its manifest row"""
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        return self.manifest()
+
+    def discard(self):
+        """Close and delete the file (e.g. nothing was written)"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def manifest(self) -> dict:
+        return {"export": self.name, "rows": self.rows, "format": self.format, "path": self.path}
+
+    def __enter__(self) -> ExportFileWriter:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def prepare_export_data(frames: dict, files: list | None = None, inline_rows: int = EXPORT_INLINE_ROWS) -> dict:
+    """
+    Export frames by name with every frame longer than inline_rows streamed to a file and
+    cut to its first inline_rows rows. The files, plus any already written by the stages,
+    are listed in an "Export Files" frame.
+    """
+    export_data = {}
+    manifest = list(files or [])
+    for name, df in frames.items():
+        if df is not None and len(df) > inline_rows:
+            with ExportFileWriter(name) as writer:
+                for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+                    writer.write(df.iloc[start:start + EXPORT_CHUNK_ROWS])
+            logger.info(f"📦 Export '{name}': {writer.rows:,} rows written to {writer.path}, first {inline_rows:,} inline")
+            manifest.append(writer.manifest())
+            df = df.head(inline_rows)
+        export_data[name] = df if df is not None else pd.DataFrame()
+    if manifest:
+        export_data["Export Files"] = pd.DataFrame(manifest)
+    return export_data
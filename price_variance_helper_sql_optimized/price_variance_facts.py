@@ -0,0 +1,96 @@
+"""Compact, token-budgeted encoding of the facts handed to the LLM prompts
+
+The fact dataframes are rendered as small pipe-separated tables: one heading per group
+and fact_type, the column names once, then one line of values per fact. Repeated keys,
+quotes and braces of the list-of-dict repr are gone and columns that are empty for a
+fact_type are left out.
+
+The encoding is kept within a token budget by dropping the lowest-ranked facts first.
+Facts are ranked by (detail, group, position): the first fact of every group (the
+summary, or the top member) outranks any detail fact, groups earlier in the list outrank
+later ones, and within a group earlier rows (higher ranks) outrank later ones. The top
+fact is always kept, even when it alone exceeds the budget. Token
+counts are estimated - words, groups of up to three digits and punctuation marks each
+count as one token, which tracks BPE tokenizers closely on this kind of text.
+"""
+
+from __future__ import annotations
+import re
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import FACT_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count of text"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+def format_fact_value(value) -> str:
+    """One table cell - empty for missing values, pipes and newlines replaced"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    if isinstance(value, float):
+        value = f"{value:g}"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def fact_tables(title: str, facts_df: pd.DataFrame) -> list[tuple[str, pd.DataFrame]]:
+    """(heading, table) per fact_type of a group, without the fact_type column and all-empty columns"""
+    if 'fact_type' not in facts_df.columns:
+        return [(f"## {title}", facts_df.dropna(axis=1, how='all'))]
+    return [
+        (f"## {title} ({fact_type})", rows.drop(columns='fact_type').dropna(axis=1, how='all'))
+        for fact_type, rows in facts_df.groupby('fact_type', sort=False)
+    ]
+
+def encode_fact_tables(groups: list[tuple[str, pd.DataFrame]]) -> str:
+    """Pipe-separated tables of the non-empty groups"""
+    lines = []
+    for title, facts_df in groups:
+        if facts_df.empty:
+            continue
+        for heading, table in fact_tables(title, facts_df):
+            lines.append(heading)
+            lines.append("|".join(str(column) for column in table.columns))
+            lines.extend("|".join(format_fact_value(value) for value in row) for row in table.itertuples(index=False))
+    return "\n".join(lines)
+
+def encode_facts(groups: list[tuple[str, pd.DataFrame]], token_budget: int | None = FACT_TOKEN_BUDGET) -> tuple[str, int, int]:
+    """
+    Encode titled fact groups (most important first) within token_budget, keeping at least
+    the top fact. Returns (text, estimated tokens, facts dropped); token_budget=None keeps
+    every fact.
+    """
+    groups = [(title, facts_df.reset_index(drop=True)) for title, facts_df in groups if not facts_df.empty]
+    text = encode_fact_tables(groups)
+    tokens = estimate_tokens(text)
+    if token_budget is None or tokens <= token_budget:
+        return text, tokens, 0
+
+    # Facts from most to least important; keep the longest prefix that fits
+    ranked = sorted(((position > 0, group, position) for group, (_, facts_df) in enumerate(groups)
+                     for position in range(len(facts_df))))
+
+    def encode_top(count: int) -> tuple[str, int]:
+        kept = {}
+        for _, group, position in ranked[:count]:
+            kept.setdefault(group, []).append(position)
+        top_text = encode_fact_tables([(title, facts_df.loc[sorted(kept[group])])
+                                       for group, (title, facts_df) in enumerate(groups) if group in kept])
+        return top_text, estimate_tokens(top_text)
+
+    low, high = 1, len(ranked) - 1
+    text, tokens = encode_top(1)
+    while low < high:
+        middle = (low + high + 1) // 2
+        middle_text, middle_tokens = encode_top(middle)
+        if middle_tokens <= token_budget:
+            low, text, tokens = middle, middle_text, middle_tokens
+        else:
+            high = middle - 1
+    dropped = len(ranked) - low
+    logger.warning(f"Facts over the {token_budget}-token budget: {dropped} of {len(ranked)} lowest-ranked facts dropped"
+                   + (f", the top fact alone takes ~{tokens} tokens" if tokens > token_budget else ""))
+    return text, tokens, dropped
@@ -0,0 +1,202 @@
+"""Canonical filter representation
+
+Filters arrive as "column: value" strings, lists of them, or platform-grounded dicts
+({'dim': ..., 'op': ..., 'val': [...]} or {'column': ..., 'values': [...]}). They are all
+parsed into one canonical form:
+
+- column names normalized through FILTER_COLUMN_ALIASES
+- free-text values grounded to canonical dataset values by an optional resolver
+  (see price_variance_dimensions)
+- equality and IN predicates merged per column into one sorted value set
+  (repeated conjuncts on the same column intersect)
+- other comparisons deduplicated and sorted
+- time ranges normalized to ISO dates, sorted and merged where they overlap or touch
+
+SQL and cache keys are both generated from the canonical form, so equivalent questions
+produce byte-identical SQL.
+"""
+
+from __future__ import annotations
+import copy
+import logging
+from typing import Callable
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_dataset import date_range_sql
+
+logger = logging.getLogger(__name__)
+
+# Accepted spellings (lower-cased, without spaces or underscores) -> dataset column
+FILTER_COLUMN_ALIASES = {
+    "operatingunit": "operatingUnit",
+    "ou": "operatingUnit",
+    "supplier": "supplierName",
+    "suppliername": "supplierName",
+    "vendor": "supplierName",
+    "contract": "contractName",
+    "contractname": "contractName",
+    "contracttype": "contractType",
+    "category": "category",
+}
+
+COMPARISON_OPERATORS = ("!=", ">", "<", ">=", "<=")
+
+def normalize_column(column: str) -> str:
+    """Dataset column for a filter column name"""
+    key = str(column).strip().replace(" ", "").replace("_", "").lower()
+    return FILTER_COLUMN_ALIASES.get(key, str(column).strip())
+
+def normalize_value(column: str, value, resolve: Callable | None = None) -> tuple[str, str]:
+    """(column, value) after whitespace cleanup and grounding through resolve(column, value)"""
+    value = " ".join(str(value).split())
+    if resolve is None or not value:
+        return column, value
+    
+    resolved = resolve(column, value)
+    if resolved is None:
+        logger.warning(f"No dataset value matches filter {column} = {value!r} - using it as given")
+        return column, value
+    if resolved != (column, value):
+        logger.info(f"🔎 Grounded filter {column} = {value!r} to {resolved[0]} = {resolved[1]!r}")
+    return resolved
+
+def quote_sql_value(value: str) -> str:
+    """Single-quoted SQL string literal"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def comparison_sql_value(value: str) -> str:
+    """Numbers stay bare for range comparisons, anything else is quoted"""
+    try:
+        float(value)
+        return str(value)
+    except ValueError:
+        return quote_sql_value(value)
+
+def parse_filter_item(filter_item, resolve: Callable | None = None) -> list[tuple[str, str, tuple]]:
+    """Parse one filter (string or grounded dict) into (column, op, values) predicates"""
+    if isinstance(filter_item, str):
+        if ':' not in filter_item:
+            return []
+        column, value = filter_item.split(':', 1)
+        column, value = normalize_value(normalize_column(column), value, resolve)
+        return [(column, '=', (value,))] if value else []
+
+    if isinstance(filter_item, dict):
+        if 'dim' in filter_item and 'val' in filter_item:
+            column, op, values = filter_item['dim'], str(filter_item.get('op', '=')).strip().lower(), filter_item['val']
+        elif 'column' in filter_item and 'values' in filter_item:
+            column, op, values = filter_item['column'], '=', filter_item['values']
+        else:
+            return []
+        if op == 'in':
+            op = '='
+        values = values if isinstance(values, (list, tuple)) else [values]
+        if op != '=' and op not in COMPARISON_OPERATORS:
+            logger.warning(f"Unsupported filter operator {op!r} in {filter_item}")
+            return []
+
+        predicates = []
+        for value in values:
+            # Range comparisons are not grounded - their values are thresholds, not members
+            mapped_column, mapped_value = normalize_value(normalize_column(column), value, resolve if op == '=' else None)
+            predicates.append((mapped_column, op, (mapped_value,)))
+        if op == '=':
+            # A grounded value list is one IN predicate, not a conjunction of equalities
+            by_column = {}
+            for mapped_column, _, (mapped_value,) in predicates:
+                by_column.setdefault(mapped_column, set()).add(mapped_value)
+            return [(mapped_column, '=', tuple(sorted(v))) for mapped_column, v in by_column.items()]
+        return predicates
+
+    return []
+
+def merge_time_ranges(time_ranges: list) -> tuple[tuple[str, str | None], ...]:
+    """Sort inclusive (start, end|None) ranges and merge overlapping or adjacent ones"""
+    normalized = []
+    for start_date, end_date in time_ranges or []:
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize() if end_date is not None else None
+        normalized.append((start, end))
+    normalized.sort(key=lambda r: (r[0], pd.Timestamp.max if r[1] is None else r[1]))
+
+    merged = []
+    for start, end in normalized:
+        if merged:
+            last_start, last_end = merged[-1]
+            if last_end is None or start <= last_end + pd.Timedelta(days=1):
+                merged[-1] = (last_start, None if last_end is None or end is None else max(last_end, end))
+                continue
+        merged.append((start, end))
+
+    return tuple((start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d') if end is not None else None)
+                 for start, end in merged)
+
+class CanonicalFilter:
+    """Merged time ranges plus sorted, deduplicated predicates"""
+
+    def __init__(self, time_ranges: list, filter_items: list, resolve: Callable | None = None):
+        self.time_ranges = merge_time_ranges(time_ranges)
+
+        equalities = {}
+        comparisons = set()
+        for filter_item in filter_items or []:
+            for column, op, values in parse_filter_item(filter_item, resolve):
+                if op == '=':
+                    # AND of two IN-sets on the same column is their intersection
+                    current = equalities.get(column)
+                    equalities[column] = set(values) if current is None else current & set(values)
+                else:
+                    comparisons.add((column, op, values))
+
+        self.predicates = tuple(sorted(
+            [(column, '=', tuple(sorted(values))) for column, values in equalities.items()] + list(comparisons)
+        ))
+
+    def time_sql(self) -> str:
+        """WHERE fragment for the time ranges ("1=1" when unrestricted)"""
+        time_conditions = []
+        for start_date, end_date in self.time_ranges:
+            time_conditions.append(date_range_sql(start_date, end_date))
+        return f"({' OR '.join(time_conditions)})" if time_conditions else "1=1"
+
+    def predicate_sql(self) -> str:
+        """Predicates as an " AND (...)" suffix for the WHERE clause, empty when there are none"""
+        conditions = []
+        for column, op, values in self.predicates:
+            if op != '=':
+                conditions.append(f"{column} {op} {comparison_sql_value(values[0])}")
+            elif not values:
+                conditions.append("1=0")
+            elif len(values) == 1:
+                conditions.append(f"{column} = {quote_sql_value(values[0])}")
+            else:
+                conditions.append(f"{column} IN ({', '.join(quote_sql_value(v) for v in values)})")
+        return f" AND ({' AND '.join(conditions)})" if conditions else ""
+
+    def to_sql(self) -> str:
+        """Full WHERE clause"""
+        return self.time_sql() + self.predicate_sql()
+
+    def equality_predicates(self) -> list[tuple[str, str]] | None:
+        """(column, value) pairs when every predicate is a single-value equality, otherwise None"""
+        if any(op != '=' or len(values) != 1 for _, op, values in self.predicates):
+            return None
+        return [(column, values[0]) for column, _, values in self.predicates]
+
+    def without(self, columns) -> CanonicalFilter:
+        """Copy with the predicates on the given columns removed"""
+        reduced = copy.copy(self)
+        reduced.predicates = tuple(p for p in self.predicates if p[0] not in columns)
+        return reduced
+
+    def cache_key(self) -> str:
+        """Stable key for caches keyed on filters rather than SQL"""
+        return repr((self.time_ranges, self.predicates))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CanonicalFilter) and self.cache_key() == other.cache_key()
+
+    def __hash__(self) -> int:
+        return hash(self.cache_key())
+
+    def __repr__(self) -> str:
+        return f"CanonicalFilter({self.cache_key()})"
@@ -2,10 +2,13 @@
 """SQL-optimized price variance analysis with minimal query overhead"""
 
 from __future__ import annotations
+import re
 import pandas as pd
 import logging
 import json
+import time
 import jinja2
+from typing import Iterator
 from types import SimpleNamespace
 from skill_framework import SkillInput, SkillOutput, SkillVisualization, ParameterDisplayDescription
 from skill_framework.skills import ExportData
@@ -14,6 +17,37 @@ from answer_rocket import AnswerRocketClient
 from ar_analytics.helpers.utils import get_dataset_id
 from ar_analytics import DriverAnalysis, DriverAnalysisTemplateParameterSetup
 from price_variance_helper_sql_optimized.price_variance_config import FINAL_PROMPT_TEMPLATE
+from price_variance_helper_sql_optimized.price_variance_sampling import (
+    load_stratified_sample, sample_filter_mask, estimate_supplier_and_kpis, estimate_contract_drilldown
+)
+from price_variance_helper_sql_optimized.price_variance_cube import MonthlyCube, get_monthly_cube, CUBE_AGE_NOTE_SECONDS
+from price_variance_helper_sql_optimized.price_variance_dataset import column_sql, schedule_derived_table, pinned_table_source, pin_table_source
+from price_variance_helper_sql_optimized.price_variance_anomalies import detect_price_anomalies
+from price_variance_helper_sql_optimized.price_variance_clients import get_data_client, get_llm_client
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_filters import CanonicalFilter
+from price_variance_helper_sql_optimized.price_variance_dimensions import get_dimension_index
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names, decode_names
+from price_variance_helper_sql_optimized.price_variance_pareto import fetch_pareto, PARETO_THRESHOLD, PARETO_MARKER_RANKS
+from price_variance_helper_sql_optimized.price_variance_scenarios import fetch_scenario_engine, parse_scenarios, default_scenarios
+from price_variance_helper_sql_optimized.price_variance_comparison import fetch_period_comparison
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE, parse_tolerance, interpolation_note, has_histograms
+from price_variance_helper_sql_optimized.price_variance_drilltree import DRILL_LEVELS, get_drill_tree, split_drill_filter
+from price_variance_helper_sql_optimized.price_variance_aggregation import (
+    fetch_breakout, kpis_from_sums, resolve_breakout, breakout_label, breakout_fact_key,
+    DEFAULT_BREAKOUT
+)
+from price_variance_helper_sql_optimized.price_variance_metrics import compile_metrics_sql, derive_metrics
+from price_variance_helper_sql_optimized.price_variance_ranking import fetch_ranking, rank_member_parts, decode_cursor
+from price_variance_helper_sql_optimized.price_variance_facts import encode_facts
+from price_variance_helper_sql_optimized.price_variance_exports import ExportFileWriter, prepare_export_data
+from price_variance_helper_sql_optimized.price_variance_recovery import (
+    get_recovery_store, parse_recovery_actions, apply_item_action, RECOVERY_REGISTER_CONTRACTS
+)
+from price_variance_helper_sql_optimized.price_variance_deadline import Deadline, DeadlineExceeded, with_deadline, without_deadline, deadline_of
+from price_variance_helper_sql_optimized.price_variance_crosstab import (
+    CategorySupplierMatrix, fetch_crosstab, summarize_crosstab
+)
 
 logger = logging.getLogger(__name__)
 
@@ -46,50 +80,79 @@ def format_currency_short(value):
     else:
         return f"${value:.0f}"
 
-def build_time_filter(parameters: SkillInput) -> str:
-    """Build time filter SQL from parameters"""
+def parse_time_period(period) -> tuple[str, str | None] | None:
+    """Parse one time_periods entry into an inclusive (start_date, end_date) range - end_date None means open-ended"""
+    if isinstance(period, dict) and 'start' in period and 'end' in period:
+        return (period['start'], period['end'])
+    if not isinstance(period, str):
+        return None
+    
+    period_lower = period.lower().strip()
+    
+    # Handle date range format like "2025-01-01 to 2025-12-31"
+    if ' to ' in period_lower:
+        parts = period_lower.split(' to ')
+        if len(parts) == 2:
+            start_date = parts[0].strip()
+            end_date = parts[1].strip()
+            return (start_date, end_date)
+    
+    # Handle quarter periods like 'q3 2025', 'Q1 2024', etc. - without a year, 2024
+    year_match = re.search(r"\b(?:19|20)\d{2}\b", period_lower)
+    year = year_match.group(0) if year_match else '2024'
+    if 'q1' in period_lower:
+        return (f"{year}-01-01", f"{year}-03-31")
+    elif 'q2' in period_lower:
+        return (f"{year}-04-01", f"{year}-06-30")
+    elif 'q3' in period_lower:
+        return (f"{year}-07-01", f"{year}-09-30")
+    elif 'q4' in period_lower:
+        return (f"{year}-10-01", f"{year}-12-31")
+    elif year_match is not None and period_lower == year:
+        # Full year
+        return (f"{year}-01-01", f"{year}-12-31")
+    else:
+        # Default to recent data if we can't parse
+        return ("2024-01-01", None)
+
+def parse_time_ranges(parameters: SkillInput) -> list[tuple[str, str | None]]:
+    """Parse time_periods into inclusive (start_date, end_date) ranges - end_date None means open-ended"""
     periods = parameters.arguments.time_periods if hasattr(parameters.arguments, 'time_periods') else []
+    return [time_range for time_range in map(parse_time_period, periods or []) if time_range is not None]
+
+def get_canonical_filter(parameters: SkillInput, arc: AnswerRocketClient | None = None) -> CanonicalFilter:
+    """
+    Canonical form of the time_periods and other_filters parameters. With a client the
+    dimension index may be loaded through it (under its deadline); otherwise only an
+    index that is already loaded grounds the filter values.
+    """
+    filters = parameters.arguments.other_filters if hasattr(parameters.arguments, 'other_filters') else []
     
-    if not periods:
-        return "1=1"
+    if isinstance(filters, (str, dict)):
+        filter_items = [filters]
+    elif isinstance(filters, list):
+        filter_items = filters
+    else:
+        filter_items = []
     
-    time_conditions = []
-    for period in periods:
-        if isinstance(period, dict) and 'start' in period and 'end' in period:
-            time_conditions.append(f"(transactionDate >= '{period['start']}' AND transactionDate <= '{period['end']}')")
-        elif isinstance(period, str):
-            period_lower = period.lower().strip()
-            
-            # Handle date range format like "2025-01-01 to 2025-12-31"
-            if ' to ' in period_lower:
-                parts = period_lower.split(' to ')
-                if len(parts) == 2:
-                    start_date = parts[0].strip()
-                    end_date = parts[1].strip()
-                    time_conditions.append(f"(transactionDate >= '{start_date}' AND transactionDate <= '{end_date}')")
-                    continue
-            
-            # Handle quarter periods like 'q3 2025', 'Q1 2024', etc.
-            if 'q1' in period_lower:
-                year = '2025' if '2025' in period_lower else '2024'
-                time_conditions.append(f"(transactionDate >= '{year}-01-01' AND transactionDate <= '{year}-03-31')")
-            elif 'q2' in period_lower:
-                year = '2025' if '2025' in period_lower else '2024'
-                time_conditions.append(f"(transactionDate >= '{year}-04-01' AND transactionDate <= '{year}-06-30')")
-            elif 'q3' in period_lower:
-                year = '2025' if '2025' in period_lower else '2024'
-                time_conditions.append(f"(transactionDate >= '{year}-07-01' AND transactionDate <= '{year}-09-30')")
-            elif 'q4' in period_lower:
-                year = '2025' if '2025' in period_lower else '2024'
-                time_conditions.append(f"(transactionDate >= '{year}-10-01' AND transactionDate <= '{year}-12-31')")
-            elif period_lower in ['2024', '2025', '2023']:
-                # Full year
-                time_conditions.append(f"(transactionDate >= '{period_lower}-01-01' AND transactionDate <= '{period_lower}-12-31')")
-            else:
-                # Default to recent data if we can't parse
-                time_conditions.append("transactionDate >= '2024-01-01'")
-    
-    return f"({' OR '.join(time_conditions)})" if time_conditions else "1=1"
+    return CanonicalFilter(parse_time_ranges(parameters), filter_items, get_filter_resolver(arc) if filter_items else None)
+
+def get_filter_resolver(arc: AnswerRocketClient | None = None):
+    """Dimension index lookup for grounding free-text filter values, None when the index is unavailable"""
+    try:
+        index = get_dimension_index(arc or get_data_client(), DATABASE_ID, fetch=arc is not None)
+    except Exception as e:
+        logger.warning(f"Dimension index unavailable, filters are matched exactly: {e}")
+        return None
+    return index.resolve if index is not None else None
+
+def build_time_filter(parameters: SkillInput) -> str:
+    """Build time filter SQL from parameters"""
+    return get_canonical_filter(parameters).time_sql()
+
+def parse_other_filters(parameters: SkillInput) -> list[tuple[str, str]] | None:
+    """Equality predicates from other_filters, or None when a filter is an IN-list or comparison"""
+    return get_canonical_filter(parameters).equality_predicates()
 
 def build_other_filters(parameters: SkillInput) -> tuple[str, list]:
     """
@@ -104,56 +167,25 @@ def build_other_filters(parameters: SkillInput) -> tuple[str, list]:
     # Create basic param info for the pills
     param_info = [
         ParameterDisplayDescription(key="metric", value="Metric: priceVarianceAmount"),
-        ParameterDisplayDescription(key="breakouts", value="Breakouts: supplierName, contractName"),
+        ParameterDisplayDescription(key="breakouts", value=f"Breakouts: {get_breakout(parameters)}, contractName"),
     ]
     
     if periods:
-        time_display = ", ".join([str(p) for p in periods])
+        time_display = (" vs " if len(get_comparison_periods(parameters)) >= 2 else ", ").join([str(p) for p in periods])
         param_info.append(ParameterDisplayDescription(key="period", value=f"Time Period: {time_display}"))
     
     # Handle different filter formats
     filter_sql = ""
     if filters:
-        filter_conditions = []
-        
-        # Handle string format like "operatingUnit: western"
-        if isinstance(filters, str):
-            filter_str = filters.strip()
-            if ':' in filter_str:
-                parts = filter_str.split(':', 1)
-                if len(parts) == 2:
-                    column = parts[0].strip()
-                    value = parts[1].strip()
-                    # Simple mapping for common filter values
-                    if 'western' in value.lower():
-                        filter_conditions.append("operatingUnit = 'West Ops'")
-                    else:
-                        filter_conditions.append(f"{column} = '{value}'")
-            
-            filter_display = filters
-        
-        # Handle list format
-        elif isinstance(filters, list):
-            for filter_item in filters:
-                if isinstance(filter_item, str) and ':' in filter_item:
-                    parts = filter_item.split(':', 1)
-                    if len(parts) == 2:
-                        column = parts[0].strip()
-                        value = parts[1].strip()
-                        # Simple mapping for common filter values
-                        if 'western' in value.lower():
-                            filter_conditions.append("operatingUnit = 'West Ops'")
-                        else:
-                            filter_conditions.append(f"{column} = '{value}'")
-            
-            filter_display = ', '.join([str(f) for f in filters])
+        # Strings like "operatingUnit: western", lists of them and grounded dicts all share one canonical form
+        filter_sql = get_canonical_filter(parameters).predicate_sql()
         
+        if isinstance(filters, list):
+            filter_display = ', '.join([str(f) for f in filters])
         else:
             filter_display = str(filters)
         
-        # Build SQL from conditions
-        if filter_conditions:
-            filter_sql = f" AND ({' AND '.join(filter_conditions)})"
+        if filter_sql:
             logger.info(f"✅ Built filter SQL: {filter_sql}")
         
         # Add filter info to param display
@@ -166,67 +198,588 @@ def convert_grounded_filters_to_sql(grounded_filters: list) -> str:
     if not grounded_filters:
         return ""
     
-    filter_conditions = []
+    result = CanonicalFilter([], grounded_filters).predicate_sql()
+    if result:
+        logger.info(f"🎯 Converted grounded filters to SQL: {result}")
+    return result
+
+# Placeholder text shown in the insight panels while the narrative is still being generated
+PENDING_INSIGHTS = "_Generating insights..._"
+
+# Minimum seconds between partial outputs while the narrative streams in token by token
+NARRATIVE_EMIT_INTERVAL = 0.1
+
+# Category lines on the trend chart (and category trend facts)
+TREND_MAX_SERIES = 5
+
+# What-if scenarios handed to the LLM as facts (all of them are exported)
+SCENARIO_MAX_FACTS = 10
+
+# Members on the comparison chart, and member / contract movers in the comparison facts
+COMPARISON_CHART_MEMBERS = 10
+COMPARISON_MAX_MOVERS = 5
+
+# Recovery statuses as shown on Page 3
+RECOVERY_STATUS_LABELS = {"identified": "Identified", "in_progress": "In progress"}
+
+# Category × supplier pairs listed in the Page 7 table and in the cross-tab facts
+CROSSTAB_TABLE_PAIRS = 20
+CROSSTAB_MAX_FACTS = 5
+
+def get_analysis_filter(parameters: SkillInput) -> tuple[str, list]:
+    """Combine the time and other filters into the WHERE clause shared by every query"""
+    _, param_info = build_other_filters(parameters)
+    return get_canonical_filter(parameters).to_sql(), param_info
+
+def get_execution_mode(parameters: SkillInput) -> str:
+    """Execution mode requested by the user - 'exact' (default) or 'approximate'"""
+    mode = parameters.arguments.execution_mode if hasattr(parameters.arguments, 'execution_mode') else None
+    return str(mode or 'exact').strip().lower()
+
+def get_breakout(parameters: SkillInput) -> str:
+    """Breakout dimension for Page 1 - supplierName unless another dataset dimension was requested"""
+    breakout = parameters.arguments.breakout if hasattr(parameters.arguments, 'breakout') else None
+    return resolve_breakout(breakout)
+
+def get_compliance_tolerance(parameters: SkillInput) -> Tolerance:
+    """Compliance tolerance requested by the user - $0.01 unless e.g. '$0.10' or '1%' was given"""
+    tolerance = parameters.arguments.compliance_tolerance if hasattr(parameters.arguments, 'compliance_tolerance') else None
+    return parse_tolerance(tolerance)
+
+def get_breakout_cursor(parameters: SkillInput) -> str | None:
+    """Keyset cursor for the next page of the breakout ranking, from a previous answer's notes"""
+    return parameters.arguments.breakout_cursor if hasattr(parameters.arguments, 'breakout_cursor') else None
+
+def get_contract_cursor(parameters: SkillInput) -> str | None:
+    """Keyset cursor for the next page of the top member's contracts, from a previous answer's notes"""
+    return parameters.arguments.contract_cursor if hasattr(parameters.arguments, 'contract_cursor') else None
+
+def fetch_approximate_results(arc: AnswerRocketClient, parameters: SkillInput) -> tuple[pd.DataFrame, dict, pd.DataFrame] | None:
+    """
+    Approximate Queries 1-3 from the persisted stratified sample.
+    Returns None when the sample is unavailable or cannot express the filters or breakout.
+    """
+    if get_breakout(parameters) != DEFAULT_BREAKOUT:
+        # The sample is stratified by supplier, so only the supplier breakout is estimated
+        return None
     
-    for filter_item in grounded_filters:
-        try:
-            if isinstance(filter_item, dict):
-                # Handle standard filter format: {'dim': 'category', 'op': '=', 'val': ['Cleaning Consumables']}
-                if 'dim' in filter_item and 'op' in filter_item and 'val' in filter_item:
-                    dim = filter_item['dim']
-                    op = filter_item['op']
-                    val = filter_item['val']
-                    
-                    if op == '=' and isinstance(val, list):
-                        # Multiple values - use IN clause
-                        if len(val) == 1:
-                            filter_conditions.append(f"{dim} = '{val[0]}'")
-                        else:
-                            quoted_vals = [f"'{v}'" for v in val]
-                            filter_conditions.append(f"{dim} IN ({', '.join(quoted_vals)})")
-                    elif op == '=' and isinstance(val, str):
-                        filter_conditions.append(f"{dim} = '{val}'")
-                    elif op in ['>', '<', '>=', '<='] and isinstance(val, (int, float, str)):
-                        filter_conditions.append(f"{dim} {op} {val}")
-                    else:
-                        # Handle other operators
-                        val_str = f"'{val}'" if isinstance(val, str) else str(val)
-                        filter_conditions.append(f"{dim} {op} {val_str}")
-                        
-                # Handle other filter formats that might come from the platform
-                elif 'column' in filter_item and 'values' in filter_item:
-                    column = filter_item['column'] 
-                    values = filter_item['values']
-                    if isinstance(values, list):
-                        if len(values) == 1:
-                            filter_conditions.append(f"{column} = '{values[0]}'")
-                        else:
-                            quoted_vals = [f"'{v}'" for v in values]
-                            filter_conditions.append(f"{column} IN ({', '.join(quoted_vals)})")
-                    
-        except Exception as e:
-            logger.warning(f"Could not parse filter item {filter_item}: {e}")
-            continue
+    try:
+        sample = load_stratified_sample(arc, DATABASE_ID)
+        if sample is None:
+            return None
+        
+        canonical = get_canonical_filter(parameters)
+        predicates = canonical.equality_predicates()
+        if predicates is None:
+            return None
+        
+        mask = sample_filter_mask(sample, canonical.time_ranges, predicates)
+        if mask is None or not mask.any():
+            return None
+        
+        tolerance = get_compliance_tolerance(parameters)
+        supplier_df, kpi_data = estimate_supplier_and_kpis(sample, mask, tolerance=tolerance)
+        if supplier_df.empty:
+            return None
+        
+        contract_df = estimate_contract_drilldown(sample, mask, supplier_df.iloc[0]['supplierName'], tolerance=tolerance)
+        logger.info(f"⚡ Approximate answer from {kpi_data['sample_rows']:,} sampled rows")
+        return supplier_df, kpi_data, contract_df
     
-    if filter_conditions:
-        result = f" AND ({' AND '.join(filter_conditions)})"
-        logger.info(f"🎯 Converted grounded filters to SQL: {result}")
-        return result
+    except Exception as e:
+        logger.warning(f"Approximate mode failed, falling back to exact queries: {e}")
+        return None
+
+def get_covering_cube(arc: AnswerRocketClient, time_ranges: list, predicates: list | None,
+                      tolerance: Tolerance = DEFAULT_TOLERANCE) -> MonthlyCube | None:
+    """Monthly cube when it is ready and can answer these filters at the tolerance, otherwise None"""
+    if predicates is None:
+        return None
     
-    return ""
+    try:
+        cube = get_monthly_cube(without_deadline(arc), DATABASE_ID)
+    except Exception as e:
+        logger.warning(f"Monthly cube unavailable: {e}")
+        return None
+    
+    if cube is None or not cube.covers(time_ranges, predicates):
+        return None
+    if not has_histograms(cube.cells.columns, tolerance):
+        logger.warning(f"Monthly cube has no variance histograms - compliance at {tolerance.label()} is computed in SQL")
+        return None
+    logger.info("🧊 Monthly cube covers this request - using sketches for distinct counts and percentiles")
+    deadline = deadline_of(arc)
+    if deadline is not None and cube.age() > CUBE_AGE_NOTE_SECONDS:
+        built = pd.Timestamp.fromtimestamp(cube.built_at).strftime('%Y-%m-%d %H:%M')
+        deadline.degrade(f"Totals come from monthly aggregates built {cube.age() / 3600:.1f}h ago ({built}) - "
+                         f"transactions added since are not included")
+    return cube
 
-def run_price_variance_analysis_sql(parameters: SkillInput) -> SkillOutput:
-    """Main SQL-optimized function - uses only 3 efficient queries instead of 15+ DriverAnalysis calls"""
+def add_variance_percentiles(df: pd.DataFrame, cube: MonthlyCube | None, group_by: str,
+                             time_ranges: list, predicates: list) -> pd.DataFrame:
+    """Attach median and p95 variance_pct per row from the cube's merged sketches"""
+    if cube is None or df is None or df.empty or group_by not in df.columns:
+        return df
     
     try:
-        arc = AnswerRocketClient()
-        time_filter = build_time_filter(parameters)
+        quantiles_df = cube.variance_pct_quantiles(group_by, time_ranges, predicates)
+        return df.merge(quantiles_df, on=group_by, how='left')
+    except Exception as e:
+        logger.warning(f"Could not compute variance percentiles for {group_by}: {e}")
+        return df
+
+def fetch_supplier_and_kpis(arc: AnswerRocketClient, full_filter: str, count_distinct: bool = True,
+                            breakout: str = DEFAULT_BREAKOUT, cube: MonthlyCube | None = None,
+                            time_ranges: list = (), predicates: list | None = None,
+                            tolerance: Tolerance = DEFAULT_TOLERANCE,
+                            cursor: str | None = None) -> tuple[pd.DataFrame | None, dict | None, dict | None]:
+    """
+    Run Query 1 (breakout ranking, suppliers by default) and Query 2 (overall KPIs) - the fast
+    first stage. Both come from one ranking scan: a page of the ranked members (the page
+    after cursor, if given), the exact "all others" row and the grand total row, from which
+    the KPIs are derived. When the cube covers the request the ranking runs over its cells
+    instead. With count_distinct=False the scan skips COUNT(DISTINCT supplierName) and the
+    caller fills total_suppliers from the cube's HyperLogLog sketches.
+    Returns (supplier_df, kpi_data, {'others', 'totals', 'next_cursor'}).
+    """
+    logger.info(f"🔍 Queries 1+2: Getting {breakout} ranking and overall KPIs in one scan...")
+    ranking = fetch_ranking(arc, DATABASE_ID, breakout, full_filter, cursor=cursor, cube=cube, time_ranges=time_ranges,
+                            predicates=predicates, tolerance=tolerance,
+                            extra_metrics=("distinct_suppliers",) if count_distinct else ())
+    supplier_df = ranking['rows'] if ranking is not None else None
+    
+    if supplier_df is None or supplier_df.empty:
+        logger.error(f"Breakout query by {breakout} returned no data")
+        return None, None, None
+    totals = ranking['total_parts']
         
-        # Build filters directly from other_filters parameter
-        other_filter_sql, param_info = build_other_filters(parameters)
+    logger.info(f"✅ Query 1 complete: Got {len(supplier_df)} {breakout_label(breakout, plural=True).lower()}")
+    
+    if totals is not None:
+        kpi_data = kpis_from_sums(totals)
+        logger.info("✅ Query 2 complete: Got overall KPIs")
+    else:
+        logger.warning("KPI totals missing, using defaults")
+        kpi_data = {
+            'total_variance': supplier_df['total_variance'].sum() if not supplier_df.empty else 0,
+            'total_invoice_value': 0,
+            'avg_variance_rate': 0,
+            'compliance_rate': 0,
+            'total_suppliers': len(supplier_df),
+            'total_transactions': supplier_df['transaction_count'].sum() if not supplier_df.empty else 0
+        }
+    
+    return supplier_df, kpi_data, {key: value for key, value in ranking.items() if key not in ('rows', 'total_parts')}
+
+def fetch_contract_drilldown(arc: AnswerRocketClient, full_filter: str, top_supplier: str,
+                             breakout: str = DEFAULT_BREAKOUT, cube: MonthlyCube | None = None,
+                             time_ranges: list = (), predicates: list | None = None,
+                             tolerance: Tolerance = DEFAULT_TOLERANCE, cursor: str | None = None) -> tuple[pd.DataFrame, dict | None]:
+    """
+    Run Query 3 - contract ranking for the top breakout member (top supplier by default).
+    Returns (one page of contracts, {'others', 'totals', 'next_cursor'}) - the "all other
+    contracts" and totals rows are exact however many contracts the member has.
+    """
+    logger.info(f"🔍 Query 3: Getting contract ranking for top {breakout}: {top_supplier}...")
+    
+    member_filter = f"{full_filter} AND {breakout} = '{str(top_supplier).replace(chr(39), chr(39) * 2)}'"
+    member_predicates = predicates + [(breakout, top_supplier)] if predicates is not None else None
+    ranking = fetch_ranking(arc, DATABASE_ID, 'contractName', member_filter, cursor=cursor, cube=cube,
+                            time_ranges=time_ranges, predicates=member_predicates, tolerance=tolerance)
+    
+    if ranking is not None:
+        totals = ranking['totals'] or {}
+        logger.info(f"✅ Query 3 complete: Got {len(ranking['rows'])} of {totals.get('member_count', 0)} contracts for {top_supplier}")
+        return split_contract_ranking(ranking)
+    
+    logger.warning("Contract query failed")
+    return pd.DataFrame(), None
+
+def split_contract_ranking(ranking: dict) -> tuple[pd.DataFrame, dict]:
+    """(contract_df in the Query 3 shape, ranking summary without the rows)"""
+    contract_df = ranking['rows'].rename(columns={'total_variance': 'variance_amount'})
+    return contract_df, {key: value for key, value in ranking.items() if key != 'rows'}
+
+def fetch_monthly_trend(arc: AnswerRocketClient, full_filter: str, cube: MonthlyCube | None,
+                        time_ranges: list, predicates: list | None, tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+    """Monthly compliance and variance by category - from the cube rollups when it covers the request"""
+    if cube is not None:
+        logger.info("🧊 Monthly trend from cube rollups")
+        return cube.monthly_trend(time_ranges, predicates, by='category', tolerance=tolerance)
+    
+    logger.info("🔍 Query 4: Getting monthly trend by category...")
+    trend_sql = compile_metrics_sql(["total_variance", "total_invoice_value", "compliance_rate"], full_filter,
+                                    {"month_key": column_sql("month_key"), "category": "category"},
+                                    order_by="month_key, category", tolerance=tolerance)
+    
+    logger.info(f"📝 SQL Query 4:\n{trend_sql}")
+    trend_result = execute_cached_query(arc, DATABASE_ID, trend_sql, 10000)
+    
+    if not trend_result.success or trend_result.df is None:
+        logger.warning("Monthly trend query failed")
+        return pd.DataFrame()
+    
+    trend_df = encode_names(trend_result.df)
+    trend_df['compliance_rate'] = derive_metrics(trend_df, ["compliance_rate"])["compliance_rate"]
+    logger.info(f"✅ Query 4 complete: Got {len(trend_df)} month × category rows")
+    return trend_df
+
+def run_price_variance_analysis_sql(parameters: SkillInput, notes: list = ()) -> SkillOutput:
+    """
+    Run the staged analysis and return the complete SkillOutput - only the final output
+    is built (iter_price_variance_outputs yields the intermediate ones). notes are added
+    to the answer's notes (e.g. the warm-up still running).
+    """
+    output = None
+    for output in iter_price_variance_outputs(parameters, progressive=False, notes=notes):
+        pass
+    return output if output is not None else create_empty_output()
+
+def new_results(supplier_df: pd.DataFrame, kpi_data: dict, contract_df: pd.DataFrame | None = None,
+                breakout: str = DEFAULT_BREAKOUT, tolerance: Tolerance = DEFAULT_TOLERANCE) -> SimpleNamespace:
+    """
+    Container for the stage results that feed the pages, facts and exports.
+    supplier_df holds the Page 1 breakout (suppliers by default) and top_supplier its top member;
+    every compliance rate is at the given tolerance.
+    """
+    return SimpleNamespace(
+        breakout=breakout,
+        tolerance=tolerance,
+        supplier_df=supplier_df,
+        kpi_data=kpi_data,
+        top_supplier=str(supplier_df.iloc[0][breakout]) if not supplier_df.empty else "N/A",
+        contract_df=contract_df,
+        breakout_ranking=None,
+        contract_ranking=None,
+        trend_df=None,
+        pareto_df=None,
+        pareto_summary=None,
+        crosstab=None,
+        scenario_df=None,
+        member_savings=None,
+        comparison=None,
+        anomaly_df=None,
+        anomaly_summary=None,
+        recovery=None,
+        degradations=[],
+        export_files=[]
+    )
+
+def run_approximate_stage(arc: AnswerRocketClient, parameters: SkillInput, cube: MonthlyCube | None, time_ranges: list,
+                          predicates: list, tolerance: Tolerance = DEFAULT_TOLERANCE) -> SimpleNamespace | None:
+    """Queries 1-3 estimated from the stratified sample, None when the sample cannot answer"""
+    approximate = fetch_approximate_results(arc, parameters)
+    if approximate is None:
+        return None
+    results = new_results(*approximate, tolerance=tolerance)
+    results.supplier_df = add_variance_percentiles(results.supplier_df, cube, 'supplierName', time_ranges, predicates)
+    results.contract_df = add_variance_percentiles(results.contract_df, cube, 'contractName', time_ranges,
+                                                   (predicates or []) + [('supplierName', results.top_supplier)])
+    return results
+
+def run_supplier_stage(arc: AnswerRocketClient, full_filter: str, cube: MonthlyCube | None,
+                       time_ranges: list, predicates: list, breakout: str = DEFAULT_BREAKOUT,
+                       tolerance: Tolerance = DEFAULT_TOLERANCE, cursor: str | None = None) -> SimpleNamespace | None:
+    """Stage 1 - Queries 1 and 2, with rollups, distinct counts and percentiles from the cube when it covers the request"""
+    supplier_df, kpi_data, ranking = fetch_supplier_and_kpis(arc, full_filter, count_distinct=cube is None, breakout=breakout,
+                                                             cube=cube, time_ranges=time_ranges, predicates=predicates,
+                                                             tolerance=tolerance, cursor=cursor)
+    if supplier_df is None:
+        return None
+    
+    if cube is not None:
+        kpi_data['total_suppliers'] = cube.distinct_count('supplierName', time_ranges, predicates)
+        supplier_df = add_variance_percentiles(supplier_df, cube, breakout, time_ranges, predicates)
+    
+    results = new_results(supplier_df, kpi_data, breakout=breakout, tolerance=tolerance)
+    results.breakout_ranking = ranking
+    return results
+
+def run_contract_stage(arc: AnswerRocketClient, results: SimpleNamespace, full_filter: str, cube: MonthlyCube | None,
+                       time_ranges: list, predicates: list, cursor: str | None = None) -> SimpleNamespace:
+    """Stage 2 - Query 3 for the top breakout member (skipped when the breakout is already by contract)"""
+    if results.breakout == 'contractName':
+        results.contract_df = pd.DataFrame()
+        return results
+    
+    contract_df, results.contract_ranking = fetch_contract_drilldown(arc, full_filter, results.top_supplier, results.breakout,
+                                                                     cube, time_ranges, predicates, results.tolerance, cursor)
+    results.contract_df = add_variance_percentiles(contract_df, cube, 'contractName', time_ranges,
+                                                   (predicates or []) + [(results.breakout, results.top_supplier)])
+    return results
+
+def run_drill_tree_stage(arc: AnswerRocketClient, canonical: CanonicalFilter, breakout: str, cube: MonthlyCube | None,
+                         time_ranges: list, predicates: list, tolerance: Tolerance = DEFAULT_TOLERANCE,
+                         cursor: str | None = None, breakout_cursor: str | None = None) -> SimpleNamespace | None:
+    """
+    Stages 1 and 2 from the category -> supplier -> contract drill tree. The tree for the
+    filters without their drill-level predicates is built with a ROLLUP query only for a
+    drill request (a drill-level predicate or a non-default breakout) the cube does not
+    cover; later drills against the same base filters then run no warehouse queries at all.
+    Other requests use the tree only when it is already in memory.
+    Returns None when the breakout is not a drill level or the tree is unavailable.
+    """
+    if breakout not in DRILL_LEVELS:
+        return None
+    
+    base, constraints = split_drill_filter(canonical)
+    is_drill = bool(constraints) or breakout != DEFAULT_BREAKOUT
+    tree = get_drill_tree(arc, DATABASE_ID, base, build_if_missing=is_drill and cube is None)
+    if tree is None or not has_histograms(tree.sums.columns, tolerance):
+        return None
+    
+    breakout_ranking = rank_member_parts(tree.member_parts(breakout, constraints, tolerance), breakout,
+                                         cursor=decode_cursor(breakout_cursor))
+    supplier_df = breakout_ranking.pop('rows')
+    if supplier_df.empty:
+        return None
+    logger.info(f"🌳 Queries 1-3 served from the drill tree ({len(supplier_df)} {breakout_label(breakout, plural=True).lower()})")
+    
+    results = new_results(supplier_df, tree.kpis(constraints, tolerance), breakout=breakout, tolerance=tolerance)
+    results.breakout_ranking = {key: value for key, value in breakout_ranking.items() if key != 'total_parts'}
+    if breakout == 'contractName':
+        results.contract_df = pd.DataFrame()
+    else:
+        member_constraints = dict(constraints, **{breakout: results.top_supplier})
+        ranking = rank_member_parts(tree.member_parts('contractName', member_constraints, tolerance), 'contractName',
+                                    cursor=decode_cursor(cursor))
+        results.contract_df, results.contract_ranking = split_contract_ranking(ranking)
+    
+    if cube is not None:
+        results.supplier_df = add_variance_percentiles(results.supplier_df, cube, breakout, time_ranges, predicates)
+        if not results.contract_df.empty:
+            results.contract_df = add_variance_percentiles(results.contract_df, cube, 'contractName', time_ranges,
+                                                           predicates + [(breakout, results.top_supplier)])
+    return results
+
+def run_query_phase(parameters: SkillInput, arc: AnswerRocketClient | None = None) -> SimpleNamespace | None:
+    """Stages 1 and 2 without rendering or the LLM - used to warm the caches"""
+    arc = arc or get_data_client()
+    with pinned_table_source():
+        canonical = get_canonical_filter(parameters, arc)
+        full_filter = canonical.to_sql()
+        time_ranges, predicates = canonical.time_ranges, canonical.equality_predicates()
+        tolerance = get_compliance_tolerance(parameters)
+        cube = get_covering_cube(arc, time_ranges, predicates, tolerance)
+        
+        cursor = get_contract_cursor(parameters)
+        
+        results = run_drill_tree_stage(arc, canonical, get_breakout(parameters), cube, time_ranges, predicates, tolerance, cursor,
+                                       get_breakout_cursor(parameters))
+        if results is not None:
+            return results
+        
+        results = run_supplier_stage(arc, full_filter, cube, time_ranges, predicates, get_breakout(parameters), tolerance,
+                                     get_breakout_cursor(parameters))
+        if results is not None:
+            run_contract_stage(arc, results, full_filter, cube, time_ranges, predicates, cursor)
+        return results
+
+def run_pareto_stage(arc: AnswerRocketClient, full_filter: str, breakout: str) -> tuple[pd.DataFrame, dict | None]:
+    """Downsampled Pareto curve of the breakout members' variance, computed in SQL"""
+    logger.info(f"🔍 Pareto: cumulative variance share by {breakout}...")
+    try:
+        return fetch_pareto(arc, DATABASE_ID, breakout, full_filter)
+    except Exception as e:
+        logger.warning(f"Pareto analysis failed: {e}")
+        return pd.DataFrame(), None
+
+def run_crosstab_stage(arc: AnswerRocketClient, results: SimpleNamespace, full_filter: str, canonical: CanonicalFilter,
+                       cube: MonthlyCube | None, time_ranges: list, predicates: list) -> SimpleNamespace:
+    """Sparse category × supplier matrix - from the drill tree already in memory, the cube or one GROUP BY"""
+    logger.info("🔍 Cross-tab: category × supplier variance matrix...")
+    try:
+        base, constraints = split_drill_filter(canonical)
+        tree = get_drill_tree(arc, DATABASE_ID, base, build_if_missing=False)
+        matrix = fetch_crosstab(arc, DATABASE_ID, full_filter, cube, time_ranges, predicates, results.tolerance, tree, constraints)
+        if matrix is not None and matrix.nnz > 0:
+            results.crosstab = matrix
+            logger.info(f"✅ Cross-tab: {matrix.nnz:,} non-empty pairs of {matrix.shape[0]:,} × {matrix.shape[1]:,}")
+    except Exception as e:
+        logger.warning(f"Cross-tab failed: {e}")
+    return results
+
+def get_recovery_actions(parameters: SkillInput) -> list[dict]:
+    """Recovery actions requested by the user - none unless asked, so analyses only read the pipeline"""
+    requested = parameters.arguments.recovery_actions if hasattr(parameters.arguments, 'recovery_actions') else None
+    if isinstance(requested, str):
+        requested = [requested]
+    return parse_recovery_actions(requested)
+
+def run_recovery_stage(results: SimpleNamespace, canonical: CanonicalFilter, parameters: SkillInput) -> dict | None:
+    """
+    Apply the requested recovery actions, then read the Page 3 KPIs, weekly timeline and
+    open items from the recovery store (scoped to any supplier filter).
+    """
+    try:
+        store = get_recovery_store(DATABASE_ID)
+        messages = []
+        for action in get_recovery_actions(parameters):
+            if action['action'] != 'register':
+                try:
+                    messages.append(apply_item_action(store, action))
+                except (KeyError, ValueError) as e:
+                    messages.append(f"Recovery action not applied: {e.args[0]}")
+                continue
+            contract_df = decode_names(results.contract_df)
+            if results.breakout != 'supplierName' or contract_df is None or contract_df.empty:
+                messages.append("Recovery items are opened from the supplier breakout's contract drilldown - none opened")
+                continue
+            periods = parameters.arguments.time_periods if hasattr(parameters.arguments, 'time_periods') else []
+            window = ', '.join(periods) if periods else 'all time'
+            leaking = contract_df.head(RECOVERY_REGISTER_CONTRACTS)
+            opened, revised = store.register_opportunities(pd.DataFrame({
+                "supplier": results.top_supplier,
+                "contract": leaking['contractName'],
+                "amount": leaking['variance_amount'],
+                "title": [f"Price variance recovery - {contract} ({window})" for contract in leaking['contractName']]
+            }))
+            messages.append(f"Recovery items for {results.top_supplier} ({window}): {opened} opened, {revised} re-valued")
+        for message in messages:
+            logger.info(f"💰 {message}")
+        suppliers = [value for column, op, values in canonical.predicates if column == 'supplierName' and op == '='
+                     for value in values] or None
+        return {
+            "summary": store.summary(suppliers),
+            "timeline": store.weekly_timeline(suppliers),
+            "items": store.open_items(suppliers),
+            "messages": messages
+        }
+    except Exception as e:
+        logger.warning(f"Recovery store unavailable: {e}")
+        return None
+
+def get_savings_scenarios(parameters: SkillInput) -> list[dict]:
+    """Requested what-if scenarios, or the default top N x cap sweep"""
+    requested = parameters.arguments.savings_scenarios if hasattr(parameters.arguments, 'savings_scenarios') else None
+    if isinstance(requested, str):
+        requested = [requested]
+    return parse_scenarios(requested) or default_scenarios()
+
+def run_scenario_stage(arc: AnswerRocketClient, results: SimpleNamespace, full_filter: str, scenarios: list[dict]) -> SimpleNamespace:
+    """What-if savings for every scenario, plus each member's savings at contract price"""
+    logger.info(f"🔍 What-if: evaluating {len(scenarios)} savings scenarios by {results.breakout}...")
+    try:
+        engine = fetch_scenario_engine(arc, DATABASE_ID, results.breakout, full_filter)
+        if engine is not None:
+            started = time.perf_counter()
+            results.scenario_df = engine.savings_table(scenarios, results.kpi_data['total_variance'])
+            results.member_savings = engine.member_savings()
+            logger.info(f"✅ What-if complete: {len(scenarios)} scenarios in {(time.perf_counter() - started) * 1000:.1f}ms")
+    except Exception as e:
+        logger.warning(f"What-if scenarios failed: {e}")
+    return results
+
+def get_comparison_periods(parameters: SkillInput) -> list[tuple[str, str, str | None]]:
+    """(label, start, end) per time period when period comparison is on, empty otherwise"""
+    setting = parameters.arguments.period_comparison if hasattr(parameters.arguments, 'period_comparison') else None
+    if str(setting or 'off').strip().lower() != 'on':
+        return []
+    
+    periods = parameters.arguments.time_periods if hasattr(parameters.arguments, 'time_periods') else []
+    comparison_periods = []
+    for period in periods or []:
+        time_range = parse_time_period(period)
+        if time_range is None:
+            continue
+        label = f"{period['start']} to {period['end']}" if isinstance(period, dict) else str(period).strip()
+        comparison_periods.append((label, *time_range))
+    return comparison_periods
+
+def run_comparison_stage(arc: AnswerRocketClient, results: SimpleNamespace, full_filter: str,
+                         periods: list[tuple[str, str, str | None]]) -> SimpleNamespace:
+    """Per-period breakout and contract aggregates with deltas and rank changes, from one scan"""
+    logger.info(f"🔍 Period comparison: {' vs '.join(label for label, _, _ in periods)}...")
+    try:
+        results.comparison = fetch_period_comparison(arc, DATABASE_ID, results.breakout, full_filter, periods, results.tolerance)
+    except Exception as e:
+        logger.warning(f"Period comparison failed: {e}")
+    return results
+
+def get_anomaly_detection(parameters: SkillInput) -> bool:
+    """Whether the line-level anomaly stage was requested"""
+    setting = parameters.arguments.anomaly_detection if hasattr(parameters.arguments, 'anomaly_detection') else None
+    return str(setting or 'off').strip().lower() == 'on'
+
+def get_export_mode(parameters: SkillInput) -> str:
+    """Exports requested by the user - 'all' (default) or 'none'"""
+    mode = parameters.arguments.exports if hasattr(parameters.arguments, 'exports') else None
+    return str(mode or 'all').strip().lower()
+
+def get_narrative_mode(parameters: SkillInput) -> str:
+    """Narrative mode requested by the user - 'llm' (default) or 'template' (no LLM call)"""
+    mode = parameters.arguments.narrative_mode if hasattr(parameters.arguments, 'narrative_mode') else None
+    return str(mode or 'llm').strip().lower()
+
+def run_anomaly_stage(arc: AnswerRocketClient, results: SimpleNamespace, full_filter: str,
+                      export_flagged: bool = False) -> SimpleNamespace:
+    """Top flagged lines of the filtered transactions - and every flagged line to an export file"""
+    writer = ExportFileWriter("All Flagged Transactions") if export_flagged else None
+    try:
+        scanned_lines = results.kpi_data.get('total_transactions', 0) if results.kpi_data else 0
+        results.anomaly_df, results.anomaly_summary = detect_price_anomalies(arc, DATABASE_ID, full_filter,
+                                                                             scanned_lines=scanned_lines,
+                                                                             flagged_writer=writer)
+    except Exception as e:
+        logger.warning(f"Anomaly detection failed: {e}")
+        results.anomaly_df, results.anomaly_summary = pd.DataFrame(), None
+    if writer is not None:
+        if writer.rows:
+            results.export_files.append(writer.close())
+        else:
+            writer.discard()
+    return results
+
+def iter_price_variance_outputs(parameters: SkillInput, progressive: bool = True, notes: list = ()) -> Iterator[SkillOutput]:
+    """
+    Progressive variant of the analysis - yields a SkillOutput after every stage.
+    
+    Every stage runs under one end-to-end Deadline with a window per stage (see
+    price_variance_deadline). Over-budget stages degrade instead of blocking: stale
+    cached or approximate Queries 1-2, no drilldown or analytics, a deterministic
+    narrative - each noted in the answer.
+    
+    1. KPI cards plus the Page 1 chart and table as soon as Queries 1 and 2 return
+    2. Page 2 once the contract drilldown (Query 3) completes
+    3. Page 4 once the monthly compliance trend is ready
+    4. Page 5 once the Pareto concentration curve is ready
+    5. Page 7 once the category × supplier cross-tab is built
+    6. Savings scenarios once the what-if sweep is evaluated
+    7. Page 6 once the optional period comparison completes
+    8. Flagged lines once the optional anomaly stage completes
+    9. Narrative updates as the LLM streams tokens (throttled to NARRATIVE_EMIT_INTERVAL)
+    
+    With narrative_mode='template' the narrative is written from templates over the facts
+    and the LLM is never called; the same templates stand in when the LLM is unavailable.
+    
+    With execution_mode='approximate' a sample-based answer is yielded first and then
+    refreshed with the exact queries; non-progressive callers get the approximate answer only.
+    
+    The last output yielded is always the complete result and the only one carrying
+    export data. With progressive=False only that final output is produced.
+    
+    All SQL of the invocation reads the table source pinned when it starts (the derived
+    copy or the CSV, see price_variance_dataset).
+    """
+    return pin_table_source(generate_price_variance_outputs(parameters, progressive, notes))
+
+def generate_price_variance_outputs(parameters: SkillInput, progressive: bool, notes: list = ()) -> Iterator[SkillOutput]:
+    """Body of iter_price_variance_outputs, run with the table source pinned"""
+    try:
+        deadline = Deadline()
+        for note in notes:
+            deadline.degrade(note)
+        arc = with_deadline(get_data_client(), deadline)
+        
+        # Re-verify the derived table in the background when its check is due - this request keeps its pinned source
+        schedule_derived_table(without_deadline(arc), DATABASE_ID)
         
-        # Combine filters
-        full_filter = time_filter + other_filter_sql
+        # Filter values are grounded within the queries window - the dimension index loads under the deadline
+        deadline.start_stage("queries")
+        canonical = get_canonical_filter(parameters, arc)
+        
+        # Build filters directly from other_filters parameter
+        full_filter, param_info = get_analysis_filter(parameters)
         
         logger.info("=== SQL OPTIMIZED: Starting analysis with 3 efficient queries ===")
         
@@ -236,154 +789,295 @@ def run_price_variance_analysis_sql(parameters: SkillInput) -> SkillOutput:
         
         logger.info("🔧 Analysis Parameters:")
         logger.info(f"  📊 Main Metric: priceVarianceAmount")
-        logger.info(f"  🎯 Breakouts: supplierName, contractName") 
+        logger.info(f"  🎯 Breakouts: {get_breakout(parameters)}, contractName")
+        logger.info(f"  ✅ Compliance Tolerance: {get_compliance_tolerance(parameters).label()}")
         logger.info(f"  📅 Time Periods: {periods if periods else ['All Time']}")
         logger.info(f"  🔍 Additional Filters: {filters if filters else ['None']}")
         logger.info(f"  ⏰ Full Filter SQL: {full_filter}")
         
-        # QUERY 1: Get all supplier data in one shot
-        logger.info("🔍 Query 1: Getting comprehensive supplier data...")
-        supplier_sql = f"""
-        SELECT 
-            supplierName,
-            -- Variance metrics
-            SUM(invoicePrice - expectedPrice) as total_variance,
-            AVG((invoicePrice - expectedPrice) / NULLIF(expectedPrice, 0) * 100) as variance_pct,
-            
-            -- Price metrics
-            AVG(invoicePrice) as avg_invoice_price,
-            AVG(catalogPrice) as avg_catalog_price, 
-            AVG(expectedPrice) as avg_expected_price,
-            
-            -- Compliance metrics
-            SUM(CASE WHEN ABS(invoicePrice - expectedPrice) <= 0.01 THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as compliance_rate,
-            
-            -- Volume metrics
-            COUNT(*) as transaction_count,
-            SUM(quantity) as total_quantity
-            
-        FROM read_csv('procurement_compliance_v8.csv')
-        WHERE {full_filter}
-        GROUP BY supplierName
-        ORDER BY total_variance DESC
-        """
-        
-        logger.info(f"📝 SQL Query 1:\n{supplier_sql}")
-        supplier_result = arc.data.execute_sql_query(DATABASE_ID, supplier_sql, 100)
-        
-        if not supplier_result.success or supplier_result.df is None or supplier_result.df.empty:
-            logger.error(f"Supplier query failed: {supplier_result.error if not supplier_result.success else 'No data'}")
-            return create_empty_output()
-            
-        supplier_df = supplier_result.df
-        logger.info(f"✅ Query 1 complete: Got {len(supplier_df)} suppliers")
-        
-        # QUERY 2: Get overall KPIs in one shot
-        logger.info("🔍 Query 2: Getting overall KPIs...")
-        kpi_sql = f"""
-        SELECT 
-            -- Total metrics
-            SUM(invoicePrice - expectedPrice) as total_variance,
-            SUM(invoicePrice) as total_invoice_value,
-            
-            -- Average metrics  
-            AVG((invoicePrice - expectedPrice) / NULLIF(expectedPrice, 0) * 100) as avg_variance_rate,
-            
-            -- Compliance metrics
-            SUM(CASE WHEN ABS(invoicePrice - expectedPrice) <= 0.01 THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as compliance_rate,
-            
-            -- Volume metrics
-            COUNT(DISTINCT supplierName) as total_suppliers,
-            COUNT(*) as total_transactions
-            
-        FROM read_csv('procurement_compliance_v8.csv')
-        WHERE {full_filter}
-        """
+        time_ranges, predicates = canonical.time_ranges, canonical.equality_predicates()
+        tolerance = get_compliance_tolerance(parameters)
+        cube = get_covering_cube(arc, time_ranges, predicates, tolerance)
+        # The cube and the drill tree serve compliance from variance histograms
+        histogram_note = interpolation_note(tolerance)
+        if cube is not None and histogram_note:
+            deadline.degrade(histogram_note)
         
-        logger.info(f"📝 SQL Query 2:\n{kpi_sql}")
-        kpi_result = arc.data.execute_sql_query(DATABASE_ID, kpi_sql, 1)
+        results = None
+        if get_execution_mode(parameters) == 'approximate':
+            results = run_approximate_stage(arc, parameters, cube, time_ranges, predicates, tolerance)
+            if results is not None:
+                results.degradations = deadline.degradations
+                if progressive:
+                    # Show the approximate answer first, then refresh with the exact queries below
+                    logger.info("⚡ Progressive: emitting approximate stage")
+                    yield build_skill_output(results, parameters, param_info)
+                    results = None
         
-        if kpi_result.success and kpi_result.df is not None and not kpi_result.df.empty:
-            kpi_data = kpi_result.df.iloc[0].to_dict()
-            logger.info("✅ Query 2 complete: Got overall KPIs")
-        else:
-            logger.warning("KPI query failed, using defaults")
-            kpi_data = {
-                'total_variance': supplier_df['total_variance'].sum() if not supplier_df.empty else 0,
-                'total_invoice_value': 0,
-                'avg_variance_rate': 0,
-                'compliance_rate': 0,
-                'total_suppliers': len(supplier_df),
-                'total_transactions': supplier_df['transaction_count'].sum() if not supplier_df.empty else 0
-            }
-        
-        # QUERY 3: Get contract data for top supplier in one shot
-        if not supplier_df.empty:
-            top_supplier = supplier_df.iloc[0]['supplierName']
-            logger.info(f"🔍 Query 3: Getting contract data for top supplier: {top_supplier}...")
-            
-            contract_sql = f"""
-            SELECT 
-                contractName,
-                -- Variance metrics
-                SUM(invoicePrice - expectedPrice) as variance_amount,
-                
-                -- Price metrics
-                AVG(invoicePrice) as avg_invoice_price,
-                AVG(catalogPrice) as avg_catalog_price,
-                AVG(expectedPrice) as avg_expected_price,
-                
-                -- Compliance and volume
-                AVG(CASE WHEN ABS(invoicePrice - expectedPrice) <= 0.01 THEN 100.0 ELSE 0.0 END) as compliance_rate,
-                SUM(quantity) as total_quantity,
-                
-                COUNT(*) as transaction_count
-                
-            FROM read_csv('procurement_compliance_v8.csv')
-            WHERE {full_filter} 
-            AND supplierName = '{top_supplier.replace("'", "''")}'
-            GROUP BY contractName
-            ORDER BY variance_amount DESC
-            """
+        if results is None:
+            # Stages 1 and 2 together from the drill tree for drill requests (or when it is already in memory)
+            results = run_drill_tree_stage(arc, canonical, get_breakout(parameters), cube, time_ranges, predicates, tolerance,
+                                           get_contract_cursor(parameters), get_breakout_cursor(parameters))
+            if results is not None:
+                if cube is None and histogram_note:
+                    deadline.degrade(histogram_note)
+                results.degradations = deadline.degradations
+            if results is not None and progressive:
+                logger.info("⚡ Progressive: emitting drill tree stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        if results is None:
+            # Stage 1: supplier + KPI queries
+            results = run_supplier_stage(arc, full_filter, cube, time_ranges, predicates, get_breakout(parameters), tolerance,
+                                         get_breakout_cursor(parameters))
+            if results is None and deadline.expired():
+                # Over budget with nothing cached - the sample still answers when it covers the request
+                results = run_approximate_stage(arc, parameters, cube, time_ranges, predicates, tolerance)
+                if results is not None:
+                    deadline.degrade("Exact queries ran over the time budget - showing the approximate answer from the stratified sample")
+            if results is None:
+                yield create_empty_output("The warehouse did not answer within the time budget" if deadline.expired() else "No data available")
+                return
+            results.degradations = deadline.degradations
             
-            logger.info(f"📝 SQL Query 3:\n{contract_sql}")
-            contract_result = arc.data.execute_sql_query(DATABASE_ID, contract_sql, 100)
+            if progressive:
+                logger.info("⚡ Progressive: emitting KPI stage")
+                yield build_skill_output(results, parameters, param_info)
             
-            if contract_result.success and contract_result.df is not None:
-                contract_df = contract_result.df
-                logger.info(f"✅ Query 3 complete: Got {len(contract_df)} contracts for {top_supplier}")
-            else:
-                logger.warning("Contract query failed")
-                contract_df = pd.DataFrame()
+            # Stage 2: contract drilldown
+            deadline.start_stage("contract")
+            if results.contract_df is None:
+                if deadline.skip_expired("Contract drilldown"):
+                    results.contract_df = pd.DataFrame()
+                else:
+                    run_contract_stage(arc, results, full_filter, cube, time_ranges, predicates, get_contract_cursor(parameters))
+            if progressive:
+                logger.info("⚡ Progressive: emitting contract drilldown stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        # Recovery pipeline (Page 3) - local indexed reads, no warehouse query
+        results.recovery = run_recovery_stage(results, canonical, parameters)
+        
+        # Stage 3: monthly compliance trend (approximate answers only use it when the cube can serve it)
+        deadline.start_stage("analytics")
+        if (cube is not None or not results.kpi_data.get('is_approximate')) and not deadline.skip_expired("Compliance trend"):
+            results.trend_df = fetch_monthly_trend(arc, full_filter, cube, time_ranges, predicates, results.tolerance)
+        if progressive:
+            logger.info("⚡ Progressive: emitting trend stage")
+            yield build_skill_output(results, parameters, param_info)
+        
+        # Stage 4: Pareto concentration (exact answers only)
+        if not results.kpi_data.get('is_approximate') and not deadline.skip_expired("Variance concentration"):
+            results.pareto_df, results.pareto_summary = run_pareto_stage(arc, full_filter, results.breakout)
+            if progressive:
+                logger.info("⚡ Progressive: emitting concentration stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        # Stage 5: sparse category × supplier cross-tab (exact answers only)
+        if not results.kpi_data.get('is_approximate') and not deadline.skip_expired("Category × supplier cross-tab"):
+            run_crosstab_stage(arc, results, full_filter, canonical, cube, time_ranges, predicates)
+            if progressive:
+                logger.info("⚡ Progressive: emitting cross-tab stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        # Stage 6: what-if savings scenarios (exact answers only)
+        if not results.kpi_data.get('is_approximate') and not deadline.skip_expired("Savings scenarios"):
+            run_scenario_stage(arc, results, full_filter, get_savings_scenarios(parameters))
+            if progressive:
+                logger.info("⚡ Progressive: emitting what-if stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        # Stage 7: period-over-period comparison (opt-in, needs two or more time periods)
+        comparison_periods = get_comparison_periods(parameters)
+        if len(comparison_periods) >= 2 and not results.kpi_data.get('is_approximate') and not deadline.skip_expired("Period comparison"):
+            run_comparison_stage(arc, results, full_filter, comparison_periods)
+            if progressive:
+                logger.info("⚡ Progressive: emitting comparison stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        # Stage 8: line-level anomaly detection (opt-in, scored in the warehouse - only flagged lines are fetched)
+        if get_anomaly_detection(parameters) and not deadline.skip_expired("Anomaly detection"):
+            run_anomaly_stage(arc, results, full_filter, get_export_mode(parameters) != 'none')
+            if progressive:
+                logger.info("⚡ Progressive: emitting anomaly stage")
+                yield build_skill_output(results, parameters, param_info)
+        
+        logger.info("🎉 SQL OPTIMIZED: All queries complete - generating visualizations...")
+        
+        # Stage 9: LLM narrative, streamed where the client supports it - from templates when
+        # requested, over budget or when the LLM is unavailable
+        deadline.start_stage("llm")
+        fact_frames = create_fact_frames(results, parameters)
+        
+        if get_narrative_mode(parameters) == 'template':
+            logger.info("📝 Template narrative mode: skipping the LLM")
+            generated_insights = build_template_narrative(results, fact_frames)
         else:
-            top_supplier = "N/A"
-            contract_df = pd.DataFrame()
+            insight_template = render_insight_prompt(parameters, fact_frames)
+            ar_utils = get_llm_client()
             
-        logger.info("🎉 SQL OPTIMIZED: All queries complete - generating visualizations...")
+            generated_insights = ""
+            last_emit = time.monotonic()
+            try:
+                for chunk in deadline.stream(stream_llm_response, ar_utils, insight_template):
+                    generated_insights += chunk
+                    if progressive and time.monotonic() - last_emit >= NARRATIVE_EMIT_INTERVAL:
+                        last_emit = time.monotonic()
+                        yield build_skill_output(results, parameters, param_info, generated_insights, fact_frames)
+                fallback = None
+            except DeadlineExceeded:
+                fallback = "Narrative generated from the figures without the LLM, which did not answer in time"
+            except Exception as e:
+                logger.warning(f"LLM unavailable, using the template narrative: {e}")
+                fallback = "Narrative generated from the figures because the LLM is unavailable"
+            if fallback is not None:
+                deadline.degrade(fallback)
+                fact_frames = create_fact_frames(results, parameters)
+                generated_insights = build_template_narrative(results, fact_frames)
+        logger.info(f"⏱️ Analysis finished in {deadline.elapsed():.2f}s of {deadline.seconds:g}s")
+        
+        logger.info("🎯 GENERATED INSIGHTS:")
+        logger.info(f"{generated_insights}")
         
-        # Generate visualizations using the query results
-        return generate_visualizations(supplier_df, contract_df, kpi_data, top_supplier, parameters, param_info)
+        yield build_skill_output(results, parameters, param_info, generated_insights, fact_frames, with_exports=True)
         
     except Exception as e:
         logger.error(f"SQL-optimized analysis failed: {e}")
         import traceback
         traceback.print_exc()
-        return create_empty_output(f"Analysis failed: {str(e)}")
+        yield create_empty_output(f"Analysis failed: {str(e)}")
+
+def stream_llm_response(ar_utils, prompt: str) -> Iterator[str]:
+    """Yield the narrative incrementally when the LLM client can stream, otherwise in one piece"""
+    stream = getattr(ar_utils, 'stream_llm_response', None)
+    streamed_any = False
+    if callable(stream):
+        try:
+            for chunk in stream(prompt):
+                if chunk:
+                    streamed_any = True
+                    yield chunk
+            return
+        except Exception as e:
+            if streamed_any:
+                raise
+            logger.warning(f"LLM streaming unavailable, falling back to a single response: {e}")
+    
+    yield ar_utils.get_llm_response(prompt) or ""
 
 def generate_visualizations(supplier_df: pd.DataFrame, contract_df: pd.DataFrame, 
                           kpi_data: dict, top_supplier: str, parameters: SkillInput, param_info: list) -> SkillOutput:
     """Generate visualizations from SQL query results"""
+    results = new_results(supplier_df, kpi_data, contract_df)
+    results.top_supplier = top_supplier
+    fact_frames = create_fact_frames(results, parameters)
+    insight_template = render_insight_prompt(parameters, fact_frames)
     
-    visualizations = []
-    export_data = {}
+    # Generate actual insights using LLM (like trend.py does)
+    ar_utils = get_llm_client()
+    generated_insights = ar_utils.get_llm_response(insight_template)
     
+    logger.info("🎯 GENERATED INSIGHTS:")
+    logger.info(f"{generated_insights}")
+    
+    return build_skill_output(results, parameters, param_info, generated_insights, fact_frames, with_exports=True)
+
+def create_fact_frames(results: SimpleNamespace, parameters: SkillInput) -> dict:
+    """Create all fact dataframes used by the prompts and exports"""
+    kpi_data = results.kpi_data
+    supplier_df = decode_names(results.supplier_df)
+    contract_df = decode_names(results.contract_df) if results.contract_df is not None else pd.DataFrame()
+    notes_df = create_notes_df(parameters)
+    if kpi_data.get('is_approximate'):
+        notes_df = pd.concat([notes_df, pd.DataFrame([
+            {'Note': f"Approximate results estimated from a stratified sample of {kpi_data['sample_rows']:,} transactions"},
+            {'Note': "Rerun with execution_mode 'exact' for exact totals"}
+        ])], ignore_index=True)
+    if results.degradations:
+        notes_df = pd.concat([notes_df, pd.DataFrame([{'Note': note} for note in results.degradations])], ignore_index=True)
+    if results.recovery is not None and results.recovery["messages"]:
+        notes_df = pd.concat([notes_df, pd.DataFrame([{'Note': note} for note in results.recovery["messages"]])], ignore_index=True)
+    next_breakout_cursor = (results.breakout_ranking or {}).get('next_cursor')
+    if next_breakout_cursor:
+        notes_df = pd.concat([notes_df, pd.DataFrame([
+            {'Note': f"More {breakout_label(results.breakout, plural=True).lower()} are ranked below these - pass breakout_cursor '{next_breakout_cursor}' for the next page"}
+        ])], ignore_index=True)
+    next_cursor = (results.contract_ranking or {}).get('next_cursor')
+    if next_cursor:
+        notes_df = pd.concat([notes_df, pd.DataFrame([
+            {'Note': f"More contracts of {results.top_supplier} are ranked below these - pass contract_cursor '{next_cursor}' for the next page"}
+        ])], ignore_index=True)
+    
+    fact_frames = {
+        "notes": notes_df,
+        "kpi": create_kpi_facts(kpi_data),
+        "supplier": create_supplier_facts(supplier_df, results.breakout),
+        "contract": create_contract_facts(contract_df, results.top_supplier, results.breakout, results.contract_ranking) if not contract_df.empty else pd.DataFrame(),
+        "trend": create_trend_facts(decode_names(results.trend_df)),
+        "concentration": create_concentration_facts(results.pareto_summary, results.breakout),
+        "crosstab": create_crosstab_facts(results.crosstab),
+        "scenario": create_scenario_facts(results.scenario_df),
+        "comparison": create_comparison_facts(results.comparison, results.breakout),
+        "anomaly": create_anomaly_facts(decode_names(results.anomaly_df), results.anomaly_summary)
+    }
     
-    # Prepare supplier data for display
+    # Log the dataframes for debugging
+    logger.info("📊 INSIGHTS DATAFRAMES:")
+    logger.info(f"  📈 KPI Facts: {len(fact_frames['kpi'])} rows")
+    logger.info(f"  🏢 Supplier Facts: {len(fact_frames['supplier'])} rows") 
+    logger.info(f"  📋 Contract Facts: {len(fact_frames['contract'])} rows")
+    logger.info(f"  📅 Trend Facts: {len(fact_frames['trend'])} rows")
+    logger.info(f"  📐 Concentration Facts: {len(fact_frames['concentration'])} rows")
+    logger.info(f"  🔥 Cross-Tab Facts: {len(fact_frames['crosstab'])} rows")
+    logger.info(f"  💡 Scenario Facts: {len(fact_frames['scenario'])} rows")
+    logger.info(f"  🔀 Comparison Facts: {len(fact_frames['comparison'])} rows")
+    logger.info(f"  🚨 Anomaly Facts: {len(fact_frames['anomaly'])} rows")
+    logger.info(f"  📝 Notes: {len(fact_frames['notes'])} rows")
+    
+    return fact_frames
+
+def get_insights_dfs(fact_frames: dict) -> list:
+    """Ordered list of fact dataframes handed to the LLM"""
+    return [fact_frames["notes"], fact_frames["kpi"], fact_frames["supplier"], fact_frames["contract"],
+            fact_frames["trend"], fact_frames["concentration"], fact_frames["crosstab"], fact_frames["scenario"],
+            fact_frames["comparison"], fact_frames["anomaly"]]
+
+def get_fact_groups(fact_frames: dict, breakout: str = DEFAULT_BREAKOUT) -> list[tuple[str, pd.DataFrame]]:
+    """Titled fact dataframes, most important first - the order facts are dropped in reverse under the token budget"""
+    return [("KPI Facts", fact_frames["kpi"]), ("Notes", fact_frames["notes"]),
+            (f"{breakout_label(breakout)} Facts", fact_frames["supplier"]), ("Contract Facts", fact_frames["contract"]),
+            ("Concentration Facts", fact_frames["concentration"]), ("Trend Facts", fact_frames["trend"]),
+            ("Comparison Facts", fact_frames["comparison"]), ("Scenario Facts", fact_frames["scenario"]),
+            ("Cross-Tab Facts", fact_frames["crosstab"]), ("Anomaly Facts", fact_frames["anomaly"])]
+
+def get_facts(fact_frames: dict, breakout: str = DEFAULT_BREAKOUT) -> str:
+    """Compact tabular encoding of the facts used for template rendering, within FACT_TOKEN_BUDGET"""
+    facts, tokens, _ = encode_facts(get_fact_groups(fact_frames, breakout))
+    logger.info(f"🧮 Facts encoded in ~{tokens} tokens")
+    return facts
+
+def render_insight_prompt(parameters: SkillInput, fact_frames: dict) -> str:
+    """Render the insight_prompt template with facts"""
+    facts = get_facts(fact_frames, get_breakout(parameters))
+    
+    # Log the actual facts being passed to templates (like dimension breakout)
+    logger.info("🎯 FACTS BEING PASSED TO LLM:")
+    logger.info(f"{facts}")
+    
+    insight_template = jinja2.Template(parameters.arguments.insight_prompt).render(facts=facts)
+    
+    # Debug: Log the rendered insight template to see what LLM gets
+    logger.info("🔍 RENDERED INSIGHT TEMPLATE:")
+    logger.info(f"{insight_template}")
+    return insight_template
+
+def build_supplier_table_df(supplier_df: pd.DataFrame, breakout: str = DEFAULT_BREAKOUT) -> pd.DataFrame:
+    """Top 5 breakout rows (suppliers by default) formatted for the Page 1 table"""
     supplier_display_data = []
     for _, row in supplier_df.head(5).iterrows():
         supplier_display_data.append([
-            len(supplier_display_data) + 1,  # Rank
-            row['supplierName'],
+            int(row['rank']) if 'rank' in row.index else len(supplier_display_data) + 1,  # Rank
+            row[breakout],
             format_currency_short(row['total_variance']),
             f"{float(row['variance_pct']):.1f}%" if pd.notna(row['variance_pct']) and row['variance_pct'] != '' else "0%",
             format_currency_short(row['avg_catalog_price']),
@@ -392,54 +1086,28 @@ def generate_visualizations(supplier_df: pd.DataFrame, contract_df: pd.DataFrame
             f"{float(row['compliance_rate']):.1f}%" if pd.notna(row['compliance_rate']) and row['compliance_rate'] != '' else "0%"
         ])
     
-    supplier_table_df = pd.DataFrame(supplier_display_data, columns=[
-        'Rank', 'Supplier', 'Variance $', 'Variance %', 
+    return pd.DataFrame(supplier_display_data, columns=[
+        'Rank', breakout_label(breakout), 'Variance $', 'Variance %', 
         'Catalog Price', 'Invoice Price', 'Expected Price', 'Price Compliance Rate'
     ])
-    
-    # Generate insights using LLM before creating page variables
-    # Create fact dataframes for insights
-    supplier_facts = create_supplier_facts(supplier_df)
-    kpi_facts = create_kpi_facts(kpi_data)
-    contract_facts = create_contract_facts(contract_df, top_supplier) if not contract_df.empty else pd.DataFrame()
-    notes_df = create_notes_df(parameters)
-    
-    # Combine all facts for the prompts
-    insights_dfs = [
-        notes_df,
-        kpi_facts, 
-        supplier_facts,
-        contract_facts if not contract_facts.empty else pd.DataFrame()
-    ]
-    
-    # Convert dataframes to facts format for template rendering
-    facts = []
-    for i_df in insights_dfs:
-        if not i_df.empty:
-            facts.append(i_df.to_dict(orient='records'))
-    
-    # Render the insight_prompt template with facts
-    insight_template = jinja2.Template(parameters.arguments.insight_prompt).render(facts=facts)
-    
-    # Generate actual insights using LLM (like trend.py does)
-    from ar_analytics import ArUtils
-    ar_utils = ArUtils()
-    generated_insights = ar_utils.get_llm_response(insight_template)
-    
-    logger.info("🎯 GENERATED INSIGHTS:")
-    logger.info(f"{generated_insights}")
-    print("🎯 GENERATED INSIGHTS:")
-    print(f"{generated_insights}")
-    print("=" * 80)
-    
-    # Page 1: Supplier Overview
-    page1_vars = {
-        "headline": "Price Variance Deep Dive",
-        "sub_headline": f"{format_currency_short(kpi_data['total_variance'])} Total Variance | {kpi_data['total_suppliers']} Suppliers",
+
+def build_page1_vars(supplier_df: pd.DataFrame, supplier_table_df: pd.DataFrame, kpi_data: dict, exec_summary: str,
+                     breakout: str = DEFAULT_BREAKOUT) -> dict:
+    """Layout variables for Page 1: Supplier Overview (or the requested breakout)"""
+    sub_headline = f"{format_currency_short(kpi_data['total_variance'])} Total Variance | {kpi_data['total_suppliers']} Suppliers"
+    approx_prefix = ""
+    if kpi_data.get('is_approximate'):
+        ci_low, ci_high = kpi_data['total_variance_ci']
+        sub_headline += f" | Approximate (95% CI {format_currency_short(ci_low)} - {format_currency_short(ci_high)})"
+        approx_prefix = "≈"
+    
+    return {
+        "headline": "Price Variance Deep Dive" if breakout == DEFAULT_BREAKOUT else f"All {breakout_label(breakout, plural=True)} Analysis",
+        "sub_headline": sub_headline,
         
         # KPIs
-        "kpi1_value": format_currency_short(kpi_data['total_variance']),
-        "kpi2_value": f"{kpi_data['compliance_rate']:.1f}%",
+        "kpi1_value": approx_prefix + format_currency_short(kpi_data['total_variance']),
+        "kpi2_value": f"{approx_prefix}{kpi_data['compliance_rate']:.1f}%",
         "kpi3_value": f"{int(kpi_data['total_suppliers'])}",
         "kpi4_value": f"{kpi_data['avg_variance_rate']:.1f}%", 
         "kpi5_value": format_currency_short(kpi_data['total_invoice_value']),
@@ -449,139 +1117,437 @@ def generate_visualizations(supplier_df: pd.DataFrame, contract_df: pd.DataFrame
             "name": "Price Variance",
             "data": [int(x) for x in supplier_df.head(5)['total_variance'].tolist()] if not supplier_df.empty else [0]
         }],
-        "chart_categories": supplier_df.head(5)['supplierName'].tolist() if not supplier_df.empty else ["No Data"],
-        "chart_title": "Top 5 Suppliers by Variance",
+        "chart_categories": supplier_df.head(5)[breakout].tolist() if not supplier_df.empty else ["No Data"],
+        "chart_title": f"Top 5 {breakout_label(breakout, plural=True)} by Variance",
         
         # Table data
         "data": supplier_table_df.values.tolist() if not supplier_table_df.empty else [],
         "col_defs": [{"name": col} for col in supplier_table_df.columns] if not supplier_table_df.empty else [],
         
         # Insights - populated with LLM-generated content
-        "exec_summary": generated_insights if generated_insights else "No insights generated."
+        "exec_summary": exec_summary
     }
+
+def build_contract_table_df(contract_df: pd.DataFrame) -> pd.DataFrame:
+    """Top 5 contract rows formatted for the Page 2 table"""
+    contract_display_data = []
+    for _, row in contract_df.head(5).iterrows():
+        contract_display_data.append([
+            row['contractName'],
+            format_currency_short(row['variance_amount']),
+            format_currency_short(row['avg_invoice_price']),
+            format_currency_short(row['avg_catalog_price']),
+            f"{float(row['compliance_rate']):.1f}%" if pd.notna(row['compliance_rate']) and row['compliance_rate'] != '' else "0%",
+            f"{float(row['total_quantity']):,.0f}" if pd.notna(row['total_quantity']) and row['total_quantity'] != '' else "0"
+        ])
     
-    rendered_page1 = wire_layout(json.loads(parameters.arguments.page_1_layout), page1_vars)
-    visualizations.append(SkillVisualization(title="Tab 1: Supplier Variance Overview", layout=rendered_page1))
-    export_data["Supplier Analysis"] = supplier_table_df
+    return pd.DataFrame(contract_display_data, columns=[
+        'Contract Name', 'Variance Amount', 'Invoice Price', 'Catalog Price', 'Price Compliance Rate', 'Quantity'
+    ])
+
+def build_page2_vars(contract_df: pd.DataFrame, contract_table_df: pd.DataFrame, top_supplier: str, exec_summary: str,
+                     contract_ranking: dict | None = None) -> dict:
+    """Layout variables for Page 2: Contract Deep Dive"""
+    # Totals over ALL contracts (exact server-side totals, not just the fetched page)
+    total_contracts, total_contract_variance, _ = contract_totals(contract_df, contract_ranking)
+    first_rank = int(contract_df.iloc[0]['rank']) if 'rank' in contract_df.columns and not contract_df.empty else 1
+    chart_scope = "Top 5 Contracts" if first_rank == 1 else f"Contracts #{first_rank}-{first_rank + len(contract_df.head(5)) - 1}"
+    
+    return {
+        "sub_headline": f"Contract-level variance analysis for {top_supplier}",
+        
+        # KPIs - ALL contracts 
+        "kpi1_value": format_currency_short(total_contract_variance),
+        "kpi2_value": f"{total_contracts}",
+        "kpi3_value": format_currency_short(contract_df.iloc[0]['variance_amount']) if not contract_df.empty else "$0",
+        
+        # Chart data - top 5 contracts
+        "chart_categories": contract_df.head(5)['contractName'].tolist(),
+        "chart_data_series": [{
+            "name": "Contract Variance",
+            "data": [int(x) for x in contract_df.head(5)['variance_amount'].tolist()]
+        }],
+        "chart_title": f"{chart_scope} by Variance - {top_supplier}",
+        
+        # Table data - top 5 contracts
+        "data": contract_table_df.values.tolist(),
+        "col_defs": [{"name": col} for col in contract_table_df.columns],
+        
+        "exec_summary": exec_summary
+    }
+
+def build_contract_totals_df(contract_df: pd.DataFrame, contract_ranking: dict) -> pd.DataFrame:
+    """Shown page, "all other contracts" and all-contracts rows from the exact ranking aggregates"""
+    transactions = contract_df['transaction_count'].sum()
+    rows = [{
+        'scope': "Contracts shown",
+        'contracts': len(contract_df),
+        'total_variance': contract_df['variance_amount'].sum(),
+        'compliance_rate': (contract_df['compliance_rate'] * contract_df['transaction_count']).sum() / transactions if transactions else None,
+        'transaction_count': transactions,
+        'total_quantity': contract_df['total_quantity'].sum()
+    }]
+    if contract_ranking.get('others') is not None:
+        rows.append(dict(contract_ranking['others'], scope="All other contracts", contracts=contract_ranking['others']['member_count']))
+    rows.append(dict(contract_ranking['totals'], scope="All contracts", contracts=contract_ranking['totals']['member_count']))
+    columns = ['scope', 'contracts', 'total_variance', 'compliance_rate', 'transaction_count', 'total_quantity']
+    return pd.DataFrame(rows).reindex(columns=columns)
+
+def format_month_key(month_key: int) -> str:
+    """202401 -> 'Jan 2024'"""
+    return pd.Timestamp(year=int(month_key) // 100, month=int(month_key) % 100, day=1).strftime('%b %Y')
+
+def summarize_trend(trend_df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse a month × category trend into one row per month"""
+    monthly = trend_df.groupby('month_key', sort=True)[
+        ['variance_sum', 'compliant_count', 'transaction_count']
+    ].sum().reset_index()
+    monthly['compliance_rate'] = monthly['compliant_count'] * 100.0 / monthly['transaction_count'].where(monthly['transaction_count'] > 0)
+    return monthly
+
+def build_trend_table_df(monthly_df: pd.DataFrame) -> pd.DataFrame:
+    """Month rows formatted for the Page 4 table"""
+    trend_display_data = []
+    for _, row in monthly_df.iterrows():
+        trend_display_data.append([
+            format_month_key(row['month_key']),
+            f"{float(row['compliance_rate']):.1f}%" if pd.notna(row['compliance_rate']) else "0%",
+            format_currency_short(row['variance_sum']),
+            f"{int(row['transaction_count']):,}"
+        ])
     
-    # Page 2: Contract Deep Dive
-    if not contract_df.empty:
-        contract_display_data = []
-        for _, row in contract_df.head(5).iterrows():
-            contract_display_data.append([
-                row['contractName'],
-                format_currency_short(row['variance_amount']),
-                format_currency_short(row['avg_invoice_price']),
-                format_currency_short(row['avg_catalog_price']),
-                f"{float(row['compliance_rate']):.1f}%" if pd.notna(row['compliance_rate']) and row['compliance_rate'] != '' else "0%",
-                f"{float(row['total_quantity']):,.0f}" if pd.notna(row['total_quantity']) and row['total_quantity'] != '' else "0"
-            ])
-        
-        contract_table_df = pd.DataFrame(contract_display_data, columns=[
-            'Contract Name', 'Variance Amount', 'Invoice Price', 'Catalog Price', 'Price Compliance Rate', 'Quantity'
+    return pd.DataFrame(trend_display_data, columns=['Month', 'Price Compliance Rate', 'Variance $', 'Transactions'])
+
+def build_page4_vars(trend_df: pd.DataFrame, monthly_df: pd.DataFrame, trend_table_df: pd.DataFrame, exec_summary: str) -> dict:
+    """Layout variables for Page 4: Compliance Trend"""
+    month_keys = monthly_df['month_key'].tolist()
+    first, latest = monthly_df.iloc[0], monthly_df.iloc[-1]
+    change = latest['compliance_rate'] - first['compliance_rate']
+    
+    # One line per top category by volume, plus the overall rate
+    top_categories = trend_df.groupby('category')['transaction_count'].sum().nlargest(TREND_MAX_SERIES).index.tolist()
+    series = [{
+        "name": "All Categories",
+        "data": [round(float(x), 1) if pd.notna(x) else None for x in monthly_df['compliance_rate']],
+        "color": "#0f766e",
+        "lineWidth": 3
+    }]
+    for category in top_categories:
+        rates = trend_df[trend_df['category'] == category].set_index('month_key')['compliance_rate'].reindex(month_keys)
+        series.append({
+            "name": str(category),
+            "data": [round(float(x), 1) if pd.notna(x) else None for x in rates],
+            "dashStyle": "ShortDash"
+        })
+    
+    return {
+        "sub_headline": f"Monthly price compliance across {len(month_keys)} months ({format_month_key(month_keys[0])} - {format_month_key(month_keys[-1])})",
+        
+        "kpi1_value": f"{latest['compliance_rate']:.1f}%",
+        "kpi2_value": f"{change:+.1f} pts",
+        "kpi3_value": format_currency_short(latest['variance_sum']),
+        
+        "chart_categories": [format_month_key(k) for k in month_keys],
+        "chart_data_series": series,
+        "chart_title": "Monthly Price Compliance Rate by Category",
+        
+        "data": trend_table_df.values.tolist(),
+        "col_defs": [{"name": col} for col in trend_table_df.columns],
+        
+        "exec_summary": exec_summary
+    }
+
+def build_pareto_table_df(pareto_df: pd.DataFrame, breakout: str = DEFAULT_BREAKOUT) -> pd.DataFrame:
+    """Curve points formatted for the Page 5 table"""
+    pareto_display_data = []
+    for _, row in pareto_df.iterrows():
+        pareto_display_data.append([
+            f"{int(row['member_rank'])}" + (f" ({PARETO_THRESHOLD}% reached)" if row['is_breakpoint'] else ""),
+            f"{row['member_share']:.1f}%",
+            format_currency_short(row['cumulative_variance']),
+            f"{row['cumulative_share']:.1f}%"
         ])
+    
+    return pd.DataFrame(pareto_display_data, columns=[
+        'Rank', f"Share of {breakout_label(breakout, plural=True)}", 'Cumulative Variance $', 'Cumulative Share'
+    ])
+
+def build_page5_vars(pareto_df: pd.DataFrame, pareto_summary: dict, pareto_table_df: pd.DataFrame,
+                     breakout: str, exec_summary: str) -> dict:
+    """Layout variables for Page 5: Variance Concentration"""
+    plural = breakout_label(breakout, plural=True)
+    
+    return {
+        "sub_headline": f"Cumulative share of positive variance across {pareto_summary['member_count']:,} {plural.lower()}",
         
-        # Calculate total contract variance for ALL contracts (not just top 5)
-        total_contract_variance = contract_df['variance_amount'].sum()
-        total_contracts = len(contract_df)
+        "kpi1_value": f"Top {pareto_summary['breakpoint_rank']:,} of {pareto_summary['member_count']:,}",
+        "kpi2_value": f"{pareto_summary['top10_share']:.1f}%",
+        "kpi3_value": f"{pareto_summary['top20_share']:.1f}%",
         
-        page2_vars = {
-            "sub_headline": f"Contract-level variance analysis for {top_supplier}",
-            
-            # KPIs - ALL contracts 
-            "kpi1_value": format_currency_short(total_contract_variance),
-            "kpi2_value": f"{total_contracts}",
-            "kpi3_value": format_currency_short(contract_df.iloc[0]['variance_amount']) if not contract_df.empty else "$0",
-            
-            # Chart data - top 5 contracts
-            "chart_categories": contract_df.head(5)['contractName'].tolist(),
-            "chart_data_series": [{
-                "name": "Contract Variance",
-                "data": [int(x) for x in contract_df.head(5)['variance_amount'].tolist()]
-            }],
-            "chart_title": f"Top 5 Contracts by Variance - {top_supplier}",
-            
-            # Table data - top 5 contracts
-            "data": contract_table_df.values.tolist(),
-            "col_defs": [{"name": col} for col in contract_table_df.columns],
-            
-            "exec_summary": generated_insights if generated_insights else "No insights generated."
-        }
+        "chart_categories": [str(int(rank)) for rank in pareto_df['member_rank']],
+        "chart_data_series": [{
+            "name": "Cumulative Share",
+            "data": [round(float(x), 1) for x in pareto_df['cumulative_share']],
+            "color": "#7c3aed",
+            "lineWidth": 3
+        }, {
+            "name": f"{PARETO_THRESHOLD}% Line",
+            "data": [PARETO_THRESHOLD] * len(pareto_df),
+            "dashStyle": "ShortDash",
+            "marker": {"enabled": False}
+        }],
+        "chart_title": f"Cumulative Share of Variance by {breakout_label(breakout)} Rank",
         
-        rendered_page2 = wire_layout(json.loads(parameters.arguments.page_2_layout), page2_vars)
-        visualizations.append(SkillVisualization(title="Tab 2: Contract Deep Dive", layout=rendered_page2))
-        export_data["Contract Analysis"] = contract_table_df
+        "data": pareto_table_df.values.tolist(),
+        "col_defs": [{"name": col} for col in pareto_table_df.columns],
+        
+        "exec_summary": exec_summary
+    }
+
+def label_comparison_columns(compared_df: pd.DataFrame, labels: list[str]) -> pd.DataFrame:
+    """Period-index column suffixes replaced by the period labels, e.g. variance_0 -> 'q2 2025 variance'"""
+    columns = {}
+    for index, label in enumerate(labels):
+        for metric in ('variance', 'transactions', 'compliance', 'rank'):
+            columns[f"{metric}_{index}"] = f"{label} {metric}"
+    return compared_df.rename(columns=columns)
+
+def build_comparison_table_df(members_df: pd.DataFrame, labels: list[str], breakout: str) -> pd.DataFrame:
+    """Top breakout members formatted for the Page 6 table"""
+    last = len(labels) - 1
+    comparison_display_data = []
+    for _, row in members_df.head(COMPARISON_CHART_MEMBERS).iterrows():
+        rank_change = row['rank_change']
+        comparison_display_data.append(
+            [row[breakout]]
+            + [format_currency_short(row[f'variance_{index}']) for index in range(len(labels))]
+            + [
+                ("+" if row['variance_delta'] >= 0 else "-") + format_currency_short(abs(row['variance_delta'])),
+                f"{row['compliance_delta_pts']:+.1f} pts" if pd.notna(row['compliance_delta_pts']) else "n/a",
+                f"#{row['rank_0']} → #{row[f'rank_{last}']}" if pd.notna(rank_change) else "n/a"
+            ]
+        )
+    
+    return pd.DataFrame(comparison_display_data, columns=(
+        [breakout_label(breakout)] + [f"{label} Variance" for label in labels] + ['Change', 'Compliance Change', 'Rank']
+    ))
+
+def build_page6_vars(comparison: dict, comparison_table_df: pd.DataFrame, breakout: str, exec_summary: str) -> dict:
+    """Layout variables for Page 6: Period Comparison"""
+    labels, members, totals = comparison['labels'], comparison['members'], comparison['totals']
+    first, last = totals.iloc[0], totals.iloc[-1]
+    variance_change = last['total_variance'] - first['total_variance']
+    compliance_change = (last['compliance_rate'] - first['compliance_rate']
+                         if pd.notna(last['compliance_rate']) and pd.notna(first['compliance_rate']) else None)
+    
+    movers = members.dropna(subset=['variance_delta'])
+    mover = movers.loc[movers['variance_delta'].abs().idxmax()] if not movers.empty else None
+    chart_members = members.head(COMPARISON_CHART_MEMBERS)
+    
+    return {
+        "sub_headline": f"{' vs '.join(labels)} by {breakout_label(breakout).lower()}",
+        
+        "kpi1_value": ("+" if variance_change >= 0 else "-") + format_currency_short(abs(variance_change)),
+        "kpi2_value": f"{compliance_change:+.1f} pts" if compliance_change is not None else "n/a",
+        "kpi3_value": f"{mover[breakout]}" if mover is not None else "n/a",
+        
+        "chart_categories": [str(member) for member in chart_members[breakout]],
+        "chart_data_series": [{
+            "name": label,
+            "data": [round(float(x), 2) for x in chart_members[f'variance_{index}']]
+        } for index, label in enumerate(labels)],
+        "chart_title": f"Variance by Period - Top {len(chart_members)} {breakout_label(breakout, plural=True)}",
+        
+        "data": comparison_table_df.values.tolist(),
+        "col_defs": [{"name": col} for col in comparison_table_df.columns],
+        
+        "exec_summary": exec_summary
+    }
+
+def build_crosstab_table_df(top_pairs_df: pd.DataFrame) -> pd.DataFrame:
+    """Top category × supplier pairs formatted for the Page 7 table"""
+    crosstab_display_data = []
+    for _, row in top_pairs_df.iterrows():
+        crosstab_display_data.append([
+            row['category'],
+            row['supplierName'],
+            format_currency_short(row['total_variance']),
+            f"{row['category_share']:.1f}%" if pd.notna(row['category_share']) else "n/a",
+            f"{row['compliance_rate']:.1f}%" if pd.notna(row['compliance_rate']) else "n/a",
+            f"{int(row['transaction_count']):,}"
+        ])
     
-    # Page 3: Recovery Pipeline (mockup)
-    page3_vars = {
+    return pd.DataFrame(crosstab_display_data, columns=[
+        'Category', 'Supplier', 'Variance $', 'Share of Category', 'Compliance Rate', 'Transactions'
+    ])
+
+def build_page7_vars(matrix: CategorySupplierMatrix, top_pairs_df: pd.DataFrame, crosstab_table_df: pd.DataFrame,
+                     exec_summary: str) -> dict:
+    """Layout variables for Page 7: Category × Supplier Heatmap"""
+    summary = summarize_crosstab(matrix)
+    grid = matrix.downsample()
+    top = top_pairs_df.iloc[0]
+    folded = len(grid['row_names']) < summary['categories'] or len(grid['column_names']) < summary['suppliers']
+    
+    heatmap_data = []
+    for y, row in enumerate(grid['variance']):
+        for x, value in enumerate(row):
+            if pd.notna(value):
+                heatmap_data.append([x, y, round(float(value), 2)])
+    
+    return {
+        "sub_headline": f"{summary['pairs']:,} active pairs across {summary['categories']:,} categories and {summary['suppliers']:,} suppliers",
+        
+        "kpi1_value": f"{summary['pairs']:,} ({summary['density_pct']:.1f}%)",
+        "kpi2_value": f"{top['category']} / {top['supplierName']}",
+        "kpi3_value": f"{summary['top10_share']:.1f}%",
+        
+        "chart_categories": grid['column_names'],
+        "chart_y_categories": grid['row_names'],
+        "chart_data_series": [{
+            "name": "Variance ($)",
+            "type": "heatmap",
+            "borderWidth": 1,
+            "data": heatmap_data
+        }],
+        "chart_title": "Variance by Category and Supplier" + (" - Smaller Members Grouped" if folded else ""),
+        
+        "data": crosstab_table_df.values.tolist(),
+        "col_defs": [{"name": col} for col in crosstab_table_df.columns],
+        
+        "exec_summary": exec_summary
+    }
+
+def build_page3_vars(recovery: dict) -> dict:
+    """Layout variables for Page 3: Recovery Pipeline, read from the recovery store"""
+    summary, timeline, items = recovery["summary"], recovery["timeline"], recovery["items"]
+    
+    table_data = []
+    for _, row in items.iterrows():
+        resolution = pd.Timestamp(row['expected_resolution']).strftime("%b %d, %Y") if row['expected_resolution'] else "Not set"
+        status = RECOVERY_STATUS_LABELS.get(row['status'], row['status'])
+        if row['recovered_amount'] > 0:
+            status += f", ${row['recovered_amount']:,.0f} recovered"
+        table_data.append([f"#{row['item_id']} {row['title']}", row['supplier'], f"${row['identified_amount']:,.0f}", status, resolution,
+                           row['owner'] or "Unassigned"])
+    
+    if summary['open_items']:
+        exec_summary = (
+            "## Recovery Pipeline Status\n\n"
+            f"**Recovery Potential**: ${summary['recovery_potential']:,.0f} open across {summary['open_items']} items\n"
+            f"**In Progress**: ${summary['in_progress']:,.0f} actively being processed\n"
+            f"**Recovered This Month**: ${summary['recovered_this_month']:,.0f} successfully recovered"
+        )
+    else:
+        exec_summary = ("## Recovery Pipeline Status\n\nNo open recovery items are tracked yet - the recovery action "
+                        "'open items' opens them for the top supplier's leaking contracts.")
+    
+    return {
         "headline": "Recovery Pipeline",
         "sub_headline": "Price Variance Recovery Tracking & Opportunities",
-        "kpi1_value": "$156,400",
-        "kpi2_value": "$23,100", 
-        "kpi3_value": "$8,750",
-        "kpi4_value": "15",
-        "chart_title": "Recovery Timeline & Progress",
-        "chart_categories": ["Week 1", "Week 2", "Week 3", "Week 4", "Week 5+"],
+        "kpi1_value": f"${summary['recovery_potential']:,.0f}",
+        "kpi2_value": f"${summary['in_progress']:,.0f}",
+        "kpi3_value": f"${summary['recovered_this_month']:,.0f}",
+        "kpi4_value": str(summary['open_items']),
+        "chart_title": f"Recovery Timeline - Last {len(timeline)} Weeks",
+        "chart_categories": [pd.Timestamp(week).strftime("%b %d") for week in timeline['week_start']],
         "chart_data_series": [
-            {"name": "Volume Price Break - 90%", "data": [5, 10, 15, 25, 30], "color": "#059669"},
-            {"name": "Logistics Path - 75%", "data": [2, 8, 18, 28, 35], "color": "#f59e0b", "dashStyle": "Dash"},
-            {"name": "Alt Source - 10%", "data": [0, 1, 2, 3, 8], "color": "#dc2626", "dashStyle": "Dot"}
-        ],
-        "data": [
-            ["Volume discount recalculation", "Gamma Supply", "$70,500", "Supplier acknowledged, credit processing", "Aug 15, 2024", "Sarah Johnson"],
-            ["Contract amendment pricing update", "Beta Industries", "$45,200", "System update scheduled", "Aug 5, 2024", "Mike Chen"],
-            ["Pricing tier correction", "Alpha Manufacturing", "$34,650", "Under supplier review", "Aug 10, 2024", "Lisa Rodriguez"]
+            {"name": "Identified", "data": [round(x / 1000, 1) for x in timeline['identified_amount']], "color": "#f59e0b", "dashStyle": "Dash"},
+            {"name": "Recovered", "data": [round(x / 1000, 1) for x in timeline['recovered_amount']], "color": "#059669"}
         ],
+        "data": table_data,
         "col_defs": [
             {"name": "Recovery Item"}, {"name": "Supplier"}, {"name": "Variance Amount"},
             {"name": "Recovery Status"}, {"name": "Expected Resolution"}, {"name": "Owner"}
         ],
-        "exec_summary": "## Recovery Pipeline Status\n\n**Recovery Potential**: $156,400 total opportunity identified\n**In Progress**: $23,100 actively being processed\n**Recovered This Month**: $8,750 successfully recovered"
+        "exec_summary": exec_summary
     }
+
+def build_skill_output(results: SimpleNamespace, parameters: SkillInput, param_info: list,
+                       generated_insights: str | None = None, fact_frames: dict | None = None,
+                       with_exports: bool = False) -> SkillOutput:
+    """
+    Assemble a SkillOutput from whatever stages have completed.
     
-    rendered_page3 = wire_layout(json.loads(parameters.arguments.page_3_layout), page3_vars)
-    visualizations.append(SkillVisualization(title="Tab 3: Recovery Pipeline", layout=rendered_page3))
+    results.contract_df=None means the drilldown has not finished yet (Page 2 is left out)
+    and generated_insights=None means the narrative is still pending. Export data is only
+    built with with_exports (the final output) and when the user did not turn exports off.
+    """
+    # Names stay dictionary-encoded through the stages and are decoded here for rendering
+    supplier_df = decode_names(results.supplier_df)
+    contract_df = decode_names(results.contract_df)
+    trend_df = decode_names(results.trend_df)
+    anomaly_df = decode_names(results.anomaly_df)
+    kpi_data = results.kpi_data
+    top_supplier = results.top_supplier
+    breakout = results.breakout
     
-    # Create fact dataframes for insights
-    supplier_facts = create_supplier_facts(supplier_df)
-    kpi_facts = create_kpi_facts(kpi_data)
-    contract_facts = create_contract_facts(contract_df, top_supplier) if not contract_df.empty else pd.DataFrame()
-    notes_df = create_notes_df(parameters)
+    visualizations = []
     
-    # Log the dataframes for debugging
-    logger.info("📊 INSIGHTS DATAFRAMES:")
-    logger.info(f"  📈 KPI Facts: {len(kpi_facts)} rows")
-    logger.info(f"  🏢 Supplier Facts: {len(supplier_facts)} rows") 
-    logger.info(f"  📋 Contract Facts: {len(contract_facts)} rows")
-    logger.info(f"  📝 Notes: {len(notes_df)} rows")
-    
-    # Also print for local testing
-    print("📊 INSIGHTS DATAFRAMES:")
-    print(f"  📈 KPI Facts: {len(kpi_facts)} rows")
-    print(f"  🏢 Supplier Facts: {len(supplier_facts)} rows") 
-    print(f"  📋 Contract Facts: {len(contract_facts)} rows")
-    print(f"  📝 Notes: {len(notes_df)} rows")
-    
-    if not contract_facts.empty:
-        logger.info("🔍 Top 3 Contract Facts:")
-        for idx, row in contract_facts.head(3).iterrows():
-            logger.info(f"    {idx+1}. {row['contract']}: {row['variance_amount']} variance, {row['compliance_rate']} compliance")
-    
-    if not supplier_facts.empty:
-        logger.info("🔍 Top 3 Supplier Facts:")
-        for idx, row in supplier_facts.head(3).iterrows():
-            logger.info(f"    {idx+1}. {row['supplier']}: {row['variance_amount']} variance, {row['variance_pct']} rate")
-    
-    # Combine all facts for the prompts
-    all_facts = pd.concat([
-        kpi_facts,
-        supplier_facts,
-        contract_facts if not contract_facts.empty else pd.DataFrame()
-    ], ignore_index=True)
+    if generated_insights is None:
+        exec_summary = PENDING_INSIGHTS
+    else:
+        exec_summary = generated_insights if generated_insights else "No insights generated."
+    
+    # Page 1: Supplier Overview
+    supplier_table_df = build_supplier_table_df(supplier_df, breakout)
+    page1_vars = build_page1_vars(supplier_df, supplier_table_df, kpi_data, exec_summary, breakout)
+    rendered_page1 = wire_layout(json.loads(parameters.arguments.page_1_layout), page1_vars)
+    visualizations.append(SkillVisualization(title=f"Tab 1: {breakout_label(breakout)} Variance Overview", layout=rendered_page1))
+    
+    # Page 2: Contract Deep Dive
+    if contract_df is not None and not contract_df.empty:
+        contract_table_df = build_contract_table_df(contract_df)
+        page2_vars = build_page2_vars(contract_df, contract_table_df, top_supplier, exec_summary, results.contract_ranking)
+        rendered_page2 = wire_layout(json.loads(parameters.arguments.page_2_layout), page2_vars)
+        visualizations.append(SkillVisualization(title="Tab 2: Contract Deep Dive", layout=rendered_page2))
+    
+    # Page 3: Recovery Pipeline
+    if results.recovery is not None:
+        rendered_page3 = wire_layout(json.loads(parameters.arguments.page_3_layout), build_page3_vars(results.recovery))
+        visualizations.append(SkillVisualization(title="Tab 3: Recovery Pipeline", layout=rendered_page3))
+    
+    # Page 4: Compliance Trend
+    monthly_df = summarize_trend(trend_df) if trend_df is not None and not trend_df.empty else pd.DataFrame()
+    if not monthly_df.empty:
+        trend_table_df = build_trend_table_df(monthly_df)
+        page4_vars = build_page4_vars(trend_df, monthly_df, trend_table_df, exec_summary)
+        rendered_page4 = wire_layout(json.loads(parameters.arguments.page_4_layout), page4_vars)
+        visualizations.append(SkillVisualization(title="Tab 4: Compliance Trend", layout=rendered_page4))
+    
+    # Page 5: Variance Concentration
+    pareto_df = results.pareto_df
+    if pareto_df is not None and not pareto_df.empty:
+        pareto_table_df = build_pareto_table_df(pareto_df, breakout)
+        page5_vars = build_page5_vars(pareto_df, results.pareto_summary, pareto_table_df, breakout, exec_summary)
+        rendered_page5 = wire_layout(json.loads(parameters.arguments.page_5_layout), page5_vars)
+        visualizations.append(SkillVisualization(title="Tab 5: Variance Concentration", layout=rendered_page5))
+    
+    # Page 6: Period Comparison
+    comparison = results.comparison
+    if comparison is not None:
+        comparison = dict(comparison, members=decode_names(comparison['members']), contracts=decode_names(comparison['contracts']))
+        comparison_table_df = build_comparison_table_df(comparison['members'], comparison['labels'], breakout)
+        page6_vars = build_page6_vars(comparison, comparison_table_df, breakout, exec_summary)
+        rendered_page6 = wire_layout(json.loads(parameters.arguments.page_6_layout), page6_vars)
+        visualizations.append(SkillVisualization(title="Tab 6: Period Comparison", layout=rendered_page6))
+    
+    # Page 7: Category × Supplier Heatmap
+    top_pairs_df = pd.DataFrame()
+    if results.crosstab is not None:
+        top_pairs_df = decode_names(results.crosstab.top_cells(CROSSTAB_TABLE_PAIRS))
+        crosstab_table_df = build_crosstab_table_df(top_pairs_df)
+        page7_vars = build_page7_vars(results.crosstab, top_pairs_df, crosstab_table_df, exec_summary)
+        rendered_page7 = wire_layout(json.loads(parameters.arguments.page_7_layout), page7_vars)
+        visualizations.append(SkillVisualization(title="Tab 7: Category × Supplier Heatmap", layout=rendered_page7))
+    
+    if fact_frames is None:
+        fact_frames = create_fact_frames(results, parameters)
     
     # Generate final prompt
-    top_opportunities = generate_top_opportunities(supplier_df)
+    top_opportunities = generate_top_opportunities(supplier_df, breakout, results.member_savings)
     final_prompt = FINAL_PROMPT_TEMPLATE.format(
+        top_label=breakout_label(breakout).lower(),
         total_variance=format_currency_short(kpi_data['total_variance']),
         avg_variance_rate=kpi_data['avg_variance_rate'],
         total_transactions=kpi_data['total_transactions'],
@@ -594,67 +1560,18 @@ def generate_visualizations(supplier_df: pd.DataFrame, contract_df: pd.DataFrame
     # Use the param_info already generated by build_other_filters()
     # No need to regenerate since it's already complete
     
-    # Prepare export data
-    export_data = {
-        "Supplier Variance Analysis": supplier_df,
-        "Contract Analysis": contract_df if 'contract_df' in locals() else pd.DataFrame(),
-        "Overall KPIs": pd.DataFrame([kpi_data]),
-        "Supplier Facts": supplier_facts,
-        "KPI Facts": kpi_facts,
-        "Contract Facts": contract_facts if not contract_facts.empty else pd.DataFrame(),
-        "Notes": notes_df
-    }
-    
-    # Prepare insights dataframes list (these are what the LLM uses)
-    insights_dfs = [
-        notes_df,
-        kpi_facts, 
-        supplier_facts,
-        contract_facts if not contract_facts.empty else pd.DataFrame()
-    ]
-    
-    # Convert dataframes to facts format for template rendering
-    facts = []
-    for i_df in insights_dfs:
-        if not i_df.empty:
-            facts.append(i_df.to_dict(orient='records'))
-    
-    # Log the actual facts being passed to templates (like dimension breakout)
-    logger.info("🎯 FACTS BEING PASSED TO LLM:")
-    for i, fact_group in enumerate(facts):
-        logger.info(f"  Group {i+1}: {fact_group}")
-    
-    # Also log individual dataframes in full detail
-    logger.info("📋 FULL DATAFRAME CONTENTS:")
-    logger.info(f"  KPI Facts DF: {kpi_facts.to_dict(orient='records')}")
-    logger.info(f"  Supplier Facts DF: {supplier_facts.to_dict(orient='records')}")
-    if not contract_facts.empty:
-        logger.info(f"  Contract Facts DF: {contract_facts.to_dict(orient='records')}")
-    logger.info(f"  Notes DF: {notes_df.to_dict(orient='records')}")
+    # Export data is built once, for the final output - long frames are streamed to files
+    export_data = {}
+    if with_exports and get_export_mode(parameters) != 'none':
+        export_data = prepare_export_data(build_export_frames(results, fact_frames), results.export_files)
     
     # Render the insight_prompt and max_prompt templates with facts
+    facts = get_facts(fact_frames, breakout)
     insight_template = jinja2.Template(parameters.arguments.insight_prompt).render(facts=facts)
-    max_response_prompt = jinja2.Template(parameters.arguments.max_prompt).render(facts=facts)
-    
-    # Debug: Log the rendered insight template to see what LLM gets
-    logger.info("🔍 RENDERED INSIGHT TEMPLATE:")
-    logger.info(f"{insight_template}")
-    
-    # Generate actual insights using LLM (like trend.py does)
-    from ar_analytics import ArUtils
-    ar_utils = ArUtils()
-    generated_insights = ar_utils.get_llm_response(insight_template)
-    
-    logger.info("🎯 GENERATED INSIGHTS:")
-    logger.info(f"{generated_insights}")
-    
-    # Debug: Also print for local testing
-    print("🔍 RENDERED INSIGHT TEMPLATE:")
-    print(f"{insight_template}")
-    print("=" * 80)
-    print("🎯 GENERATED INSIGHTS:")
-    print(f"{generated_insights}")
-    print("=" * 80)
+    if get_narrative_mode(parameters) == 'template':
+        max_response_prompt = generate_template_response(kpi_data, supplier_df, top_supplier, breakout)
+    else:
+        max_response_prompt = jinja2.Template(parameters.arguments.max_prompt).render(facts=facts)
     
     return SkillOutput(
         final_prompt=final_prompt,
@@ -662,42 +1579,110 @@ def generate_visualizations(supplier_df: pd.DataFrame, contract_df: pd.DataFrame
         visualizations=visualizations,
         parameter_display_descriptions=param_info,
         export_data=[ExportData(name=name, data=df) for name, df in export_data.items()],
-        insights_dfs=insights_dfs,
+        insights_dfs=get_insights_dfs(fact_frames),
         insight_prompt=insight_template,
         max_response_prompt=max_response_prompt
     )
 
-def create_supplier_facts(supplier_df: pd.DataFrame) -> pd.DataFrame:
-    """Create supplier facts dataframe for insights"""
+def build_export_frames(results: SimpleNamespace, fact_frames: dict) -> dict:
+    """Export frames by name for the completed stages"""
+    breakout = results.breakout
+    supplier_df = decode_names(results.supplier_df)
+    contract_df = decode_names(results.contract_df)
+    trend_df = decode_names(results.trend_df)
+    anomaly_df = decode_names(results.anomaly_df)
+    pareto_df = results.pareto_df
+    comparison = results.comparison
+    if comparison is not None:
+        comparison = dict(comparison, members=decode_names(comparison['members']), contracts=decode_names(comparison['contracts']))
+    top_pairs_df = decode_names(results.crosstab.top_cells(CROSSTAB_TABLE_PAIRS)) if results.crosstab is not None else pd.DataFrame()
+    
+    export_data = {
+        f"{breakout_label(breakout)} Variance Analysis": supplier_df,
+        "Contract Analysis": contract_df if contract_df is not None else pd.DataFrame(),
+        "Overall KPIs": pd.DataFrame([results.kpi_data]),
+        f"{breakout_label(breakout)} Facts": fact_frames["supplier"],
+        "KPI Facts": fact_frames["kpi"],
+        "Contract Facts": fact_frames["contract"],
+        "Notes": fact_frames["notes"]
+    }
+    if results.contract_ranking is not None and results.contract_ranking.get('totals') is not None:
+        export_data["Contract Totals"] = build_contract_totals_df(contract_df, results.contract_ranking)
+    if trend_df is not None and not trend_df.empty:
+        export_data["Monthly Trend"] = trend_df
+        export_data["Trend Facts"] = fact_frames["trend"]
+    if pareto_df is not None and not pareto_df.empty:
+        export_data["Pareto Curve"] = pareto_df
+        export_data["Concentration Facts"] = fact_frames["concentration"]
+    if not top_pairs_df.empty:
+        export_data["Category x Supplier Pairs"] = top_pairs_df
+        export_data["Category Totals"] = decode_names(results.crosstab.marginals(0))
+        export_data["Cross-Tab Facts"] = fact_frames["crosstab"]
+    if results.scenario_df is not None and not results.scenario_df.empty:
+        export_data["Savings Scenarios"] = results.scenario_df
+        export_data["Scenario Facts"] = fact_frames["scenario"]
+    if comparison is not None:
+        export_data[f"Period Comparison - {breakout_label(breakout, plural=True)}"] = label_comparison_columns(comparison['members'], comparison['labels'])
+        if not comparison['contracts'].empty:
+            export_data["Period Comparison - Contracts"] = label_comparison_columns(comparison['contracts'], comparison['labels'])
+        export_data["Period Totals"] = comparison['totals']
+        export_data["Comparison Facts"] = fact_frames["comparison"]
+    if anomaly_df is not None and not anomaly_df.empty:
+        export_data["Flagged Transactions"] = anomaly_df
+        export_data["Anomaly Facts"] = fact_frames["anomaly"]
+    if results.recovery is not None and not results.recovery["items"].empty:
+        export_data["Open Recovery Items"] = results.recovery["items"]
+        export_data["Recovery Timeline"] = results.recovery["timeline"]
+    return export_data
+
+def create_supplier_facts(supplier_df: pd.DataFrame, breakout: str = DEFAULT_BREAKOUT) -> pd.DataFrame:
+    """Create breakout (supplier by default) facts dataframe for insights"""
     facts = []
+    member_key = breakout_fact_key(breakout)
     
     for idx, row in supplier_df.head(10).iterrows():
         facts.append({
-            'fact_type': 'supplier_variance',
-            'supplier': row['supplierName'],
+            'fact_type': f'{member_key}_variance',
+            member_key: row[breakout],
             'variance_amount': format_currency_short(row['total_variance']),
             'variance_pct': f"{row['variance_pct']:.1f}%",
             'compliance_rate': f"{row['compliance_rate']:.1f}%",
             'transaction_count': row['transaction_count'],
-            'rank': idx + 1
+            'rank': int(row['rank']) if 'rank' in row.index else idx + 1
         })
+        add_percentile_facts(facts[-1], row)
     
     return pd.DataFrame(facts)
 
+def add_percentile_facts(fact: dict, row: pd.Series) -> dict:
+    """Add sketch-based variance percentiles to a fact when they are available"""
+    for column in ('median_variance_pct', 'p95_variance_pct'):
+        if column in row.index and pd.notna(row[column]):
+            fact[column] = f"{row[column]:.1f}%"
+    return fact
+
 def create_kpi_facts(kpi_data: dict) -> pd.DataFrame:
     """Create KPI facts dataframe for insights"""
+    variance_context = f"across {kpi_data['total_suppliers']} suppliers"
+    compliance_context = f"from {kpi_data['total_transactions']:,} transactions"
+    if kpi_data.get('is_approximate'):
+        variance_low, variance_high = kpi_data['total_variance_ci']
+        compliance_low, compliance_high = kpi_data['compliance_rate_ci']
+        variance_context += f" (approximate, 95% CI {format_currency_short(variance_low)} to {format_currency_short(variance_high)})"
+        compliance_context += f" (approximate, 95% CI {compliance_low:.1f}% to {compliance_high:.1f}%)"
+    
     facts = [
         {
             'fact_type': 'overall_metrics',
             'metric': 'Total Variance Impact',
             'value': format_currency_short(kpi_data['total_variance']),
-            'context': f"across {kpi_data['total_suppliers']} suppliers"
+            'context': variance_context
         },
         {
             'fact_type': 'overall_metrics',
             'metric': 'Price Compliance Rate', 
             'value': f"{kpi_data['compliance_rate']:.1f}%",
-            'context': f"from {kpi_data['total_transactions']:,} transactions"
+            'context': compliance_context
         },
         {
             'fact_type': 'overall_metrics',
@@ -715,29 +1700,46 @@ def create_kpi_facts(kpi_data: dict) -> pd.DataFrame:
     
     return pd.DataFrame(facts)
 
-def create_contract_facts(contract_df: pd.DataFrame, supplier_name: str) -> pd.DataFrame:
+def contract_totals(contract_df: pd.DataFrame, contract_ranking: dict | None = None) -> tuple[int, float, float]:
+    """(contracts, total variance, compliance rate) over ALL of the member's contracts when the ranking has exact totals"""
+    totals = (contract_ranking or {}).get('totals')
+    if totals is not None:
+        return totals['member_count'], totals['total_variance'], totals['compliance_rate']
+    return len(contract_df), contract_df['variance_amount'].sum(), contract_df['compliance_rate'].mean()
+
+def create_contract_facts(contract_df: pd.DataFrame, supplier_name: str, breakout: str = DEFAULT_BREAKOUT,
+                          contract_ranking: dict | None = None) -> pd.DataFrame:
     """Create contract facts dataframe for insights"""
     facts = []
+    member_key = breakout_fact_key(breakout)
     
     # Add summary fact about contract analysis
     if not contract_df.empty:
-        total_contracts = len(contract_df)
-        total_contract_variance = contract_df['variance_amount'].sum()
-        avg_contract_compliance = contract_df['compliance_rate'].mean()
+        total_contracts, total_contract_variance, contract_compliance = contract_totals(contract_df, contract_ranking)
         
         facts.append({
             'fact_type': 'contract_summary',
-            'supplier': supplier_name,
+            member_key: supplier_name,
             'metric': 'Contract Overview',
             'value': f"{total_contracts} contracts analyzed",
-            'context': f"Total variance: {format_currency_short(total_contract_variance)}, Avg compliance: {avg_contract_compliance:.1f}%"
+            'context': f"Total variance: {format_currency_short(total_contract_variance)}, Compliance: {contract_compliance:.1f}%"
         })
+        
+        others = (contract_ranking or {}).get('others')
+        if others is not None:
+            facts.append({
+                'fact_type': 'contract_others',
+                member_key: supplier_name,
+                'metric': 'All Other Contracts',
+                'value': f"{others['member_count']} more contracts",
+                'context': f"Variance: {format_currency_short(others['total_variance'])}, Compliance: {others['compliance_rate']:.1f}%"
+            })
     
     # Add individual contract facts
     for idx, row in contract_df.head(5).iterrows():
         facts.append({
             'fact_type': 'contract_detail',
-            'supplier': supplier_name,
+            member_key: supplier_name,
             'contract': row['contractName'],
             'variance_amount': format_currency_short(row['variance_amount']),
             'avg_invoice_price': f"${row['avg_invoice_price']:.2f}",
@@ -747,6 +1749,188 @@ def create_contract_facts(contract_df: pd.DataFrame, supplier_name: str) -> pd.D
             'total_quantity': int(row['total_quantity']),
             'rank': idx + 1
         })
+        add_percentile_facts(facts[-1], row)
+    
+    return pd.DataFrame(facts)
+
+def create_trend_facts(trend_df: pd.DataFrame | None) -> pd.DataFrame:
+    """Create monthly trend facts dataframe for insights"""
+    if trend_df is None or trend_df.empty:
+        return pd.DataFrame()
+    
+    monthly_df = summarize_trend(trend_df)
+    first, latest = monthly_df.iloc[0], monthly_df.iloc[-1]
+    worst = monthly_df.loc[monthly_df['compliance_rate'].idxmin()]
+    facts = [{
+        'fact_type': 'trend_summary',
+        'metric': 'Price Compliance Trend',
+        'value': f"{first['compliance_rate']:.1f}% -> {latest['compliance_rate']:.1f}%",
+        'context': f"{format_month_key(first['month_key'])} to {format_month_key(latest['month_key'])}, lowest {worst['compliance_rate']:.1f}% in {format_month_key(worst['month_key'])}"
+    }]
+    
+    # Per-category change between the first and latest month each category appears in
+    for category, rows in trend_df.sort_values('month_key').groupby('category', sort=False):
+        if len(rows) < 2:
+            continue
+        facts.append({
+            'fact_type': 'trend_category',
+            'category': category,
+            'first_month_compliance': f"{rows.iloc[0]['compliance_rate']:.1f}%",
+            'latest_month_compliance': f"{rows.iloc[-1]['compliance_rate']:.1f}%",
+            'change_pts': round(float(rows.iloc[-1]['compliance_rate'] - rows.iloc[0]['compliance_rate']), 1),
+            'total_variance': format_currency_short(rows['variance_sum'].sum())
+        })
+    
+    trend_facts = pd.DataFrame(facts)
+    if len(trend_facts) > TREND_MAX_SERIES + 1:
+        # Keep the summary plus the categories that moved the most
+        details = trend_facts.iloc[1:]
+        details = details.loc[details['change_pts'].abs().nlargest(TREND_MAX_SERIES).index]
+        trend_facts = pd.concat([trend_facts.iloc[:1], details], ignore_index=True)
+    return trend_facts
+
+def create_concentration_facts(pareto_summary: dict | None, breakout: str = DEFAULT_BREAKOUT) -> pd.DataFrame:
+    """Create Pareto concentration facts dataframe for insights"""
+    if not pareto_summary:
+        return pd.DataFrame()
+    
+    plural = breakout_label(breakout, plural=True).lower()
+    facts = [{
+        'fact_type': 'concentration_breakpoint',
+        'metric': f'{plural.capitalize()} Reaching {PARETO_THRESHOLD}% of Variance',
+        'value': f"{pareto_summary['breakpoint_rank']} of {pareto_summary['member_count']}",
+        'context': f"{pareto_summary['breakpoint_member_share']:.1f}% of {plural} with positive variance account for {PARETO_THRESHOLD}% of it"
+    }]
+    for rank in PARETO_MARKER_RANKS:
+        if pareto_summary['member_count'] > rank:
+            facts.append({
+                'fact_type': 'concentration_top_n',
+                'metric': f'Top {rank} {plural.capitalize()} Share of Variance',
+                'value': f"{pareto_summary[f'top{rank}_share']:.1f}%",
+                'context': f"of {format_currency_short(pareto_summary['total_variance'])} positive variance"
+            })
+    
+    return pd.DataFrame(facts)
+
+def create_crosstab_facts(matrix: CategorySupplierMatrix | None) -> pd.DataFrame:
+    """Create category × supplier cross-tab facts dataframe for insights"""
+    if matrix is None:
+        return pd.DataFrame()
+    
+    summary = summarize_crosstab(matrix)
+    facts = [{
+        'fact_type': 'crosstab_summary',
+        'metric': 'Active Category × Supplier Pairs',
+        'value': f"{summary['pairs']:,} of {summary['categories'] * summary['suppliers']:,} possible",
+        'context': f"{summary['leaking_pairs']:,} pairs priced above contract; the top 10 hold {summary['top10_share']:.1f}% of {format_currency_short(summary['positive_variance'])} positive variance"
+    }]
+    
+    for rank, (_, row) in enumerate(decode_names(matrix.top_cells(CROSSTAB_MAX_FACTS)).iterrows(), 1):
+        facts.append({
+            'fact_type': 'crosstab_pair',
+            'category': row['category'],
+            'supplier': row['supplierName'],
+            'variance': format_currency_short(row['total_variance']),
+            'share_of_category': f"{row['category_share']:.1f}%" if pd.notna(row['category_share']) else "n/a",
+            'compliance_rate': f"{row['compliance_rate']:.1f}%" if pd.notna(row['compliance_rate']) else "n/a",
+            'rank': rank
+        })
+    
+    # Where each leading category leaks most
+    for _, category in decode_names(matrix.marginals(0)).head(CROSSTAB_MAX_FACTS).iterrows():
+        leader = decode_names(matrix.row_top_k(category['category'], 1))
+        if leader.empty or leader.iloc[0]['total_variance'] <= 0:
+            continue
+        facts.append({
+            'fact_type': 'crosstab_category_leader',
+            'category': category['category'],
+            'category_variance': format_currency_short(category['total_variance']),
+            'top_supplier': leader.iloc[0]['supplierName'],
+            'supplier_variance': format_currency_short(leader.iloc[0]['total_variance'])
+        })
+    
+    return pd.DataFrame(facts)
+
+def create_scenario_facts(scenario_df: pd.DataFrame | None) -> pd.DataFrame:
+    """Create what-if savings facts dataframe for insights"""
+    if scenario_df is None or scenario_df.empty:
+        return pd.DataFrame()
+    
+    facts = []
+    for _, row in scenario_df.head(SCENARIO_MAX_FACTS).iterrows():
+        fact = {
+            'fact_type': 'savings_scenario',
+            'scenario': row['scenario'],
+            'savings': format_currency_short(row['savings']),
+            'members_affected': int(row['members_affected']),
+            'lines_repriced': int(row['lines_repriced'])
+        }
+        if 'savings_share_pct' in row.index and pd.notna(row['savings_share_pct']):
+            fact['share_of_total_variance'] = f"{row['savings_share_pct']:.1f}%"
+        facts.append(fact)
+    
+    return pd.DataFrame(facts)
+
+def create_comparison_facts(comparison: dict | None, breakout: str = DEFAULT_BREAKOUT) -> pd.DataFrame:
+    """Create period comparison facts dataframe for insights"""
+    if not comparison:
+        return pd.DataFrame()
+    
+    labels = comparison['labels']
+    last = len(labels) - 1
+    facts = []
+    for _, row in comparison['totals'].iterrows():
+        facts.append({
+            'fact_type': 'period_total',
+            'period': row['period'],
+            'total_variance': format_currency_short(row['total_variance']),
+            'compliance_rate': f"{row['compliance_rate']:.1f}%" if pd.notna(row['compliance_rate']) else "n/a",
+            'transactions': int(row['transactions'])
+        })
+    
+    # Largest absolute variance changes between the first and last period
+    levels = [(breakout, breakout_fact_key(breakout), decode_names(comparison['members']))]
+    if not comparison['contracts'].empty:
+        levels.append(('contractName', 'contract', decode_names(comparison['contracts'])))
+    for column, member_key, compared_df in levels:
+        movers = compared_df.dropna(subset=['variance_delta'])
+        movers = movers.loc[movers['variance_delta'].abs().nlargest(COMPARISON_MAX_MOVERS).index]
+        for _, row in movers.iterrows():
+            facts.append({
+                'fact_type': f'period_mover_{member_key}',
+                member_key: row[column],
+                'periods': f"{labels[0]} -> {labels[last]}",
+                'variance': f"{format_currency_short(row['variance_0'])} -> {format_currency_short(row[f'variance_{last}'])}",
+                'variance_change': ("+" if row['variance_delta'] >= 0 else "-") + format_currency_short(abs(row['variance_delta'])),
+                'rank': f"{row['rank_0'] if pd.notna(row['rank_0']) else 'unranked'} -> {row[f'rank_{last}'] if pd.notna(row[f'rank_{last}']) else 'unranked'}"
+            })
+    
+    return pd.DataFrame(facts)
+
+def create_anomaly_facts(anomaly_df: pd.DataFrame | None, anomaly_summary: dict | None) -> pd.DataFrame:
+    """Create anomaly facts dataframe for insights"""
+    if anomaly_df is None or anomaly_df.empty or not anomaly_summary:
+        return pd.DataFrame()
+    
+    facts = [{
+        'fact_type': 'anomaly_summary',
+        'metric': 'Flagged Invoice Lines',
+        'value': f"{anomaly_summary['flagged_lines']:,} of {anomaly_summary['scanned_lines']:,} lines",
+        'context': f"{format_currency_short(anomaly_summary['flagged_overpayment'])} paid above contract baselines"
+    }]
+    
+    for rank, (_, row) in enumerate(anomaly_df.head(5).iterrows(), 1):
+        facts.append({
+            'fact_type': 'anomaly_detail',
+            'supplier': row['supplierName'],
+            'contract': row['contractName'],
+            'transaction_date': str(row['transactionDate']),
+            'invoice_price': f"${row['invoicePrice']:.2f}",
+            'expected_price': f"${row['expectedPrice']:.2f}",
+            'deviation_pct': f"{row['deviation_pct']:.1f}%",
+            'anomaly_score': f"{row['anomaly_score']:.1f}",
+            'rank': rank
+        })
     
     return pd.DataFrame(facts)
 
@@ -767,13 +1951,14 @@ def create_notes_df(parameters: SkillInput) -> pd.DataFrame:
         {'Note': f"Analysis period: {', '.join(periods) if periods else 'All Time'}"},
         {'Note': f"Filters applied: {filter_display}"},
         {'Note': "Variance calculated as: invoicePrice - expectedPrice"},
-        {'Note': "Compliance defined as: variance within $0.01 of expected price"}
+        {'Note': f"Compliance defined as: variance within {get_compliance_tolerance(parameters).label()} of expected price"}
     ]
     
     return pd.DataFrame(notes)
 
-def generate_insights_markdown(kpi_data: dict, supplier_df: pd.DataFrame, top_supplier: str) -> str:
-    """Generate insights for supplier analysis"""
+def generate_insights_markdown(kpi_data: dict, supplier_df: pd.DataFrame, top_supplier: str,
+                               breakout: str = DEFAULT_BREAKOUT) -> str:
+    """Generate insights for supplier (or other breakout) analysis"""
     insights = f"""
 ## Key Insights
 
@@ -781,12 +1966,12 @@ def generate_insights_markdown(kpi_data: dict, supplier_df: pd.DataFrame, top_su
 - **Top Opportunity**: {top_supplier} with {format_currency_short(supplier_df.iloc[0]['total_variance']) if not supplier_df.empty else '$0'} variance
 - **Compliance Rate**: {kpi_data['compliance_rate']:.1f}% price compliance achieved
 
-## Top Suppliers by Variance
+## Top {breakout_label(breakout, plural=True)} by Variance
 """
     
     if not supplier_df.empty:
         for i, (_, row) in enumerate(supplier_df.head(3).iterrows(), 1):
-            insights += f"{i}. **{row['supplierName']}**: {format_currency_short(row['total_variance'])} ({row['variance_pct']:.1f}%)\n"
+            insights += f"{i}. **{row[breakout]}**: {format_currency_short(row['total_variance'])} ({row['variance_pct']:.1f}%)\n"
     
     insights += """
 ## Strategic Recommendations
@@ -825,18 +2010,67 @@ def generate_contract_insights(contract_df: pd.DataFrame, supplier_name: str, to
 **Note**: KPIs reflect ALL {len(contract_df)} contracts, table shows top 5 for focus
 """
 
+def generate_fact_highlights(fact_frames: dict) -> str:
+    """Generate highlights of the supporting analyses - one bullet per summary fact"""
+    highlights = []
+    for key in ("trend", "concentration", "crosstab", "anomaly"):
+        facts_df = fact_frames[key]
+        if facts_df.empty or 'metric' not in facts_df.columns:
+            continue
+        for _, row in facts_df.dropna(subset=['metric']).iterrows():
+            highlight = f"- **{row['metric']}**: {row['value']}"
+            if isinstance(row.get('context'), str) and row['context']:
+                highlight += f" ({row['context']})"
+            highlights.append(highlight)
+    
+    for _, row in fact_frames["scenario"].head(3).iterrows():
+        share = row.get('share_of_total_variance')
+        highlights.append(f"- **Scenario {row['scenario']}**: {row['savings']} savings"
+                          + (f" ({share} of total variance)" if isinstance(share, str) else ""))
+    
+    comparison_facts = fact_frames["comparison"]
+    if not comparison_facts.empty:
+        for _, row in comparison_facts[comparison_facts['fact_type'] == 'period_total'].iterrows():
+            highlights.append(f"- **{row['period']}**: {row['total_variance']} variance, {row['compliance_rate']} "
+                              f"compliance over {int(row['transactions']):,} transactions")
+    
+    if not highlights:
+        return ""
+    return "\n## Supporting Analyses\n\n" + "\n".join(highlights) + "\n"
+
+def build_template_narrative(results: SimpleNamespace, fact_frames: dict) -> str:
+    """Deterministic narrative from the stage results and facts - no LLM call"""
+    supplier_df = decode_names(results.supplier_df)
+    narrative = generate_insights_markdown(results.kpi_data, supplier_df, results.top_supplier, results.breakout)
+    contract_df = decode_names(results.contract_df)
+    if contract_df is not None and not contract_df.empty:
+        narrative += generate_contract_insights(contract_df, results.top_supplier,
+                                                contract_totals(contract_df, results.contract_ranking)[1])
+    return narrative + generate_fact_highlights(fact_frames)
+
+def generate_template_response(kpi_data: dict, supplier_df: pd.DataFrame, top_supplier: str,
+                               breakout: str = DEFAULT_BREAKOUT) -> str:
+    """Generate the short chat answer used in place of the max_prompt in template narrative mode"""
+    top_variance = format_currency_short(supplier_df.iloc[0]['total_variance']) if not supplier_df.empty else "$0"
+    return (f"Price variance totals {format_currency_short(kpi_data['total_variance'])} with "
+            f"{kpi_data['compliance_rate']:.1f}% price compliance; the top {breakout_label(breakout).lower()} "
+            f"is {top_supplier} at {top_variance}.")
 
-def generate_top_opportunities(supplier_df: pd.DataFrame) -> str:
+def generate_top_opportunities(supplier_df: pd.DataFrame, breakout: str = DEFAULT_BREAKOUT,
+                               member_savings: pd.Series | None = None) -> str:
     """Generate bullet points for top opportunities"""
     if supplier_df.empty:
         return "- No specific opportunities identified"
     
     opportunities = []
     for _, row in supplier_df.head(3).iterrows():
-        opportunities.append(
-            f"- {row['supplierName']}: {format_currency_short(row['total_variance'])} variance "
+        opportunity = (
+            f"- {row[breakout]}: {format_currency_short(row['total_variance'])} variance "
             f"({row['variance_pct']:.1f}% above contract)"
         )
+        if member_savings is not None and row[breakout] in member_savings.index:
+            opportunity += f", {format_currency_short(member_savings[row[breakout]])} recoverable at contract price"
+        opportunities.append(opportunity)
     
     return '\n'.join(opportunities)
 
@@ -1,4 +1,4 @@
-PAGES = ["1. Supplier Variance Overview", "2. Contract Deep Dive", "3. Recovery Pipeline"]
+PAGES = ["1. Supplier Variance Overview", "2. Contract Deep Dive", "3. Recovery Pipeline", "4. Compliance Trend", "5. Variance Concentration", "6. Period Comparison", "7. Category Supplier Heatmap"]
 
 price_variance_layouts = {
     PAGES[0]: """{
@@ -544,6 +544,28 @@ price_variance_layouts = {
                     }
                 ]
             },
+            {
+                "name": "headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header_Title",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "sub_headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header_Subtitle",
+                        "fieldName": "text"
+                    }
+                ]
+            },
             {
                 "name": "chart_title",
                 "isRequired": false,
@@ -1486,6 +1508,1706 @@ price_variance_layouts = {
                         "fieldName": "columns"
                     }
                 ]
+            },
+            {
+                "name": "chart_title",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.title.text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.xAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_data_series",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.series"
+                    }
+                ]
+            }
+        ]
+    }""",
+
+    PAGES[3]: """{
+        "layoutJson": {
+            "type": "Document",
+            "gap": "0px",
+            "style": {
+                "backgroundColor": "#ffffff",
+                "width": "100%",
+                "height": "max-content",
+                "padding": "15px",
+                "gap": "15px"
+            },
+            "children": [
+                {
+                    "name": "FlexContainer_Header2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "80px",
+                    "direction": "column",
+                    "style": {
+                        "backgroundColor": "#0f766e",
+                        "padding": "20px",
+                        "borderRadius": "8px",
+                        "marginBottom": "20px"
+                    },
+                    "label": "FlexContainer-Header2"
+                },
+                {
+                    "name": "Header2_Title",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Compliance Trend",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#ffffff",
+                        "textAlign": "left",
+                        "margin": "0"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Main_Title"
+                },
+                {
+                    "name": "Header2_Subtitle",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Monthly Price Compliance by Category",
+                    "style": {
+                        "fontSize": "16px",
+                        "fontWeight": "normal",
+                        "color": "#ccfbf1",
+                        "textAlign": "left",
+                        "marginTop": "5px"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Subtitle"
+                },
+                {
+                    "name": "FlexContainer0",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "150px",
+                    "direction": "row",
+                    "label": "FlexContainer-KPI_panel",
+                    "extraStyles": "gap: 15px; margin-bottom: 30px;"
+                },
+                {
+                    "name": "FlexContainer1",
+                    "type": "FlexContainer", 
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card1",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#eff6ff",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dbeafe"
+                    }
+                },
+                {
+                    "name": "Paragraph0",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Latest Month Compliance",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer1",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph1",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0%",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer1"
+                },
+                {
+                    "name": "FlexContainer2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px", 
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card2",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#f0fdf4",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dcfce7"
+                    }
+                },
+                {
+                    "name": "Paragraph2",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Change vs First Month",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280", 
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer2",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph3",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer2"
+                },
+                {
+                    "name": "FlexContainer3",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column", 
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card3",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#fef3c7",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #fde68a"
+                    }
+                },
+                {
+                    "name": "Paragraph4",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Monthly Variance (Latest)",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer3",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph5",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "$0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer3"
+                },
+                {
+                    "name": "HighchartsChart0",
+                    "type": "HighchartsChart",
+                    "children": "",
+                    "minHeight": "400px",
+                    "options": {
+                        "chart": {
+                            "type": "line",
+                            "backgroundColor": "#f8fafc"
+                        },
+                        "title": {
+                            "text": "Monthly Price Compliance Rate",
+                            "style": {
+                                "fontSize": "16px"
+                            }
+                        },
+                        "xAxis": {
+                            "categories": ["Jan 2024", "Feb 2024", "Mar 2024"],
+                            "title": {
+                                "text": "Month"
+                            }
+                        },
+                        "yAxis": {
+                            "title": {
+                                "text": "Price Compliance Rate (%)"
+                            }
+                        },
+                        "series": [
+                            {
+                                "name": "All Categories",
+                                "data": [60, 62, 61]
+                            }
+                        ],
+                        "credits": {
+                            "enabled": false
+                        },
+                        "legend": {
+                            "enabled": true
+                        }
+                    },
+                    "label": "HighchartsChart-Trend",
+                    "extraStyles": "border-radius: 8px;"
+                },
+                {
+                    "name": "Markdown0",
+                    "type": "Markdown", 
+                    "children": "",
+                    "text": "Trend insights will appear here...",
+                    "style": {
+                        "fontSize": "16px",
+                        "color": "#000000",
+                        "border": "none"
+                    },
+                    "parentId": "FlexContainer4",
+                    "label": "Markdown-Insights_Text"
+                },
+                {
+                    "name": "FlexContainer4",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "250px",
+                    "style": {
+                        "borderRadius": "11.911px",
+                        "box-shadow": "0px 0px 8.785px 0px rgba(0, 0, 0, 0.10) inset",
+                        "padding": "10px",
+                        "fontFamily": "Arial",
+                        "backgroundColor": "#edf2f7",
+                        "border-left": "4px solid #3b82f6"
+                    },
+                    "direction": "column",
+                    "hidden": false,
+                    "label": "FlexContainer-Insights",
+                    "extraStyles": "border-radius: 8px;",
+                    "flex": "1 1 250px"
+                },
+                {
+                    "name": "Header4",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Monthly Detail",
+                    "style": {
+                        "fontSize": "18px",
+                        "fontWeight": "600", 
+                        "color": "#374151",
+                        "marginTop": "30px",
+                        "marginBottom": "15px"
+                    },
+                    "label": "Header-Table_Title"
+                },
+                {
+                    "name": "DataTable0",
+                    "type": "DataTable",
+                    "children": "",
+                    "columns": [
+                        {"name": "Month"},
+                        {"name": "Price Compliance Rate"},
+                        {"name": "Variance $"},
+                        {"name": "Transactions"}
+                    ],
+                    "data": [
+                        ["Jan 2024", "60.0%", "$50K", "1,200"],
+                        ["Feb 2024", "62.0%", "$45K", "1,150"],
+                        ["Mar 2024", "61.0%", "$48K", "1,240"]
+                    ],
+                    "label": "DataTable-Trend"
+                }
+            ]
+        },
+        "inputVariables": [
+            {
+                "name": "kpi1_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph1",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi2_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph3", 
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi3_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph5",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.xAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_data_series",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.series"
+                    }
+                ]
+            },
+            {
+                "name": "exec_summary",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Markdown0",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "data",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "data"
+                    }
+                ]
+            },
+            {
+                "name": "col_defs",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "columns"
+                    }
+                ]
+            },
+            {
+                "name": "sub_headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header2_Subtitle",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_title",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.title.text"
+                    }
+                ]
+            }
+        ]
+    }""",
+    PAGES[4]: """{
+        "layoutJson": {
+            "type": "Document",
+            "gap": "0px",
+            "style": {
+                "backgroundColor": "#ffffff",
+                "width": "100%",
+                "height": "max-content",
+                "padding": "15px",
+                "gap": "15px"
+            },
+            "children": [
+                {
+                    "name": "FlexContainer_Header2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "80px",
+                    "direction": "column",
+                    "style": {
+                        "backgroundColor": "#7c3aed",
+                        "padding": "20px",
+                        "borderRadius": "8px",
+                        "marginBottom": "20px"
+                    },
+                    "label": "FlexContainer-Header2"
+                },
+                {
+                    "name": "Header2_Title",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Variance Concentration",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#ffffff",
+                        "textAlign": "left",
+                        "margin": "0"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Main_Title"
+                },
+                {
+                    "name": "Header2_Subtitle",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Cumulative Share of Variance by Supplier",
+                    "style": {
+                        "fontSize": "16px",
+                        "fontWeight": "normal",
+                        "color": "#ccfbf1",
+                        "textAlign": "left",
+                        "marginTop": "5px"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Subtitle"
+                },
+                {
+                    "name": "FlexContainer0",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "150px",
+                    "direction": "row",
+                    "label": "FlexContainer-KPI_panel",
+                    "extraStyles": "gap: 15px; margin-bottom: 30px;"
+                },
+                {
+                    "name": "FlexContainer1",
+                    "type": "FlexContainer", 
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card1",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#eff6ff",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dbeafe"
+                    }
+                },
+                {
+                    "name": "Paragraph0",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Reach 80% of Variance",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer1",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph1",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0%",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer1"
+                },
+                {
+                    "name": "FlexContainer2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px", 
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card2",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#f0fdf4",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dcfce7"
+                    }
+                },
+                {
+                    "name": "Paragraph2",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Top 10 Share",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280", 
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer2",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph3",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer2"
+                },
+                {
+                    "name": "FlexContainer3",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column", 
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card3",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#fef3c7",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #fde68a"
+                    }
+                },
+                {
+                    "name": "Paragraph4",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Top 20 Share",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer3",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph5",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "$0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer3"
+                },
+                {
+                    "name": "HighchartsChart0",
+                    "type": "HighchartsChart",
+                    "children": "",
+                    "minHeight": "400px",
+                    "options": {
+                        "chart": {
+                            "type": "line",
+                            "backgroundColor": "#f8fafc"
+                        },
+                        "title": {
+                            "text": "Cumulative Share of Variance",
+                            "style": {
+                                "fontSize": "16px"
+                            }
+                        },
+                        "xAxis": {
+                            "categories": ["1", "10", "20"],
+                            "title": {
+                                "text": "Rank"
+                            }
+                        },
+                        "yAxis": {
+                            "title": {
+                                "text": "Cumulative Share of Variance (%)"
+                            }
+                        },
+                        "series": [
+                            {
+                                "name": "Cumulative Share",
+                                "data": [25, 60, 85]
+                            }
+                        ],
+                        "credits": {
+                            "enabled": false
+                        },
+                        "legend": {
+                            "enabled": true
+                        }
+                    },
+                    "label": "HighchartsChart-Pareto",
+                    "extraStyles": "border-radius: 8px;"
+                },
+                {
+                    "name": "Markdown0",
+                    "type": "Markdown", 
+                    "children": "",
+                    "text": "Concentration insights will appear here...",
+                    "style": {
+                        "fontSize": "16px",
+                        "color": "#000000",
+                        "border": "none"
+                    },
+                    "parentId": "FlexContainer4",
+                    "label": "Markdown-Insights_Text"
+                },
+                {
+                    "name": "FlexContainer4",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "250px",
+                    "style": {
+                        "borderRadius": "11.911px",
+                        "box-shadow": "0px 0px 8.785px 0px rgba(0, 0, 0, 0.10) inset",
+                        "padding": "10px",
+                        "fontFamily": "Arial",
+                        "backgroundColor": "#edf2f7",
+                        "border-left": "4px solid #3b82f6"
+                    },
+                    "direction": "column",
+                    "hidden": false,
+                    "label": "FlexContainer-Insights",
+                    "extraStyles": "border-radius: 8px;",
+                    "flex": "1 1 250px"
+                },
+                {
+                    "name": "Header4",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Pareto Curve",
+                    "style": {
+                        "fontSize": "18px",
+                        "fontWeight": "600", 
+                        "color": "#374151",
+                        "marginTop": "30px",
+                        "marginBottom": "15px"
+                    },
+                    "label": "Header-Table_Title"
+                },
+                {
+                    "name": "DataTable0",
+                    "type": "DataTable",
+                    "children": "",
+                    "columns": [
+                        {"name": "Rank"},
+                        {"name": "Share of Suppliers"},
+                        {"name": "Cumulative Variance $"},
+                        {"name": "Cumulative Share"}
+                    ],
+                    "data": [
+                        ["1", "2.5%", "$25K", "25.0%"],
+                        ["10", "25.0%", "$60K", "60.0%"],
+                        ["20", "50.0%", "$85K", "85.0%"]
+                    ],
+                    "label": "DataTable-Pareto"
+                }
+            ]
+        },
+        "inputVariables": [
+            {
+                "name": "kpi1_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph1",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi2_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph3", 
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi3_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph5",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.xAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_data_series",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.series"
+                    }
+                ]
+            },
+            {
+                "name": "exec_summary",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Markdown0",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "data",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "data"
+                    }
+                ]
+            },
+            {
+                "name": "col_defs",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "columns"
+                    }
+                ]
+            },
+            {
+                "name": "sub_headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header2_Subtitle",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_title",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.title.text"
+                    }
+                ]
+            }
+        ]
+    }""",
+    PAGES[5]: """{
+        "layoutJson": {
+            "type": "Document",
+            "gap": "0px",
+            "style": {
+                "backgroundColor": "#ffffff",
+                "width": "100%",
+                "height": "max-content",
+                "padding": "15px",
+                "gap": "15px"
+            },
+            "children": [
+                {
+                    "name": "FlexContainer_Header2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "80px",
+                    "direction": "column",
+                    "style": {
+                        "backgroundColor": "#b45309",
+                        "padding": "20px",
+                        "borderRadius": "8px",
+                        "marginBottom": "20px"
+                    },
+                    "label": "FlexContainer-Header2"
+                },
+                {
+                    "name": "Header2_Title",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Period Comparison",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#ffffff",
+                        "textAlign": "left",
+                        "margin": "0"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Main_Title"
+                },
+                {
+                    "name": "Header2_Subtitle",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Variance by Period",
+                    "style": {
+                        "fontSize": "16px",
+                        "fontWeight": "normal",
+                        "color": "#ccfbf1",
+                        "textAlign": "left",
+                        "marginTop": "5px"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Subtitle"
+                },
+                {
+                    "name": "FlexContainer0",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "150px",
+                    "direction": "row",
+                    "label": "FlexContainer-KPI_panel",
+                    "extraStyles": "gap: 15px; margin-bottom: 30px;"
+                },
+                {
+                    "name": "FlexContainer1",
+                    "type": "FlexContainer", 
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card1",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#eff6ff",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dbeafe"
+                    }
+                },
+                {
+                    "name": "Paragraph0",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Variance Change",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer1",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph1",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0%",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer1"
+                },
+                {
+                    "name": "FlexContainer2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px", 
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card2",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#f0fdf4",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dcfce7"
+                    }
+                },
+                {
+                    "name": "Paragraph2",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Compliance Change",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280", 
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer2",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph3",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer2"
+                },
+                {
+                    "name": "FlexContainer3",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column", 
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card3",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#fef3c7",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #fde68a"
+                    }
+                },
+                {
+                    "name": "Paragraph4",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Biggest Mover",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer3",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph5",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "$0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer3"
+                },
+                {
+                    "name": "HighchartsChart0",
+                    "type": "HighchartsChart",
+                    "children": "",
+                    "minHeight": "400px",
+                    "options": {
+                        "chart": {
+                            "type": "column",
+                            "backgroundColor": "#f8fafc"
+                        },
+                        "title": {
+                            "text": "Variance by Period",
+                            "style": {
+                                "fontSize": "16px"
+                            }
+                        },
+                        "xAxis": {
+                            "categories": ["Supplier A", "Supplier B", "Supplier C"],
+                            "title": {
+                                "text": "Supplier"
+                            }
+                        },
+                        "yAxis": {
+                            "title": {
+                                "text": "Variance ($)"
+                            }
+                        },
+                        "series": [
+                            {
+                                "name": "Period 1",
+                                "data": [50000, 40000, 30000]
+                            }
+                        ],
+                        "credits": {
+                            "enabled": false
+                        },
+                        "legend": {
+                            "enabled": true
+                        }
+                    },
+                    "label": "HighchartsChart-Comparison",
+                    "extraStyles": "border-radius: 8px;"
+                },
+                {
+                    "name": "Markdown0",
+                    "type": "Markdown", 
+                    "children": "",
+                    "text": "Comparison insights will appear here...",
+                    "style": {
+                        "fontSize": "16px",
+                        "color": "#000000",
+                        "border": "none"
+                    },
+                    "parentId": "FlexContainer4",
+                    "label": "Markdown-Insights_Text"
+                },
+                {
+                    "name": "FlexContainer4",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "250px",
+                    "style": {
+                        "borderRadius": "11.911px",
+                        "box-shadow": "0px 0px 8.785px 0px rgba(0, 0, 0, 0.10) inset",
+                        "padding": "10px",
+                        "fontFamily": "Arial",
+                        "backgroundColor": "#edf2f7",
+                        "border-left": "4px solid #3b82f6"
+                    },
+                    "direction": "column",
+                    "hidden": false,
+                    "label": "FlexContainer-Insights",
+                    "extraStyles": "border-radius: 8px;",
+                    "flex": "1 1 250px"
+                },
+                {
+                    "name": "Header4",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Period Detail",
+                    "style": {
+                        "fontSize": "18px",
+                        "fontWeight": "600", 
+                        "color": "#374151",
+                        "marginTop": "30px",
+                        "marginBottom": "15px"
+                    },
+                    "label": "Header-Table_Title"
+                },
+                {
+                    "name": "DataTable0",
+                    "type": "DataTable",
+                    "children": "",
+                    "columns": [
+                        {"name": "Supplier"},
+                        {"name": "Period 1 Variance"},
+                        {"name": "Period 2 Variance"},
+                        {"name": "Change"}
+                    ],
+                    "data": [
+                        ["Supplier A", "$50K", "$60K", "+$10K"],
+                        ["Supplier B", "$40K", "$35K", "-$5K"],
+                        ["Supplier C", "$30K", "$31K", "+$1K"]
+                    ],
+                    "label": "DataTable-Comparison"
+                }
+            ]
+        },
+        "inputVariables": [
+            {
+                "name": "kpi1_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph1",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi2_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph3", 
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi3_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph5",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.xAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_data_series",
+                "isRequired": false,
+                "defaultValue": null,
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.series"
+                    }
+                ]
+            },
+            {
+                "name": "exec_summary",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Markdown0",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "data",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "data"
+                    }
+                ]
+            },
+            {
+                "name": "col_defs",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "columns"
+                    }
+                ]
+            },
+            {
+                "name": "sub_headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header2_Subtitle",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_title",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.title.text"
+                    }
+                ]
+            }
+        ]
+    }""",
+    PAGES[6]: """{
+        "layoutJson": {
+            "type": "Document",
+            "gap": "0px",
+            "style": {
+                "backgroundColor": "#ffffff",
+                "width": "100%",
+                "height": "max-content",
+                "padding": "15px",
+                "gap": "15px"
+            },
+            "children": [
+                {
+                    "name": "FlexContainer_Header2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "80px",
+                    "direction": "column",
+                    "style": {
+                        "backgroundColor": "#be123c",
+                        "padding": "20px",
+                        "borderRadius": "8px",
+                        "marginBottom": "20px"
+                    },
+                    "label": "FlexContainer-Header2"
+                },
+                {
+                    "name": "Header2_Title",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Category × Supplier Heatmap",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#ffffff",
+                        "textAlign": "left",
+                        "margin": "0"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Main_Title"
+                },
+                {
+                    "name": "Header2_Subtitle",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Variance by Category and Supplier",
+                    "style": {
+                        "fontSize": "16px",
+                        "fontWeight": "normal",
+                        "color": "#ccfbf1",
+                        "textAlign": "left",
+                        "marginTop": "5px"
+                    },
+                    "parentId": "FlexContainer_Header2",
+                    "label": "Header-Subtitle"
+                },
+                {
+                    "name": "FlexContainer0",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "150px",
+                    "direction": "row",
+                    "label": "FlexContainer-KPI_panel",
+                    "extraStyles": "gap: 15px; margin-bottom: 30px;"
+                },
+                {
+                    "name": "FlexContainer1",
+                    "type": "FlexContainer", 
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card1",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#eff6ff",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dbeafe"
+                    }
+                },
+                {
+                    "name": "Paragraph0",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Active Pairs",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer1",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph1",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0%",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer1"
+                },
+                {
+                    "name": "FlexContainer2",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px", 
+                    "direction": "column",
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card2",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#f0fdf4",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #dcfce7"
+                    }
+                },
+                {
+                    "name": "Paragraph2",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Largest Leak",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280", 
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer2",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph3",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer2"
+                },
+                {
+                    "name": "FlexContainer3",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "120px",
+                    "direction": "column", 
+                    "parentId": "FlexContainer0",
+                    "label": "FlexContainer-KPI_Card3",
+                    "style": {
+                        "flex": "1",
+                        "backgroundColor": "#fef3c7",
+                        "padding": "15px",
+                        "borderRadius": "8px",
+                        "border": "1px solid #fde68a"
+                    }
+                },
+                {
+                    "name": "Paragraph4",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "Top 10 Pairs Share",
+                    "style": {
+                        "fontSize": "14px",
+                        "color": "#6b7280",
+                        "marginBottom": "5px"
+                    },
+                    "parentId": "FlexContainer3",
+                    "flex": "shrink"
+                },
+                {
+                    "name": "Paragraph5",
+                    "type": "Paragraph",
+                    "children": "",
+                    "text": "$0",
+                    "style": {
+                        "fontSize": "24px",
+                        "fontWeight": "bold",
+                        "color": "#1f2937"
+                    },
+                    "parentId": "FlexContainer3"
+                },
+                {
+                    "name": "HighchartsChart0",
+                    "type": "HighchartsChart",
+                    "children": "",
+                    "minHeight": "400px",
+                    "options": {
+                        "chart": {
+                            "type": "heatmap",
+                            "backgroundColor": "#f8fafc"
+                        },
+                        "title": {
+                            "text": "Variance by Category and Supplier",
+                            "style": {
+                                "fontSize": "16px"
+                            }
+                        },
+                        "xAxis": {
+                            "categories": ["Supplier A", "Supplier B", "Supplier C"],
+                            "title": {
+                                "text": "Supplier"
+                            }
+                        },
+                        "yAxis": {
+                            "categories": ["Category A", "Category B"],
+                            "title": {
+                                "text": "Category"
+                            },
+                            "reversed": true
+                        },
+                        "colorAxis": {
+                            "stops": [[0, "#2563eb"], [0.5, "#f8fafc"], [1, "#dc2626"]]
+                        },
+                        "series": [
+                            {
+                                "name": "Variance ($)",
+                                "type": "heatmap",
+                                "borderWidth": 1,
+                                "data": [[0, 0, 50000], [1, 0, 40000], [2, 1, 30000]]
+                            }
+                        ],
+                        "credits": {
+                            "enabled": false
+                        },
+                        "legend": {
+                            "enabled": true
+                        }
+                    },
+                    "label": "HighchartsChart-Heatmap",
+                    "extraStyles": "border-radius: 8px;"
+                },
+                {
+                    "name": "Markdown0",
+                    "type": "Markdown", 
+                    "children": "",
+                    "text": "Cross-tab insights will appear here...",
+                    "style": {
+                        "fontSize": "16px",
+                        "color": "#000000",
+                        "border": "none"
+                    },
+                    "parentId": "FlexContainer4",
+                    "label": "Markdown-Insights_Text"
+                },
+                {
+                    "name": "FlexContainer4",
+                    "type": "FlexContainer",
+                    "children": "",
+                    "minHeight": "250px",
+                    "style": {
+                        "borderRadius": "11.911px",
+                        "box-shadow": "0px 0px 8.785px 0px rgba(0, 0, 0, 0.10) inset",
+                        "padding": "10px",
+                        "fontFamily": "Arial",
+                        "backgroundColor": "#edf2f7",
+                        "border-left": "4px solid #3b82f6"
+                    },
+                    "direction": "column",
+                    "hidden": false,
+                    "label": "FlexContainer-Insights",
+                    "extraStyles": "border-radius: 8px;",
+                    "flex": "1 1 250px"
+                },
+                {
+                    "name": "Header4",
+                    "type": "Header",
+                    "children": "",
+                    "text": "Top Category × Supplier Pairs",
+                    "style": {
+                        "fontSize": "18px",
+                        "fontWeight": "600", 
+                        "color": "#374151",
+                        "marginTop": "30px",
+                        "marginBottom": "15px"
+                    },
+                    "label": "Header-Table_Title"
+                },
+                {
+                    "name": "DataTable0",
+                    "type": "DataTable",
+                    "children": "",
+                    "columns": [
+                        {"name": "Category"},
+                        {"name": "Supplier"},
+                        {"name": "Variance $"},
+                        {"name": "Share of Category"}
+                    ],
+                    "data": [
+                        ["Category A", "Supplier A", "$50K", "42.0%"],
+                        ["Category B", "Supplier B", "$40K", "31.5%"],
+                        ["Category A", "Supplier C", "$30K", "25.2%"]
+                    ],
+                    "label": "DataTable-Crosstab"
+                }
+            ]
+        },
+        "inputVariables": [
+            {
+                "name": "kpi1_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph1",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi2_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph3", 
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "kpi3_value",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Paragraph5",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.xAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_y_categories",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.yAxis.categories"
+                    }
+                ]
+            },
+            {
+                "name": "chart_data_series",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.series"
+                    }
+                ]
+            },
+            {
+                "name": "exec_summary",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Markdown0",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "data",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "data"
+                    }
+                ]
+            },
+            {
+                "name": "col_defs",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "DataTable0",
+                        "fieldName": "columns"
+                    }
+                ]
+            },
+            {
+                "name": "sub_headline",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "Header2_Subtitle",
+                        "fieldName": "text"
+                    }
+                ]
+            },
+            {
+                "name": "chart_title",
+                "isRequired": false,
+                "defaultValue": null,
+                "targets": [
+                    {
+                        "elementName": "HighchartsChart0",
+                        "fieldName": "options.title.text"
+                    }
+                ]
             }
         ]
     }"""
@@ -0,0 +1,170 @@
+"""Declarative metric registry compiled into one fused SELECT
+
+Every metric declares the aggregate parts it decomposes into - a SUM, COUNT, MIN or MAX
+of a row expression - and how it is derived from them. compile_metrics_sql builds one
+SELECT holding the union of the parts the requested metrics need:
+
+- row expressions (variance, variance %, the compliance predicate) are defined once in
+  ROW_EXPRESSIONS and inlined into every part that uses them - as the stored columns of
+  the derived table once it is ready
+- a part shared by several metrics (transaction_count feeds every average and the
+  compliance rate) is selected once
+- ratios are never aggregated in SQL; derive_metrics computes them from the parts
+
+SUM / COUNT / MIN / MAX parts merge across groups, so the same definitions derive the
+metrics from a warehouse result, from rolled-up monthly cube cells or from drill tree
+nodes. Adding a metric means adding a registry entry - never another query.
+"""
+
+from __future__ import annotations
+from typing import Callable
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql, column_sql
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE
+
+# Row expression placeholder -> the derived column it reads
+ROW_EXPRESSIONS = {
+    "variance": "variance_amount",
+    "variance_pct": "variance_pct",
+}
+
+def row_expressions_sql() -> dict[str, str]:
+    """SQL of each row expression placeholder for the current table source"""
+    return {placeholder: column_sql(column) for placeholder, column in ROW_EXPRESSIONS.items()}
+
+# How partial results of each aggregate combine when groups are rolled up
+MERGE_FUNCTIONS = {"SUM": "sum", "COUNT": "sum", "MIN": "min", "MAX": "max", "COUNT_DISTINCT": None}
+
+class Part:
+    """One aggregate column - an aggregate of a row expression ({variance}, {compliance}, ... placeholders)"""
+    __slots__ = ("name", "aggregate", "expression")
+
+    def __init__(self, name: str, aggregate: str, expression: str):
+        self.name = name
+        self.aggregate = aggregate
+        self.expression = expression
+
+    @property
+    def merge(self) -> str | None:
+        """pandas reduction that merges partial results, None when the part is not mergeable"""
+        return MERGE_FUNCTIONS[self.aggregate]
+
+    def to_sql(self, tolerance: Tolerance = DEFAULT_TOLERANCE) -> str:
+        expression = self.expression.format(compliance=tolerance.to_sql(), **row_expressions_sql())
+        if self.aggregate == "COUNT_DISTINCT":
+            return f"COUNT(DISTINCT {expression}) as {self.name}"
+        return f"{self.aggregate}({expression}) as {self.name}"
+
+class Metric:
+    """A derived metric - the parts it needs and how it is computed from a frame of them"""
+    __slots__ = ("name", "parts", "derive")
+
+    def __init__(self, name: str, parts: tuple, derive: Callable[[pd.DataFrame], pd.Series]):
+        self.name = name
+        self.parts = parts
+        self.derive = derive
+
+PARTS = {part.name: part for part in [
+    Part("variance_sum", "SUM", "{variance}"),
+    Part("invoice_sum", "SUM", "invoicePrice"),
+    Part("expected_sum", "SUM", "expectedPrice"),
+    Part("catalog_sum", "SUM", "catalogPrice"),
+    Part("quantity_sum", "SUM", "quantity"),
+    Part("compliant_count", "SUM", "CASE WHEN {compliance} THEN 1 ELSE 0 END"),
+    Part("transaction_count", "COUNT", "*"),
+    Part("variance_pct_sum", "SUM", "{variance_pct}"),
+    Part("variance_pct_count", "COUNT", "{variance_pct}"),
+    Part("variance_min", "MIN", "{variance}"),
+    Part("variance_max", "MAX", "{variance}"),
+    Part("supplier_distinct", "COUNT_DISTINCT", "supplierName"),
+]}
+
+# Additive parts stored per monthly cube cell and per drill tree node
+CELL_PARTS = ["variance_sum", "invoice_sum", "expected_sum", "catalog_sum", "quantity_sum",
+              "compliant_count", "transaction_count", "variance_pct_sum", "variance_pct_count"]
+
+def _ratio(numerator: str, denominator: str, scale: float = 1.0) -> Callable[[pd.DataFrame], pd.Series]:
+    """numerator * scale / denominator, NaN where the denominator is zero"""
+    return lambda parts: parts[numerator] * scale / parts[denominator].where(parts[denominator] > 0)
+
+def _column(name: str, dtype=None) -> Callable[[pd.DataFrame], pd.Series]:
+    """A part used as is"""
+    return lambda parts: parts[name].astype(dtype) if dtype else parts[name]
+
+METRICS = {metric.name: metric for metric in [
+    Metric("total_variance", ("variance_sum",), _column("variance_sum")),
+    Metric("total_invoice_value", ("invoice_sum",), _column("invoice_sum")),
+    Metric("variance_pct", ("variance_pct_sum", "variance_pct_count"), _ratio("variance_pct_sum", "variance_pct_count")),
+    Metric("avg_invoice_price", ("invoice_sum", "transaction_count"), _ratio("invoice_sum", "transaction_count")),
+    Metric("avg_catalog_price", ("catalog_sum", "transaction_count"), _ratio("catalog_sum", "transaction_count")),
+    Metric("avg_expected_price", ("expected_sum", "transaction_count"), _ratio("expected_sum", "transaction_count")),
+    Metric("compliance_rate", ("compliant_count", "transaction_count"), _ratio("compliant_count", "transaction_count", 100.0)),
+    Metric("transaction_count", ("transaction_count",), _column("transaction_count", int)),
+    Metric("total_quantity", ("quantity_sum",), _column("quantity_sum")),
+    Metric("min_variance", ("variance_min",), _column("variance_min")),
+    Metric("max_variance", ("variance_max",), _column("variance_max")),
+    Metric("distinct_suppliers", ("supplier_distinct",), _column("supplier_distinct", int)),
+]}
+
+def metric_names(metrics) -> dict[str, str]:
+    """Output column -> registry metric for a list of metric names or an {output: metric} mapping"""
+    return dict(metrics) if isinstance(metrics, dict) else {name: name for name in metrics}
+
+def required_parts(metrics) -> list[str]:
+    """Union of the parts the metrics need, in first-use order"""
+    parts = []
+    for metric in metric_names(metrics).values():
+        for part in METRICS[metric].parts:
+            if part not in parts:
+                parts.append(part)
+    return parts
+
+def parts_sql(parts: list[str], tolerance: Tolerance = DEFAULT_TOLERANCE) -> str:
+    """SELECT list entries for the parts"""
+    return ",\n        ".join(PARTS[part].to_sql(tolerance) for part in parts)
+
+def merged_parts_sql(parts: list[str]) -> str:
+    """SELECT list entries that roll up part columns of a grouped subquery"""
+    return ", ".join(f"{PARTS[part].merge.upper()}({part}) as {part}" for part in parts)
+
+def compile_metrics_sql(metrics, where: str, dimensions=(), with_total: bool = False, order_by: str | None = None,
+                        tolerance: Tolerance = DEFAULT_TOLERANCE) -> str:
+    """
+    One SELECT computing the parts of every requested metric, grouped by the dimensions
+    (column names, or an {alias: SQL expression} mapping). with_total adds the grand
+    total row from the same scan, flagged by is_total = 1 and ordered first.
+    """
+    dimensions = dict(dimensions) if isinstance(dimensions, dict) else {column: column for column in dimensions}
+    select = [expression if alias == expression else f"{expression} as {alias}" for alias, expression in dimensions.items()]
+    group_by = ", ".join(dimensions.values())
+    if with_total and dimensions:
+        select.append(f"GROUPING({next(iter(dimensions.values()))}) as is_total")
+        group_by = f"GROUPING SETS (({group_by}), ())"
+    select.append(parts_sql(required_parts(metrics), tolerance))
+
+    ordering = [order for order in ("is_total DESC" if with_total and dimensions else None, order_by) if order]
+    clauses = f"WHERE {where}"
+    if dimensions:
+        clauses += f"\n    GROUP BY {group_by}"
+    if ordering:
+        clauses += f"\n    ORDER BY {', '.join(ordering)}"
+    select_sql = ",\n        ".join(select)
+    return f"""
+    SELECT
+        {select_sql}
+    FROM {table_sql()}
+    {clauses}
+    """
+
+def merge_parts(parts: pd.DataFrame, by=None):
+    """Roll up part columns - grouped by `by` (DataFrame result) or over everything (Series)"""
+    merges = {column: PARTS[column].merge for column in parts.columns
+              if column in PARTS and PARTS[column].merge is not None}
+    if by is None:
+        return pd.Series({column: getattr(parts[column], merge)() for column, merge in merges.items()})
+    return parts.groupby(by, observed=True, sort=False, dropna=False).agg(merges)
+
+def derive_metrics(parts: pd.DataFrame, metrics) -> pd.DataFrame:
+    """Metric columns derived from a frame of parts, same index"""
+    return pd.DataFrame({output: METRICS[metric].derive(parts) for output, metric in metric_names(metrics).items()},
+                        index=parts.index)
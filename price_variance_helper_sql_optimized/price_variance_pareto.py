@@ -0,0 +1,98 @@
+"""Pareto / concentration analysis computed in the warehouse
+
+Window functions rank every breakout member (suppliers by default) with a positive net
+variance - the leakage - and accumulate their share of the total. Only a downsampled
+curve of PARETO_CURVE_POINTS evenly spaced ranks is returned, plus the ranks that
+leadership asks about (top 10, top 20) and the rank at which PARETO_THRESHOLD percent of
+the leakage is reached. The result size therefore does not depend on how many members
+the breakout has.
+"""
+
+from __future__ import annotations
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql, column_sql
+
+logger = logging.getLogger(__name__)
+
+PARETO_CURVE_POINTS = 20
+PARETO_THRESHOLD = 80
+PARETO_MARKER_RANKS = (10, 20)
+
+def build_pareto_sql(dimension: str, where: str, points: int = PARETO_CURVE_POINTS,
+                     threshold: float = PARETO_THRESHOLD) -> str:
+    """Cumulative variance share by rank, downsampled to about `points` rows"""
+    marker_ranks = ", ".join(str(rank) for rank in PARETO_MARKER_RANKS)
+    return f"""
+    WITH members AS (
+        SELECT {dimension}, SUM({column_sql('variance_amount')}) as variance
+        FROM {table_sql()}
+        WHERE {where}
+        GROUP BY {dimension}
+        HAVING SUM({column_sql('variance_amount')}) > 0
+    ),
+    ranked AS (
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY variance DESC) as member_rank,
+            COUNT(*) OVER () as member_count,
+            SUM(variance) OVER (ORDER BY variance DESC ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) as cumulative_variance,
+            SUM(variance) OVER () as total_variance
+        FROM members
+    ),
+    breakpoint AS (
+        SELECT MIN(member_rank) as breakpoint_rank
+        FROM ranked
+        WHERE cumulative_variance >= total_variance * {threshold / 100.0}
+    )
+    SELECT
+        member_rank,
+        member_count,
+        cumulative_variance,
+        total_variance,
+        cumulative_variance * 100.0 / total_variance as cumulative_share,
+        member_rank * 100.0 / member_count as member_share,
+        member_rank = breakpoint_rank as is_breakpoint
+    FROM ranked, breakpoint
+    WHERE member_rank % GREATEST(1, CAST(CEIL(member_count / {points}.0) AS INTEGER)) = 0
+       OR member_rank IN (1, {marker_ranks})
+       OR member_rank = member_count
+       OR member_rank = breakpoint_rank
+    ORDER BY member_rank
+    """
+
+def summarize_pareto(curve_df: pd.DataFrame) -> dict:
+    """Breakpoint and top-N shares from the curve"""
+    last = curve_df.iloc[-1]
+    breakpoint = curve_df[curve_df['is_breakpoint'].astype(bool)]
+    summary = {
+        'member_count': int(last['member_count']),
+        'total_variance': float(last['total_variance']),
+        'breakpoint_rank': int(breakpoint['member_rank'].iloc[0]) if not breakpoint.empty else int(last['member_count']),
+        'breakpoint_member_share': float(breakpoint['member_share'].iloc[0]) if not breakpoint.empty else 100.0
+    }
+    for rank in PARETO_MARKER_RANKS:
+        # Fewer members than the marker rank means the top N hold all of it
+        at_rank = curve_df[curve_df['member_rank'] <= rank]
+        summary[f'top{rank}_share'] = float(at_rank['cumulative_share'].iloc[-1]) if not at_rank.empty else 0.0
+    return summary
+
+def fetch_pareto(arc, database_id: str, dimension: str, where: str) -> tuple[pd.DataFrame, dict | None]:
+    """(downsampled curve, summary) - an empty curve and None with fewer than two leaking members or on failure"""
+    pareto_sql = build_pareto_sql(dimension, where)
+    logger.info(f"📝 Pareto SQL ({dimension}):\n{pareto_sql}")
+    # Points + marker ranks + breakpoint + last rank bound the row count
+    result = execute_cached_query(arc, database_id, pareto_sql, PARETO_CURVE_POINTS + len(PARETO_MARKER_RANKS) + 3)
+    if not result.success or result.df is None:
+        logger.warning(f"Pareto query failed: {result.error if not result.success else 'No data'}")
+        return pd.DataFrame(), None
+    if result.df.empty:
+        return pd.DataFrame(), None
+
+    curve_df = result.df.reset_index(drop=True)
+    summary = summarize_pareto(curve_df)
+    if summary['member_count'] < 2:
+        # A single member holds all of it - nothing to chart
+        return pd.DataFrame(), None
+    logger.info(f"✅ Pareto: {summary['breakpoint_rank']} of {summary['member_count']} members reach {PARETO_THRESHOLD}% of variance")
+    return curve_df, summary
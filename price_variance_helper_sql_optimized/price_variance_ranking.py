@@ -0,0 +1,180 @@
+"""Top-K ranking with exact "all others" and totals, plus keyset paging
+
+Members of a dimension (contracts of the top supplier, suppliers, ...) are ranked by total
+variance, ties broken by name. One query returns at most K + 2 rows whatever the
+cardinality: the K members of the requested page, one "all others" row aggregating every
+member ranked after the page, and one totals row over all members. The aggregation and
+ranking run in the warehouse; only those rows are transferred.
+
+Paging uses a keyset cursor - the (rounded variance, name) of the last member of a page -
+so the next page is "members ranked after this key" instead of an OFFSET that rescans
+the skipped rows. The cursor is an opaque string safe to hand back through a skill
+parameter. When the cube or the drill tree holds every member the same ranking is
+computed in memory.
+"""
+
+from __future__ import annotations
+import json
+import base64
+import logging
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_cache import execute_cached_query
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql
+from price_variance_helper_sql_optimized.price_variance_filters import quote_sql_value
+from price_variance_helper_sql_optimized.price_variance_metrics import PARTS, parts_sql, merged_parts_sql, required_parts
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE
+from price_variance_helper_sql_optimized.price_variance_cube import MonthlyCube, CUBE_DIMENSIONS
+from price_variance_helper_sql_optimized.price_variance_aggregation import (
+    SUM_COLUMNS, metrics_from_sums, breakout_from_parts, member_parts_from_cube
+)
+
+logger = logging.getLogger(__name__)
+
+RANKING_PAGE_SIZE = 100
+
+# Variance is rounded for the ranking key so the keyset comparison does not depend on
+# floating-point summation order
+RANK_KEY_DECIMALS = 6
+
+# row_kind values in the ranking result
+PAGE_ROW, OTHERS_ROW, TOTAL_ROW = 0, 1, 2
+
+def encode_cursor(rank_key: float, member: str) -> str:
+    """Opaque keyset cursor for the member after which the next page starts"""
+    payload = json.dumps([round(float(rank_key), RANK_KEY_DECIMALS), str(member)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor) -> tuple[float, str] | None:
+    """(rank_key, member) from a cursor, None when missing or malformed"""
+    if isinstance(cursor, list):
+        cursor = cursor[0] if cursor else None
+    if not cursor:
+        return None
+    try:
+        rank_key, member = json.loads(base64.urlsafe_b64decode(str(cursor).encode()).decode())
+        return float(rank_key), str(member)
+    except Exception:
+        logger.warning(f"Ignoring malformed ranking cursor {cursor!r}")
+        return None
+
+def build_ranking_sql(dimension: str, where: str, page_size: int = RANKING_PAGE_SIZE, cursor: tuple | None = None,
+                      tolerance: Tolerance = DEFAULT_TOLERANCE, extra_metrics: tuple = ()) -> str:
+    """
+    Page rows, the "all others" row and the totals row for a ranking, in one query.
+    The totals row comes from the grand-total grouping set of the same scan, so
+    extra_metrics may add non-mergeable parts to it (e.g. 'distinct_suppliers').
+    """
+    member_sql = f"COALESCE(CAST({dimension} AS VARCHAR), '')"
+    after = ""
+    if cursor is not None:
+        rank_key, member = cursor
+        after = f"WHERE rank_key < {rank_key!r} OR (rank_key = {rank_key!r} AND {member_sql} > {quote_sql_value(member)})"
+    extra_parts = [part for part in required_parts(extra_metrics) if part not in SUM_COLUMNS]
+    columns = ", ".join(SUM_COLUMNS + extra_parts)
+    no_extras = "".join(f", NULL as {part}" for part in extra_parts)
+    return f"""
+    WITH members AS (
+        SELECT
+            {dimension},
+            GROUPING({dimension}) as is_total,
+            {parts_sql(SUM_COLUMNS + extra_parts, tolerance)}
+        FROM {table_sql()}
+        WHERE {where}
+        GROUP BY GROUPING SETS (({dimension}), ())
+    ),
+    keyed AS (
+        SELECT *, ROUND(variance_sum, {RANK_KEY_DECIMALS}) as rank_key FROM members WHERE is_total = 0
+    ),
+    ranked AS (
+        SELECT *, ROW_NUMBER() OVER (ORDER BY rank_key DESC, {member_sql}) as member_rank FROM keyed
+    ),
+    page AS (
+        SELECT *, ROW_NUMBER() OVER (ORDER BY member_rank) as page_rank
+        FROM ranked
+        {after}
+    )
+    SELECT {PAGE_ROW} as row_kind, member_rank, rank_key, {dimension}, {columns}, 1 as member_count
+    FROM page WHERE page_rank <= {page_size}
+    UNION ALL
+    SELECT {OTHERS_ROW}, NULL, NULL, NULL, {merged_parts_sql(SUM_COLUMNS)}{no_extras}, COUNT(*)
+    FROM page WHERE page_rank > {page_size}
+    UNION ALL
+    SELECT {TOTAL_ROW}, NULL, NULL, NULL, {columns}, (SELECT COUNT(*) FROM keyed)
+    FROM members WHERE is_total = 1
+    ORDER BY row_kind, member_rank
+    """
+
+def summarize_parts(parts: pd.Series) -> dict | None:
+    """Metric set plus member_count for an aggregate row, None when it covers no members"""
+    member_count = int(parts.get("member_count", 0) or 0)
+    if member_count == 0:
+        return None
+    summary = metrics_from_sums(parts[SUM_COLUMNS].astype(float).to_frame().T).iloc[0].to_dict()
+    summary["member_count"] = member_count
+    return summary
+
+def ranking_from_result(result_df: pd.DataFrame, dimension: str, page_size: int) -> dict:
+    """The ranking dict from the rows of build_ranking_sql - total_parts holds the raw parts of the totals row"""
+    kind = result_df["row_kind"].astype(int)
+    page = result_df[kind == PAGE_ROW].reset_index(drop=True)
+    others = result_df[kind == OTHERS_ROW]
+    totals = result_df[kind == TOTAL_ROW]
+
+    others_summary = summarize_parts(others.iloc[0]) if not others.empty else None
+    next_cursor = None
+    if others_summary is not None and not page.empty:
+        last = page.iloc[-1]
+        next_cursor = encode_cursor(last["rank_key"], "" if pd.isna(last[dimension]) else last[dimension])
+    rows = breakout_from_parts(page, dimension)
+    rows.insert(0, "rank", page["member_rank"].astype(int).to_numpy())
+    return {
+        "rows": rows,
+        "others": others_summary,
+        "totals": summarize_parts(totals.iloc[0]) if not totals.empty else None,
+        "total_parts": totals.iloc[0][[column for column in totals.columns if column in PARTS]] if not totals.empty else None,
+        "next_cursor": next_cursor
+    }
+
+def rank_member_parts(member_parts: pd.DataFrame, dimension: str, page_size: int = RANKING_PAGE_SIZE,
+                      cursor: tuple | None = None) -> dict:
+    """The same ranking computed in memory from every member's parts (cube or drill tree)"""
+    names = member_parts[dimension].astype(object).where(member_parts[dimension].notna(), "").astype(str)
+    keyed = member_parts.assign(rank_key=member_parts["variance_sum"].astype(float).round(RANK_KEY_DECIMALS),
+                                _member=names.to_numpy())
+    keyed = keyed.sort_values(["rank_key", "_member"], ascending=[False, True], kind="stable")
+    keyed["member_rank"] = np.arange(1, len(keyed) + 1)
+    after = keyed
+    if cursor is not None:
+        rank_key, member = cursor
+        after = keyed[(keyed["rank_key"] < rank_key) | ((keyed["rank_key"] == rank_key) & (keyed["_member"] > member))]
+
+    page = after.head(page_size).assign(row_kind=PAGE_ROW, member_count=1)
+    aggregates = pd.DataFrame([
+        dict(after.iloc[page_size:][SUM_COLUMNS].sum().to_dict(), row_kind=OTHERS_ROW, member_count=max(len(after) - page_size, 0)),
+        dict(keyed[SUM_COLUMNS].sum().to_dict(), row_kind=TOTAL_ROW, member_count=len(keyed))
+    ])
+    return ranking_from_result(pd.concat([page.drop(columns="_member"), aggregates], ignore_index=True), dimension, page_size)
+
+def fetch_ranking(arc, database_id: str, dimension: str, where: str, page_size: int = RANKING_PAGE_SIZE,
+                  cursor: str | None = None, cube: MonthlyCube | None = None, time_ranges: list = (),
+                  predicates: list | None = None, tolerance: Tolerance = DEFAULT_TOLERANCE,
+                  extra_metrics: tuple = ()) -> dict | None:
+    """
+    {'rows', 'others', 'totals', 'total_parts', 'next_cursor'} for one page of the ranking.
+    rows holds the breakout columns plus rank; others and totals hold the same metrics
+    plus member_count (others is None on the last page). extra_metrics only add parts to
+    the totals of the SQL path. Returns None when the query fails.
+    """
+    if cube is not None and predicates is not None and dimension in CUBE_DIMENSIONS and cube.covers(time_ranges, predicates):
+        logger.info(f"🧊 Ranking by {dimension} from the cube")
+        member_parts = member_parts_from_cube(cube, dimension, list(time_ranges), predicates, tolerance)
+        return rank_member_parts(member_parts, dimension, page_size, decode_cursor(cursor))
+
+    ranking_sql = build_ranking_sql(dimension, where, page_size, decode_cursor(cursor), tolerance, extra_metrics)
+    logger.info(f"📝 Ranking SQL ({dimension}):\n{ranking_sql}")
+    result = execute_cached_query(arc, database_id, ranking_sql, page_size + 2)
+    if not result.success or result.df is None:
+        logger.error(f"Ranking query by {dimension} failed: {result.error if not result.success else 'No data'}")
+        return None
+    return ranking_from_result(result.df, dimension, page_size)
@@ -0,0 +1,392 @@
+"""Recovery pipeline store - embedded SQLite file of recovery items and their history
+
+A recovery item tracks one price variance to be recovered from a supplier on a contract.
+Items move through RECOVERY_STATUSES; every status change and every amount recovered is
+appended to recovery_events. The store also maintains two aggregate tables in the same
+transaction as each change, so reading Page 3 never scans the item history:
+
+- recovery_totals: items, identified and recovered amounts per supplier × status
+- recovery_timeline: identified and recovered amounts, items opened and closed per
+  supplier × week and supplier × month
+
+The KPIs, weekly timeline and current month are indexed reads of these aggregates and
+the open items table an index walk ordered by amount. rebuild_aggregates() recomputes
+both aggregate tables from the items and events, for repairs after manual edits.
+
+Analyses only read the store. Items are opened, re-valued, moved between statuses and
+credited by explicit recovery actions (parse_recovery_actions). The store file lives in
+RECOVERY_STORE_DIR, which has to outlive worker restarts.
+"""
+
+from __future__ import annotations
+import os
+import re
+import sqlite3
+import logging
+import threading
+from datetime import date, timedelta
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import RECOVERY_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+RECOVERY_STATUSES = ["identified", "in_progress", "recovered", "written_off"]
+OPEN_STATUSES = ("identified", "in_progress")
+
+# Allowed status transitions
+RECOVERY_TRANSITIONS = {
+    "identified": {"in_progress", "recovered", "written_off"},
+    "in_progress": {"identified", "recovered", "written_off"},
+    "recovered": {"in_progress"},
+    "written_off": {"identified"}
+}
+
+# Top contracts (by variance) of the top supplier opened as recovery items by the 'open items' action
+RECOVERY_REGISTER_CONTRACTS = 5
+
+# Status spellings accepted in recovery actions
+RECOVERY_STATUS_ALIASES = {
+    "identified": "identified", "reopen": "identified", "reopened": "identified",
+    "in progress": "in_progress", "in_progress": "in_progress", "started": "in_progress",
+    "recovered": "recovered", "closed": "recovered",
+    "written off": "written_off", "written_off": "written_off", "write off": "written_off"
+}
+
+# Weeks on the Page 3 timeline and open items in its table
+RECOVERY_TIMELINE_WEEKS = 8
+RECOVERY_TABLE_ITEMS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recovery_items (
+    item_id INTEGER PRIMARY KEY,
+    supplier TEXT NOT NULL,
+    contract TEXT NOT NULL,
+    title TEXT NOT NULL,
+    owner TEXT,
+    status TEXT NOT NULL,
+    is_open INTEGER NOT NULL,
+    identified_amount REAL NOT NULL,
+    recovered_amount REAL NOT NULL DEFAULT 0,
+    expected_resolution TEXT,
+    created_on TEXT NOT NULL,
+    updated_on TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_open_amount ON recovery_items (is_open, identified_amount);
+CREATE INDEX IF NOT EXISTS idx_items_supplier ON recovery_items (supplier, is_open, identified_amount);
+CREATE INDEX IF NOT EXISTS idx_items_contract ON recovery_items (supplier, contract, is_open);
+CREATE INDEX IF NOT EXISTS idx_items_status ON recovery_items (status, updated_on);
+CREATE INDEX IF NOT EXISTS idx_items_created ON recovery_items (created_on);
+
+CREATE TABLE IF NOT EXISTS recovery_events (
+    event_id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES recovery_items (item_id),
+    event_on TEXT NOT NULL,
+    from_status TEXT,
+    to_status TEXT NOT NULL,
+    identified_change REAL NOT NULL DEFAULT 0,
+    recovered_amount REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_events_item ON recovery_events (item_id, event_on);
+CREATE INDEX IF NOT EXISTS idx_events_date ON recovery_events (event_on);
+
+CREATE TABLE IF NOT EXISTS recovery_totals (
+    supplier TEXT NOT NULL,
+    status TEXT NOT NULL,
+    items INTEGER NOT NULL DEFAULT 0,
+    identified_amount REAL NOT NULL DEFAULT 0,
+    recovered_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (supplier, status)
+);
+
+CREATE TABLE IF NOT EXISTS recovery_timeline (
+    granularity TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    supplier TEXT NOT NULL,
+    identified_amount REAL NOT NULL DEFAULT 0,
+    recovered_amount REAL NOT NULL DEFAULT 0,
+    items_opened INTEGER NOT NULL DEFAULT 0,
+    items_closed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, period_start, supplier)
+);
+CREATE INDEX IF NOT EXISTS idx_timeline_supplier ON recovery_timeline (supplier, granularity, period_start);
+"""
+
+def week_start(day: date) -> date:
+    """Monday of the week containing day"""
+    return day - timedelta(days=day.weekday())
+
+def period_starts(day: date) -> list[tuple[str, str]]:
+    """(granularity, period_start) of the week and month containing day"""
+    return [("week", week_start(day).isoformat()), ("month", day.replace(day=1).isoformat())]
+
+def supplier_clause(suppliers: list | None, column: str = "supplier") -> tuple[str, list]:
+    """SQL condition and parameters restricting to the given suppliers (none when suppliers is None)"""
+    if not suppliers:
+        return "1=1", []
+    return f"{column} IN ({', '.join('?' * len(suppliers))})", [str(s) for s in suppliers]
+
+class RecoveryStore:
+    """Recovery items, their events and the incrementally maintained aggregates in one SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _bump_totals(self, supplier: str, status: str, items: int, identified: float, recovered: float):
+        self._conn.execute("""
+            INSERT INTO recovery_totals (supplier, status, items, identified_amount, recovered_amount)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (supplier, status) DO UPDATE SET
+                items = items + excluded.items,
+                identified_amount = identified_amount + excluded.identified_amount,
+                recovered_amount = recovered_amount + excluded.recovered_amount
+        """, (supplier, status, items, identified, recovered))
+
+    def _bump_timeline(self, supplier: str, day: date, identified: float = 0.0, recovered: float = 0.0,
+                       opened: int = 0, closed: int = 0):
+        for granularity, start in period_starts(day):
+            self._conn.execute("""
+                INSERT INTO recovery_timeline (granularity, period_start, supplier, identified_amount,
+                                               recovered_amount, items_opened, items_closed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (granularity, period_start, supplier) DO UPDATE SET
+                    identified_amount = identified_amount + excluded.identified_amount,
+                    recovered_amount = recovered_amount + excluded.recovered_amount,
+                    items_opened = items_opened + excluded.items_opened,
+                    items_closed = items_closed + excluded.items_closed
+            """, (granularity, start, supplier, identified, recovered, opened, closed))
+
+    def _item(self, item_id: int) -> tuple:
+        row = self._conn.execute(
+            "SELECT supplier, status, identified_amount, recovered_amount FROM recovery_items WHERE item_id = ?",
+            (item_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown recovery item {item_id}")
+        return row
+
+    def add_item(self, supplier: str, contract: str, amount: float, title: str | None = None,
+                 owner: str | None = None, expected_resolution: date | None = None, on: date | None = None) -> int:
+        """Open a recovery item in status 'identified' and return its id"""
+        on = on or date.today()
+        amount = round(float(amount), 2)
+        with self._lock, self._conn:
+            item_id = self._conn.execute("""
+                INSERT INTO recovery_items (supplier, contract, title, owner, status, is_open, identified_amount,
+                                            expected_resolution, created_on, updated_on)
+                VALUES (?, ?, ?, ?, 'identified', 1, ?, ?, ?, ?)
+            """, (supplier, contract, title or f"Price variance recovery - {contract}", owner, float(amount),
+                  expected_resolution.isoformat() if expected_resolution else None, on.isoformat(), on.isoformat())).lastrowid
+            self._conn.execute("""
+                INSERT INTO recovery_events (item_id, event_on, to_status, identified_change)
+                VALUES (?, ?, 'identified', ?)
+            """, (item_id, on.isoformat(), float(amount)))
+            self._bump_totals(supplier, "identified", 1, float(amount), 0.0)
+            self._bump_timeline(supplier, on, identified=float(amount), opened=1)
+        return item_id
+
+    def transition(self, item_id: int, status: str, on: date | None = None) -> None:
+        """Move an item to another status (see RECOVERY_TRANSITIONS)"""
+        on = on or date.today()
+        with self._lock, self._conn:
+            supplier, current, identified, recovered = self._item(item_id)
+            if status not in RECOVERY_TRANSITIONS.get(current, ()):
+                raise ValueError(f"Recovery item {item_id} cannot move from {current} to {status}")
+            is_open = status in OPEN_STATUSES
+            self._conn.execute("UPDATE recovery_items SET status = ?, is_open = ?, updated_on = ? WHERE item_id = ?",
+                               (status, int(is_open), on.isoformat(), item_id))
+            self._conn.execute("INSERT INTO recovery_events (item_id, event_on, from_status, to_status) VALUES (?, ?, ?, ?)",
+                               (item_id, on.isoformat(), current, status))
+            self._bump_totals(supplier, current, -1, -identified, -recovered)
+            self._bump_totals(supplier, status, 1, identified, recovered)
+            was_open = current in OPEN_STATUSES
+            if was_open != is_open:
+                self._bump_timeline(supplier, on, opened=int(is_open), closed=int(was_open))
+
+    def record_recovery(self, item_id: int, amount: float, on: date | None = None) -> None:
+        """Add an amount recovered on an item (credit note, refund, price correction)"""
+        on = on or date.today()
+        amount = round(float(amount), 2)
+        with self._lock, self._conn:
+            supplier, status, _, _ = self._item(item_id)
+            self._conn.execute("UPDATE recovery_items SET recovered_amount = recovered_amount + ?, updated_on = ? WHERE item_id = ?",
+                               (float(amount), on.isoformat(), item_id))
+            self._conn.execute("""
+                INSERT INTO recovery_events (item_id, event_on, from_status, to_status, recovered_amount)
+                VALUES (?, ?, ?, ?, ?)
+            """, (item_id, on.isoformat(), status, status, float(amount)))
+            self._bump_totals(supplier, status, 0, 0.0, float(amount))
+            self._bump_timeline(supplier, on, recovered=float(amount))
+
+    def revise_amount(self, item_id: int, amount: float, title: str | None = None, on: date | None = None) -> None:
+        """Set the identified amount (and title) of an open item to a newer measurement"""
+        on = on or date.today()
+        amount = round(float(amount), 2)
+        with self._lock, self._conn:
+            supplier, status, identified, _ = self._item(item_id)
+            if status not in OPEN_STATUSES:
+                raise ValueError(f"Recovery item {item_id} is {status} - only open items can be revised")
+            change = round(amount - identified, 2)
+            self._conn.execute("""
+                UPDATE recovery_items SET identified_amount = ?, title = COALESCE(?, title), updated_on = ?
+                WHERE item_id = ?
+            """, (float(amount), title, on.isoformat(), item_id))
+            self._conn.execute("""
+                INSERT INTO recovery_events (item_id, event_on, from_status, to_status, identified_change)
+                VALUES (?, ?, ?, ?, ?)
+            """, (item_id, on.isoformat(), status, status, change))
+            self._bump_totals(supplier, status, 0, change, 0.0)
+            self._bump_timeline(supplier, on, identified=change)
+
+    def register_opportunities(self, opportunities: pd.DataFrame, on: date | None = None) -> tuple[int, int]:
+        """
+        Open an 'identified' item for each (supplier, contract, amount, title) row with a
+        positive amount and no open item yet, and revise the amount and title of open items
+        to the new row. Returns the numbers of items opened and revised.
+        """
+        opened = revised = 0
+        with self._lock:
+            for supplier, contract, amount, title in opportunities[["supplier", "contract", "amount", "title"]].itertuples(index=False, name=None):
+                if pd.isna(amount) or amount <= 0:
+                    continue
+                existing = self._conn.execute(
+                    "SELECT item_id, identified_amount FROM recovery_items WHERE supplier = ? AND contract = ? AND is_open = 1 LIMIT 1",
+                    (str(supplier), str(contract))).fetchone()
+                if existing is None:
+                    self.add_item(str(supplier), str(contract), float(amount), title=title, on=on)
+                    opened += 1
+                elif round(float(amount), 2) != existing[1]:
+                    self.revise_amount(existing[0], float(amount), title=title, on=on)
+                    revised += 1
+        return opened, revised
+
+    def summary(self, suppliers: list | None = None, today: date | None = None) -> dict:
+        """KPIs from the aggregate tables: open potential, in progress, recovered this month, open items"""
+        today = today or date.today()
+        condition, params = supplier_clause(suppliers)
+        with self._lock:
+            totals = self._conn.execute(f"""
+                SELECT status, SUM(items), SUM(identified_amount), SUM(recovered_amount)
+                FROM recovery_totals WHERE {condition} GROUP BY status
+            """, params).fetchall()
+            month = self._conn.execute(f"""
+                SELECT COALESCE(SUM(recovered_amount), 0) FROM recovery_timeline
+                WHERE granularity = 'month' AND period_start = ? AND {condition}
+            """, [today.replace(day=1).isoformat()] + params).fetchone()[0]
+        by_status = {status: (items, identified, recovered) for status, items, identified, recovered in totals}
+        open_totals = [by_status.get(status, (0, 0.0, 0.0)) for status in OPEN_STATUSES]
+        in_progress = by_status.get("in_progress", (0, 0.0, 0.0))
+        return {
+            "recovery_potential": sum(identified - recovered for _, identified, recovered in open_totals),
+            "in_progress": in_progress[1] - in_progress[2],
+            "recovered_this_month": month,
+            "recovered_total": sum(recovered for _, _, recovered in by_status.values()),
+            "open_items": int(sum(items for items, _, _ in open_totals))
+        }
+
+    def weekly_timeline(self, suppliers: list | None = None, weeks: int = RECOVERY_TIMELINE_WEEKS,
+                        today: date | None = None) -> pd.DataFrame:
+        """Identified and recovered amounts for each of the last `weeks` weeks (zero-filled)"""
+        today = today or date.today()
+        starts = [(week_start(today) - timedelta(weeks=offset)).isoformat() for offset in range(weeks - 1, -1, -1)]
+        condition, params = supplier_clause(suppliers)
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT period_start, SUM(identified_amount), SUM(recovered_amount), SUM(items_opened), SUM(items_closed)
+                FROM recovery_timeline
+                WHERE granularity = 'week' AND period_start >= ? AND {condition}
+                GROUP BY period_start
+            """, [starts[0]] + params).fetchall()
+        columns = ["identified_amount", "recovered_amount", "items_opened", "items_closed"]
+        timeline = pd.DataFrame(rows, columns=["week_start"] + columns).set_index("week_start")
+        return timeline.reindex(starts, fill_value=0).reset_index()
+
+    def open_items(self, suppliers: list | None = None, limit: int = RECOVERY_TABLE_ITEMS) -> pd.DataFrame:
+        """Largest open items by outstanding identified amount"""
+        condition, params = supplier_clause(suppliers)
+        with self._lock:
+            return pd.read_sql_query(f"""
+                SELECT item_id, title, supplier, contract, identified_amount, recovered_amount, status,
+                       expected_resolution, owner, updated_on
+                FROM recovery_items WHERE is_open = 1 AND {condition}
+                ORDER BY identified_amount DESC LIMIT ?
+            """, self._conn, params=params + [int(limit)])
+
+    def rebuild_aggregates(self) -> None:
+        """Recompute recovery_totals and recovery_timeline from the items and events"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recovery_totals")
+            self._conn.execute("DELETE FROM recovery_timeline")
+            self._conn.execute("""
+                INSERT INTO recovery_totals (supplier, status, items, identified_amount, recovered_amount)
+                SELECT supplier, status, COUNT(*), SUM(identified_amount), SUM(recovered_amount)
+                FROM recovery_items GROUP BY supplier, status
+            """)
+            events = self._conn.execute("""
+                SELECT i.supplier, e.event_on, e.from_status, e.to_status, e.recovered_amount, e.identified_change
+                FROM recovery_events e JOIN recovery_items i USING (item_id)
+                ORDER BY e.event_id
+            """).fetchall()
+            for supplier, event_on, from_status, to_status, recovered, identified in events:
+                day = date.fromisoformat(event_on)
+                if from_status is None:
+                    self._bump_timeline(supplier, day, identified=identified, opened=1)
+                elif from_status == to_status:
+                    self._bump_timeline(supplier, day, identified=identified, recovered=recovered)
+                elif (from_status in OPEN_STATUSES) != (to_status in OPEN_STATUSES):
+                    self._bump_timeline(supplier, day, opened=int(to_status in OPEN_STATUSES),
+                                        closed=int(from_status in OPEN_STATUSES))
+
+_store_lock = threading.Lock()
+_stores = {}
+
+def get_recovery_store_path(database_id: str) -> str:
+    """Location of the recovery store for a database"""
+    return os.path.join(RECOVERY_STORE_DIR, f"recovery_store_{database_id}.sqlite")
+
+def get_recovery_store(database_id: str) -> RecoveryStore:
+    """Shared store for a database, created on first use"""
+    with _store_lock:
+        if database_id not in _stores:
+            os.makedirs(RECOVERY_STORE_DIR, exist_ok=True)
+            _stores[database_id] = RecoveryStore(get_recovery_store_path(database_id))
+            logger.info(f"💰 Recovery store at {_stores[database_id].path}")
+        return _stores[database_id]
+
+def parse_recovery_actions(values) -> list[dict]:
+    """
+    Actions from strings like 'open items', '12: in progress', '12: written off' or
+    '12: recovered $1,500' (an amount after 'recovered' credits the item without closing it)
+    """
+    actions = []
+    for value in values or []:
+        text = str(value).strip().lower()
+        if re.fullmatch(r"(open|register)( recovery)? items?", text):
+            actions.append({'action': 'register'})
+            continue
+        match = re.fullmatch(r"#?(\d+)\s*:\s*(.+)", text)
+        if match is None:
+            logger.warning(f"Could not parse recovery action {value!r}")
+            continue
+        item_id, change = int(match.group(1)), match.group(2).strip()
+        amount = re.fullmatch(r"recovered\s+\$?\s*([\d,]+(?:\.\d+)?)", change)
+        if amount is not None:
+            actions.append({'action': 'recover', 'item_id': item_id, 'amount': float(amount.group(1).replace(",", ""))})
+        elif change in RECOVERY_STATUS_ALIASES:
+            actions.append({'action': 'transition', 'item_id': item_id, 'status': RECOVERY_STATUS_ALIASES[change]})
+        else:
+            logger.warning(f"Could not parse recovery action {value!r}")
+    return actions
+
+def apply_item_action(store: RecoveryStore, action: dict) -> str:
+    """Apply a 'transition' or 'recover' action and describe it - raises KeyError/ValueError when it is not allowed"""
+    if action['action'] == 'recover':
+        store.record_recovery(action['item_id'], action['amount'])
+        return f"Recorded ${action['amount']:,.2f} recovered on recovery item {action['item_id']}"
+    store.transition(action['item_id'], action['status'])
+    return f"Recovery item {action['item_id']} moved to {action['status'].replace('_', ' ')}"
@@ -0,0 +1,295 @@
+"""Approximate fast-answer mode backed by a persisted stratified sample
+
+The sample is stratified by supplierName so small suppliers are always represented:
+each supplier keeps max(SAMPLE_MIN_PER_STRATUM, SAMPLE_RATE * rows) of its rows,
+and every sampled row carries its stratum size so sums and counts can be scaled back up.
+
+Totals use the stratified expansion estimator. Filters are handled as domain
+estimation (rows outside the filter contribute 0 to their stratum), and ratios
+(compliance rate, averages) use the linearized ratio estimator, which gives the
+95% confidence intervals returned alongside each value.
+"""
+
+from __future__ import annotations
+import os
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import CACHE_DIR
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql
+from price_variance_helper_sql_optimized.price_variance_encoding import encode_names
+from price_variance_helper_sql_optimized.price_variance_storage import read_private_pickle, write_private_pickle
+from price_variance_helper_sql_optimized.price_variance_tolerance import Tolerance, DEFAULT_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+# Sampling design - see module docstring
+SAMPLE_RATE = 0.01
+SAMPLE_MIN_PER_STRATUM = 200
+SAMPLE_MAX_ROWS = 2_000_000
+
+# Persisted sample lifetime
+SAMPLE_TTL_SECONDS = 24 * 60 * 60
+
+# Columns kept in the sample - filters on any other column fall back to the exact queries
+SAMPLE_COLUMNS = [
+    "supplierName", "contractName", "category", "operatingUnit", "transactionDate",
+    "invoicePrice", "expectedPrice", "catalogPrice", "quantity"
+]
+
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+_sample_lock = threading.Lock()
+_sample_memo = {}
+
+def build_stratified_sample_sql(rate: float = SAMPLE_RATE, min_per_stratum: int = SAMPLE_MIN_PER_STRATUM) -> str:
+    """SQL that draws the stratified sample in a single scan"""
+    columns = ", ".join(SAMPLE_COLUMNS)
+    return f"""
+    SELECT {columns}, stratum_rows
+    FROM (
+        SELECT
+            {columns},
+            ROW_NUMBER() OVER (PARTITION BY supplierName ORDER BY random()) as stratum_pos,
+            COUNT(*) OVER (PARTITION BY supplierName) as stratum_rows
+        FROM {table_sql()}
+    ) strata
+    WHERE stratum_pos <= GREATEST({int(min_per_stratum)}, CEIL(stratum_rows * {float(rate)}))
+    """
+
+def get_sample_path(database_id: str) -> str:
+    """Location of the persisted sample for a database"""
+    return os.path.join(CACHE_DIR, f"stratified_sample_{database_id}_{SAMPLE_RATE}_{SAMPLE_MIN_PER_STRATUM}.pkl")
+
+def load_stratified_sample(arc, database_id: str, refresh: bool = False) -> pd.DataFrame | None:
+    """
+    Return the stratified sample, reading it from memory or disk and only drawing
+    a new one from the warehouse when it is missing, expired or refresh=True.
+    """
+    path = get_sample_path(database_id)
+
+    with _sample_lock:
+        memo = _sample_memo.get(path)
+        if memo is not None and not refresh and time.time() - memo[0] < SAMPLE_TTL_SECONDS:
+            return memo[1]
+
+        if not refresh and os.path.exists(path) and time.time() - os.path.getmtime(path) < SAMPLE_TTL_SECONDS:
+            try:
+                sample = encode_names(read_private_pickle(path))
+                _sample_memo[path] = (os.path.getmtime(path), sample)
+                logger.info(f"📦 Loaded stratified sample from {path}: {len(sample):,} rows")
+                return sample
+            except Exception as e:
+                logger.warning(f"Could not read persisted sample {path}: {e}")
+
+        logger.info("🎲 Drawing new stratified sample from the warehouse...")
+        sample_sql = build_stratified_sample_sql()
+        result = arc.data.execute_sql_query(database_id, sample_sql, SAMPLE_MAX_ROWS)
+        if not result.success or result.df is None or result.df.empty:
+            logger.warning(f"Stratified sample query failed: {result.error if not result.success else 'No data'}")
+            return None
+
+        sample = encode_names(result.df)
+        sample["transactionDate"] = pd.to_datetime(sample["transactionDate"], errors="coerce")
+
+        try:
+            write_private_pickle(sample, path)
+        except Exception as e:
+            logger.warning(f"Could not persist stratified sample to {path}: {e}")
+
+        _sample_memo[path] = (time.time(), sample)
+        logger.info(f"✅ Stratified sample ready: {len(sample):,} rows across {sample['supplierName'].nunique()} suppliers")
+        return sample
+
+def sample_filter_mask(sample: pd.DataFrame, time_ranges: list, predicates: list) -> np.ndarray | None:
+    """
+    Boolean mask of sample rows inside the requested domain.
+    Returns None when a predicate references a column the sample does not carry.
+    """
+    mask = np.ones(len(sample), dtype=bool)
+
+    if time_ranges:
+        dates = sample["transactionDate"]
+        time_mask = np.zeros(len(sample), dtype=bool)
+        for start_date, end_date in time_ranges:
+            in_range = (dates >= pd.Timestamp(start_date)).to_numpy()
+            if end_date is not None:
+                in_range = in_range & (dates <= pd.Timestamp(end_date)).to_numpy()
+            time_mask |= in_range
+        mask &= time_mask
+
+    for column, value in predicates:
+        if column not in sample.columns:
+            logger.info(f"Sample does not carry filter column {column} - approximate mode unavailable")
+            return None
+        values = sample[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        mask = mask & (values == str(value)).to_numpy()
+
+    return mask
+
+def _stratum_moments(codes: np.ndarray, n_strata: int, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-stratum sum and sum of squares of a domain variable"""
+    return (np.bincount(codes, weights=values, minlength=n_strata),
+            np.bincount(codes, weights=values * values, minlength=n_strata))
+
+def _stratum_total_variance(N_h: np.ndarray, n_h: np.ndarray, sums: np.ndarray, sumsq: np.ndarray) -> np.ndarray:
+    """Variance contribution of each stratum to an expanded total"""
+    mean_h = sums / n_h
+    dof = np.maximum(n_h - 1, 1)
+    s2_h = np.maximum(sumsq - n_h * mean_h * mean_h, 0) / dof
+    fpc = np.clip(1 - n_h / N_h, 0, 1)
+    return N_h * N_h * fpc * s2_h / n_h
+
+class StratifiedEstimator:
+    """Expansion and ratio estimators over one stratified sample and domain mask"""
+
+    def __init__(self, codes: np.ndarray, n_strata: int, N_h: np.ndarray, n_h: np.ndarray, mask: np.ndarray):
+        self.codes = codes
+        self.n_strata = n_strata
+        self.N_h = N_h
+        self.n_h = n_h
+        self.domain = mask.astype(float)
+
+    def total(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Per-stratum estimated totals and their variances"""
+        z = np.nan_to_num(values, nan=0.0) * self.domain
+        sums, sumsq = _stratum_moments(self.codes, self.n_strata, z)
+        return self.N_h * sums / self.n_h, _stratum_total_variance(self.N_h, self.n_h, sums, sumsq)
+
+    def ratio(self, numerator: np.ndarray, denominator: np.ndarray) -> tuple[np.ndarray, np.ndarray, float, float]:
+        """Per-stratum and overall ratio estimates with linearized variances"""
+        y = np.nan_to_num(numerator, nan=0.0)
+        x = np.nan_to_num(denominator, nan=0.0)
+        Y_h, _ = self.total(y)
+        X_h, _ = self.total(x)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            R_h = np.where(X_h > 0, Y_h / X_h, np.nan)
+            R = Y_h.sum() / X_h.sum() if X_h.sum() > 0 else np.nan
+
+            # Residuals for the per-stratum ratios and the overall ratio
+            e_h = (y - np.nan_to_num(R_h)[self.codes] * x) * self.domain
+            sums, sumsq = _stratum_moments(self.codes, self.n_strata, e_h)
+            var_R_h = np.where(X_h > 0, _stratum_total_variance(self.N_h, self.n_h, sums, sumsq) / (X_h * X_h), np.nan)
+
+            e = (y - np.nan_to_num(R) * x) * self.domain
+            sums, sumsq = _stratum_moments(self.codes, self.n_strata, e)
+            var_R = _stratum_total_variance(self.N_h, self.n_h, sums, sumsq).sum() / (X_h.sum() ** 2) if X_h.sum() > 0 else np.nan
+
+        return R_h, var_R_h, R, var_R
+
+def _confidence_interval(estimate, variance):
+    """95% normal confidence interval"""
+    half_width = Z_95 * np.sqrt(np.maximum(variance, 0))
+    return estimate - half_width, estimate + half_width
+
+def estimate_supplier_and_kpis(sample: pd.DataFrame, mask: np.ndarray, top_n: int = 100,
+                               tolerance: Tolerance = DEFAULT_TOLERANCE) -> tuple[pd.DataFrame, dict]:
+    """
+    Approximate Query 1 and Query 2 from the sample.
+    Output matches the exact queries plus *_ci_low / *_ci_high columns and
+    kpi_data['total_variance_ci'] / kpi_data['compliance_rate_ci'].
+    """
+    codes, suppliers = pd.factorize(sample["supplierName"], use_na_sentinel=False)
+    n_strata = len(suppliers)
+    N_h = sample.groupby(codes)["stratum_rows"].first().to_numpy(dtype=float)
+    n_h = np.bincount(codes, minlength=n_strata).astype(float)
+    est = StratifiedEstimator(codes, n_strata, N_h, n_h, mask)
+
+    invoice = sample["invoicePrice"].to_numpy(dtype=float)
+    expected = sample["expectedPrice"].to_numpy(dtype=float)
+    variance = invoice - expected
+    ones = np.ones(len(sample))
+    compliant = tolerance.mask(invoice, expected).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance_pct = np.where(expected != 0, variance / expected * 100, np.nan)
+    pct_valid = (~np.isnan(variance_pct)).astype(float)
+
+    variance_h, variance_var_h = est.total(variance)
+    count_h, _ = est.total(ones)
+    quantity_h, _ = est.total(sample["quantity"].to_numpy(dtype=float))
+    compliance_h, compliance_var_h, compliance, compliance_var = est.ratio(compliant, ones)
+    pct_h, _, avg_pct, _ = est.ratio(variance_pct, pct_valid)
+    invoice_h, _ = est.total(invoice)
+
+    variance_low_h, variance_high_h = _confidence_interval(variance_h, variance_var_h)
+    compliance_low_h, compliance_high_h = _confidence_interval(compliance_h, compliance_var_h)
+
+    supplier_df = pd.DataFrame({
+        "supplierName": suppliers,
+        "total_variance": variance_h,
+        "variance_pct": pct_h,
+        "avg_invoice_price": est.ratio(invoice, ones)[0],
+        "avg_catalog_price": est.ratio(sample["catalogPrice"].to_numpy(dtype=float), ones)[0],
+        "avg_expected_price": est.ratio(expected, ones)[0],
+        "compliance_rate": compliance_h * 100,
+        "transaction_count": np.rint(count_h).astype(int),
+        "total_quantity": quantity_h,
+        "total_variance_ci_low": variance_low_h,
+        "total_variance_ci_high": variance_high_h,
+        "compliance_rate_ci_low": np.clip(compliance_low_h * 100, 0, 100),
+        "compliance_rate_ci_high": np.clip(compliance_high_h * 100, 0, 100)
+    })
+
+    # Suppliers with no sampled rows in the domain are indistinguishable from absent ones
+    supplier_df = supplier_df[supplier_df["transaction_count"] > 0]
+    supplier_df = supplier_df.sort_values("total_variance", ascending=False).head(top_n).reset_index(drop=True)
+
+    total_variance = variance_h.sum()
+    compliance_low, compliance_high = _confidence_interval(compliance, compliance_var)
+    kpi_data = {
+        "total_variance": total_variance,
+        "total_invoice_value": invoice_h.sum(),
+        "avg_variance_rate": avg_pct,
+        "compliance_rate": compliance * 100,
+        "total_suppliers": int((np.bincount(codes, weights=mask.astype(float), minlength=n_strata) > 0).sum()),
+        "total_transactions": int(round(count_h.sum())),
+        "total_variance_ci": _confidence_interval(total_variance, variance_var_h.sum()),
+        "compliance_rate_ci": (max(compliance_low * 100, 0.0), min(compliance_high * 100, 100.0)),
+        "is_approximate": True,
+        "sample_rows": int(mask.sum())
+    }
+
+    return supplier_df, kpi_data
+
+def estimate_contract_drilldown(sample: pd.DataFrame, mask: np.ndarray, supplier_name: str, top_n: int = 100,
+                                tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+    """
+    Approximate Query 3 from the sample. All rows of one supplier share a stratum,
+    so contract totals are that stratum's expansion estimates per contract.
+    """
+    in_supplier = (sample["supplierName"] == supplier_name).to_numpy()
+    rows = sample[in_supplier & mask]
+    if rows.empty:
+        return pd.DataFrame()
+
+    scale = float(sample.loc[in_supplier, "stratum_rows"].iloc[0]) / int(in_supplier.sum())
+    invoice = rows["invoicePrice"].astype(float)
+    expected = rows["expectedPrice"].astype(float)
+    frame = pd.DataFrame({
+        "contractName": rows["contractName"],
+        "variance": invoice - expected,
+        "invoicePrice": invoice,
+        "catalogPrice": rows["catalogPrice"].astype(float),
+        "expectedPrice": expected,
+        "compliant": tolerance.mask(invoice, expected).astype(float) * 100,
+        "quantity": rows["quantity"].astype(float)
+    })
+    grouped = frame.groupby("contractName", observed=True)
+
+    contract_df = pd.DataFrame({
+        "variance_amount": grouped["variance"].sum() * scale,
+        "avg_invoice_price": grouped["invoicePrice"].mean(),
+        "avg_catalog_price": grouped["catalogPrice"].mean(),
+        "avg_expected_price": grouped["expectedPrice"].mean(),
+        "compliance_rate": grouped["compliant"].mean(),
+        "total_quantity": grouped["quantity"].sum() * scale,
+        "transaction_count": np.rint(grouped.size() * scale).astype(int)
+    }).reset_index()
+
+    return contract_df.sort_values("variance_amount", ascending=False).head(top_n).reset_index(drop=True)
@@ -0,0 +1,52 @@
+"""Private local storage for persisted precomputed state
+
+The stratified sample and the monthly cube are persisted as pickles under CACHE_DIR, and
+loading a pickle can run arbitrary code. They are therefore only written to and read from
+a directory this user owns and nobody else can write to: private_dir() creates it with
+mode 0700 and refuses one that belongs to another user, is a symlink or is writable by
+group or others. read_private_pickle() additionally checks the opened file itself, so a
+file planted by another user is never loaded.
+"""
+
+from __future__ import annotations
+import os
+import stat
+import logging
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_config import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+class UntrustedPathError(PermissionError):
+    """A cache path that another user owns or can write to"""
+
+def check_private(path: str, info: os.stat_result | None = None):
+    """Raise UntrustedPathError unless path is owned by this user and not writable by group or others"""
+    info = info or os.lstat(path)
+    if stat.S_ISLNK(info.st_mode):
+        raise UntrustedPathError(f"{path} is a symlink")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise UntrustedPathError(f"{path} is owned by uid {info.st_uid}")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise UntrustedPathError(f"{path} is writable by group or others")
+
+def private_dir(path: str = CACHE_DIR) -> str:
+    """path, created with mode 0700 when missing and checked to be private"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    check_private(path)
+    return path
+
+def read_private_pickle(path: str):
+    """Unpickle path after checking that it and its directory are private"""
+    check_private(os.path.dirname(path) or ".")
+    with open(path, "rb") as handle:
+        check_private(path, os.fstat(handle.fileno()))
+        return pd.read_pickle(handle)
+
+def write_private_pickle(obj, path: str):
+    """Pickle obj to path (mode 0600) through a temporary file in the private directory"""
+    private_dir(os.path.dirname(path) or ".")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as handle:
+        pd.to_pickle(obj, handle)
+    os.replace(tmp_path, path)
@@ -0,0 +1,161 @@
+"""Compliance tolerances and cumulative variance histograms
+
+A line is compliant when its invoice price is within a tolerance of the expected price,
+either an absolute amount ($0.01 by default) or a percentage of the expected price.
+
+The monthly cube cells and the drill tree nodes store, next to their other additive sums,
+cumulative histograms of the absolute and relative variance over log-spaced 1-2-5 edges:
+abs_le_i counts the lines with |invoice - expected| <= ABS_TOLERANCE_EDGES[i] dollars and
+rel_le_i those within REL_TOLERANCE_EDGES_PCT[i] percent of the expected price. Compliance
+at any tolerance is then a histogram lookup - exact on an edge, log-interpolated between
+edges - so changing the tolerance costs no extra scan. The lookup is linear in the counts,
+so it can be applied per cell before rolling up.
+"""
+
+from __future__ import annotations
+import re
+import logging
+import numpy as np
+import pandas as pd
+from price_variance_helper_sql_optimized.price_variance_dataset import COMPLIANT_FLAG_TOLERANCE, current_table_source
+
+logger = logging.getLogger(__name__)
+
+# Cumulative histogram edges - dollars and percent of the expected price
+ABS_TOLERANCE_EDGES = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+REL_TOLERANCE_EDGES_PCT = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+ABS_HISTOGRAM_COLUMNS = [f"abs_le_{i}" for i in range(len(ABS_TOLERANCE_EDGES))]
+REL_HISTOGRAM_COLUMNS = [f"rel_le_{i}" for i in range(len(REL_TOLERANCE_EDGES_PCT))]
+HISTOGRAM_COLUMNS = ABS_HISTOGRAM_COLUMNS + REL_HISTOGRAM_COLUMNS
+
+class Tolerance:
+    """Compliance tolerance - kind 'abs' (amount in dollars) or 'rel' (amount in percent of the expected price)"""
+    __slots__ = ("kind", "amount")
+
+    def __init__(self, kind: str, amount: float):
+        self.kind = kind
+        self.amount = float(amount)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Tolerance) and (self.kind, self.amount) == (other.kind, other.amount)
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.amount))
+
+    def __repr__(self) -> str:
+        return f"Tolerance({self.kind!r}, {self.amount})"
+
+    @property
+    def edges(self) -> tuple:
+        return ABS_TOLERANCE_EDGES if self.kind == "abs" else REL_TOLERANCE_EDGES_PCT
+
+    @property
+    def columns(self) -> list[str]:
+        return ABS_HISTOGRAM_COLUMNS if self.kind == "abs" else REL_HISTOGRAM_COLUMNS
+
+    def label(self) -> str:
+        """Display form, e.g. '$0.01' or '1%'"""
+        if self.kind == "rel":
+            return f"{self.amount:g}%"
+        return f"${self.amount:,.2f}" if round(self.amount, 2) == self.amount else f"${self.amount:g}"
+
+    def to_sql(self) -> str:
+        """Predicate that is true for compliant lines"""
+        return compliance_sql(self.kind, self.amount)
+
+    def mask(self, invoice: np.ndarray, expected: np.ndarray) -> np.ndarray:
+        """Boolean compliant mask over invoice / expected price arrays"""
+        invoice, expected = np.asarray(invoice, dtype=float), np.asarray(expected, dtype=float)
+        if self.kind == "abs":
+            return np.abs(invoice - expected) <= self.amount
+        return np.abs(invoice - expected) <= np.abs(expected) * (self.amount / 100)
+
+DEFAULT_TOLERANCE = Tolerance("abs", 0.01)
+
+def compliance_sql(kind: str, amount: float) -> str:
+    """SQL predicate for one tolerance - the same expression the histogram edges use"""
+    source = current_table_source()
+    if kind == "abs" and float(amount) == COMPLIANT_FLAG_TOLERANCE and source.derived:
+        return "is_compliant"
+    if kind == "abs":
+        return f"{source.column_sql('abs_variance')} <= {float(amount)}"
+    return f"{source.column_sql('abs_variance')} <= ABS(expectedPrice) * {float(amount) / 100}"
+
+def build_histogram_sql() -> str:
+    """SELECT list entries for the cumulative abs_le_i / rel_le_i counts"""
+    entries = [f"SUM(CASE WHEN {compliance_sql('abs', edge)} THEN 1 ELSE 0 END) as {column}"
+               for edge, column in zip(ABS_TOLERANCE_EDGES, ABS_HISTOGRAM_COLUMNS)]
+    entries += [f"SUM(CASE WHEN {compliance_sql('rel', edge)} THEN 1 ELSE 0 END) as {column}"
+                for edge, column in zip(REL_TOLERANCE_EDGES_PCT, REL_HISTOGRAM_COLUMNS)]
+    return ",\n        ".join(entries)
+
+def parse_tolerance(value) -> Tolerance:
+    """Tolerance from '$0.10', '0.1', '1%' or '1 pct' - DEFAULT_TOLERANCE when missing or unreadable"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, Tolerance):
+        return value
+    if value is None or str(value).strip() == "":
+        return DEFAULT_TOLERANCE
+
+    text = str(value).strip().lower()
+    number = re.search(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+", text)
+    if number is None:
+        logger.warning(f"Could not parse compliance tolerance {value!r}, using {DEFAULT_TOLERANCE.label()}")
+        return DEFAULT_TOLERANCE
+    kind = "rel" if "%" in text or "pct" in text or "percent" in text else "abs"
+    return Tolerance(kind, float(number.group(0).replace(",", "")))
+
+def histogram_weights(tolerance: Tolerance) -> dict[str, float]:
+    """Histogram column -> weight whose weighted sum is the compliant count at the tolerance"""
+    edges = tolerance.edges
+    columns = tolerance.columns
+    if tolerance.amount >= edges[-1]:
+        # Beyond the last edge the count is a lower bound
+        return {columns[-1]: 1.0}
+
+    upper = int(np.searchsorted(edges, tolerance.amount, side="left"))
+    if edges[upper] == tolerance.amount:
+        return {columns[upper]: 1.0}
+
+    lower = upper - 1
+    if edges[lower] == 0:
+        share = tolerance.amount / edges[upper]
+    else:
+        share = np.log(tolerance.amount / edges[lower]) / np.log(edges[upper] / edges[lower])
+    return {columns[lower]: 1.0 - share, columns[upper]: float(share)}
+
+def is_exact(tolerance: Tolerance) -> bool:
+    """Whether histogram lookups at the tolerance are exact (it falls on an edge)"""
+    return tolerance.amount in tolerance.edges
+
+def interpolation_note(tolerance: Tolerance) -> str | None:
+    """Caveat for compliance served from the histograms at a tolerance off the edges - None when exact"""
+    if is_exact(tolerance):
+        return None
+    edges = [Tolerance(tolerance.kind, edge) for edge in tolerance.edges]
+    if tolerance.amount > edges[-1].amount:
+        return (f"Compliance at {tolerance.label()} is a lower bound - precomputed variance buckets end at "
+                f"{edges[-1].label()}")
+    upper = int(np.searchsorted(tolerance.edges, tolerance.amount, side="left"))
+    lower, upper = edges[upper - 1].label(), edges[upper].label()
+    return (f"Compliance at {tolerance.label()} is interpolated between the precomputed {lower} and {upper} "
+            f"variance buckets - use {lower} or {upper} for exact rates")
+
+def has_histograms(columns, tolerance: Tolerance = DEFAULT_TOLERANCE) -> bool:
+    """Whether precomputed sums with these columns can serve compliance at the tolerance"""
+    return tolerance == DEFAULT_TOLERANCE or set(tolerance.columns).issubset(columns)
+
+def apply_tolerance(sums: pd.DataFrame, tolerance: Tolerance = DEFAULT_TOLERANCE) -> pd.DataFrame:
+    """
+    sums with compliant_count replaced by the histogram lookup at the tolerance - callers
+    check has_histograms first and compute compliance in SQL when it is False
+    """
+    if tolerance == DEFAULT_TOLERANCE:
+        return sums
+    if not has_histograms(sums.columns, tolerance):
+        logger.warning(f"No variance histograms available - compliance stays at {DEFAULT_TOLERANCE.label()}")
+        return sums
+    compliant = sum(sums[column].astype(float) * weight for column, weight in histogram_weights(tolerance).items())
+    return sums.assign(compliant_count=compliant)
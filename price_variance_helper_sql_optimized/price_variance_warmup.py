@@ -0,0 +1,137 @@
+"""Cache warm-up of a worker
+
+A background thread opens the pooled clients, writes or verifies the derived columnar
+copy of the table, loads the monthly cube and stratified sample, then runs the query
+phase (Queries 1-3) for each hot combination in WARMUP_COMBINATIONS so the following
+questions hit warm result caches. Nothing runs on import: the first invocation of the
+skill on a worker starts the warm-up (once), and every answer given while it is still
+running carries warmup_note() in its notes. The worker counts as ready once the warm-up
+has finished, whether or not every step succeeded.
+"""
+
+from __future__ import annotations
+import time
+import logging
+import threading
+from datetime import date
+from types import SimpleNamespace
+from price_variance_helper_sql_optimized.price_variance_config import WARMUP_COMBINATIONS
+from price_variance_helper_sql_optimized.price_variance_clients import get_client_pool, get_data_client
+from price_variance_helper_sql_optimized.price_variance_dataset import table_sql, ensure_derived_table, pinned_table_source
+from price_variance_helper_sql_optimized.price_variance_cube import load_monthly_cube
+from price_variance_helper_sql_optimized.price_variance_sampling import load_stratified_sample
+from price_variance_helper_sql_optimized.price_variance_functionality_sql import DATABASE_ID, run_query_phase
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_start_lock = threading.Lock()
+_status = {"state": "not_started", "combinations": 0, "completed": 0, "failed": 0, "seconds": None}
+
+def current_quarter_label(today: date | None = None) -> str:
+    """Quarter label in the time_periods format, e.g. 'q3 2025'"""
+    today = today or date.today()
+    return f"q{(today.month - 1) // 3 + 1} {today.year}"
+
+def fetch_column_values(arc, column: str) -> list:
+    """Distinct non-null values of a column, used to expand 'column: *' filters"""
+    values_sql = f"""
+    SELECT DISTINCT {column} as value
+    FROM {table_sql()}
+    WHERE {column} IS NOT NULL
+    ORDER BY value
+    """
+    result = arc.data.execute_sql_query(DATABASE_ID, values_sql, 1000)
+    if not result.success or result.df is None:
+        logger.warning(f"Could not list values of {column} for warm-up: {result.error if not result.success else 'No data'}")
+        return []
+    return result.df['value'].astype(str).tolist()
+
+def expand_combinations(arc, combinations: list) -> list[SimpleNamespace]:
+    """Resolve placeholders and wildcards into SkillInput-like parameter objects"""
+    expanded = []
+    for combination in combinations:
+        time_periods = [current_quarter_label() if period == "<current_quarter>" else period
+                        for period in combination.get("time_periods", [])]
+
+        filter_sets = [[]]
+        for filter_item in combination.get("other_filters", []):
+            column, _, value = filter_item.partition(':')
+            if value.strip() == '*':
+                values = fetch_column_values(arc, column.strip())
+                filter_sets = [filters + [f"{column.strip()}: {v}"] for filters in filter_sets for v in values]
+            else:
+                filter_sets = [filters + [filter_item] for filters in filter_sets]
+
+        for other_filters in filter_sets:
+            expanded.append(SimpleNamespace(arguments=SimpleNamespace(time_periods=time_periods, other_filters=other_filters)))
+    return expanded
+
+def run_warmup(combinations: list = WARMUP_COMBINATIONS):
+    """Open clients, load precomputed state and run the query phase for each hot combination"""
+    started = time.monotonic()
+    _status["state"] = "running"
+    try:
+        logger.info("🔥 Warm-up: opening platform clients...")
+        get_client_pool('data').get()
+        get_client_pool('llm').get()
+        arc = get_data_client()
+
+        # The derived table first, so the cube, sample and query phase all read it
+        ensure_derived_table(arc, DATABASE_ID)
+
+        for name, load in (("monthly cube", load_monthly_cube), ("stratified sample", load_stratified_sample)):
+            try:
+                with pinned_table_source():
+                    load(arc, DATABASE_ID)
+            except Exception as e:
+                logger.warning(f"Warm-up could not load the {name}: {e}")
+
+        with pinned_table_source():
+            parameter_sets = expand_combinations(arc, combinations)
+        _status["combinations"] = len(parameter_sets)
+        for parameters in parameter_sets:
+            try:
+                if run_query_phase(parameters, arc) is None:
+                    _status["failed"] += 1
+                else:
+                    _status["completed"] += 1
+            except Exception as e:
+                _status["failed"] += 1
+                logger.warning(f"Warm-up combination failed {vars(parameters.arguments)}: {e}")
+    except Exception as e:
+        logger.warning(f"Warm-up aborted: {e}")
+    finally:
+        _status["state"] = "done"
+        _status["seconds"] = round(time.monotonic() - started, 2)
+        logger.info(f"✅ Warm-up finished: {_status['completed']}/{_status['combinations']} combinations in {_status['seconds']}s")
+        _ready.set()
+
+def start_warmup(combinations: list = WARMUP_COMBINATIONS) -> threading.Thread | None:
+    """Start the warm-up in a background thread (once per process)"""
+    with _start_lock:
+        if _status["state"] != "not_started":
+            return None
+        _status["state"] = "starting"
+    thread = threading.Thread(target=run_warmup, args=(combinations,), name="price-variance-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready() -> bool:
+    """True once the warm-up has finished"""
+    return _ready.is_set()
+
+def wait_until_ready(timeout: float | None = None) -> bool:
+    """Block until the warm-up has finished or the timeout elapses"""
+    return _ready.wait(timeout)
+
+def warmup_note() -> str | None:
+    """Note for an answer given while the warm-up is still running, None when it is not"""
+    if _status["state"] == "not_started" or is_ready():
+        return None
+    return (f"This worker is still warming its caches ({_status['completed']} of "
+            f"{_status['combinations'] or len(WARMUP_COMBINATIONS)} hot combinations done) - figures are exact but may take longer")
+
+def get_warmup_status() -> dict:
+    """Snapshot of the warm-up progress"""
+    return dict(_status, ready=is_ready())